@@ -0,0 +1,242 @@
+import numpy as np
+import pandas as pd
+
+from filtros import fatia_periodo, mascara_status_instituicao
+
+# =========================================================
+# ROLLUP DIÁRIO DAS DOAÇÕES
+# =========================================================
+# Construído uma única vez por carga de dados. Todos os gráficos e KPIs do
+# dashboard são respondidos fatiando estes cubos, cujo tamanho depende do
+# número de dias/horas/status/instituições e não do número de doações.
+
+CHAVES_ROLLUP = ["DATA", "HORA", "DIA_SEMANA", "STATUS", "ID_INSTITUICAO"]
+CHAVES_ROLLUP_ITENS = ["DATA", "STATUS", "ID_INSTITUICAO", "ITEM"]
+CHAVES_ROLLUP_IMPACTO = ["DATA", "STATUS", "ID_INSTITUICAO", "PONTUACAO"]
+
+DIAS_SEMANA = {
+    0: "Segunda",
+    1: "Terça",
+    2: "Quarta",
+    3: "Quinta",
+    4: "Sexta",
+    5: "Sábado",
+    6: "Domingo",
+}
+
+
+def _chaves_doacoes(df_doacoes):
+    df_doacoes = df_doacoes[df_doacoes["DT_SOLICITACAO"].notna()]
+    dt = df_doacoes["DT_SOLICITACAO"]
+    return pd.DataFrame({
+        "ID_DOACAO": df_doacoes["ID_DOACAO"].to_numpy(),
+        "DATA": dt.dt.normalize().to_numpy(),
+        "HORA": dt.dt.hour.to_numpy(dtype="int8"),
+        "DIA_SEMANA": dt.dt.dayofweek.to_numpy(dtype="int8"),
+        "STATUS": df_doacoes["STATUS"].array,
+        "ID_INSTITUICAO": df_doacoes["ID_INSTITUICAO"].to_numpy(),
+    })
+
+
+def construir_rollup(df_doacoes, df_doacao_itens):
+    chaves = _chaves_doacoes(df_doacoes)
+    # QTDE é int8 em memória; as somas precisam de um tipo largo
+    qtde_por_doacao = df_doacao_itens["QTDE"].astype("int64").groupby(df_doacao_itens["ID_DOACAO"].to_numpy()).sum()
+    chaves["QTDE_ITENS"] = qtde_por_doacao.reindex(chaves["ID_DOACAO"], fill_value=0).to_numpy()
+
+    return (
+        chaves.groupby(CHAVES_ROLLUP, observed=True, sort=True, dropna=False)
+        .agg(QTD_DOACOES=("ID_DOACAO", "size"), QTDE_ITENS=("QTDE_ITENS", "sum"))
+        .reset_index()
+    )
+
+
+def construir_rollup_itens(df_doacoes, df_doacao_itens):
+    chaves = _chaves_doacoes(df_doacoes)[["ID_DOACAO", "DATA", "STATUS", "ID_INSTITUICAO"]]
+    itens = df_doacao_itens[["ID_DOACAO", "ITEM", "QTDE"]].merge(chaves, on="ID_DOACAO", how="inner")
+    itens["QTDE"] = itens["QTDE"].astype("int64")
+
+    return (
+        itens.groupby(CHAVES_ROLLUP_ITENS, observed=True, sort=True, dropna=False)["QTDE"]
+        .sum()
+        .reset_index()
+    )
+
+
+def construir_rollup_impacto(df_doacoes, df_impacto):
+    # quantas linhas de IMPACTO tiveram cada pontuação, por dia/status/instituição
+    # da doação: um histograma por grupo, que se soma entre grupos
+    chaves = _chaves_doacoes(df_doacoes)[["ID_DOACAO", "DATA", "STATUS", "ID_INSTITUICAO"]]
+    impacto = df_impacto[["ID_DOACAO", "PONTUACAO"]].merge(chaves, on="ID_DOACAO", how="inner")
+
+    return (
+        impacto.groupby(CHAVES_ROLLUP_IMPACTO, observed=True, sort=True, dropna=False)
+        .size()
+        .rename("QTD")
+        .reset_index()
+    )
+
+
+def atualizar_rollup(rollup, chaves, entrada, saida):
+    # Soma a contribuição das linhas que entraram e subtrai a das que saíram
+    # (versões antigas de linhas alteradas). Só as datas tocadas são
+    # reagrupadas; grupos que zeraram somem do cubo.
+    medidas = [c for c in rollup.columns if c not in chaves]
+    if entrada.empty and saida.empty:
+        return rollup
+
+    # categorias novas (ex.: um ITEM inédito) entram no dicionário do cubo
+    for chave in chaves:
+        tipo = rollup[chave].dtype
+        if not isinstance(tipo, pd.CategoricalDtype):
+            continue
+        categorias = tipo.categories
+        for parte in (entrada, saida):
+            categorias = categorias.union(parte[chave].cat.categories, sort=False)
+        if len(categorias) > len(tipo.categories):
+            rollup = rollup.assign(**{chave: rollup[chave].cat.set_categories(categorias)})
+        entrada = entrada.assign(**{chave: entrada[chave].cat.set_categories(categorias)})
+        saida = saida.assign(**{chave: saida[chave].cat.set_categories(categorias)})
+
+    saida = saida.assign(**{m: -saida[m] for m in medidas})
+    delta = pd.concat([entrada, saida], ignore_index=True)
+
+    tocadas = np.isin(rollup["DATA"].to_numpy(), delta["DATA"].unique())
+    reagrupado = (
+        pd.concat([rollup[tocadas], delta], ignore_index=True)
+        .groupby(chaves, observed=True, sort=True, dropna=False)[medidas]
+        .sum()
+        .reset_index()
+    )
+    reagrupado = reagrupado[reagrupado[medidas[0]] != 0]
+    return (
+        pd.concat([rollup[~tocadas], reagrupado.astype({m: rollup[m].dtype for m in medidas})], ignore_index=True)
+        .sort_values("DATA", kind="stable", ignore_index=True)
+    )
+
+
+def fatiar(rollup, data_ini, data_fim, status=None, id_instituicao=None):
+    # os cubos saem do groupby ordenados por DATA, a primeira chave
+    fatia = rollup.iloc[fatia_periodo(rollup["DATA"].to_numpy(dtype="datetime64[ns]"), data_ini, data_fim)]
+    mascara = mascara_status_instituicao(fatia, status, id_instituicao)
+    return fatia if mascara is None else fatia[mascara]
+
+
+# ---------------------------------------------------------
+# CONSULTAS SOBRE O ROLLUP
+# ---------------------------------------------------------
+def calcular_kpis(fatia):
+    total_doacoes = int(fatia["QTD_DOACOES"].sum())
+    total_concluidas = int(fatia.loc[fatia["STATUS"] == "CONCLUIDA", "QTD_DOACOES"].sum())
+    itens_totais = int(fatia["QTDE_ITENS"].sum())
+
+    return {
+        "total_doacoes": total_doacoes,
+        "total_concluidas": total_concluidas,
+        "taxa_conclusao": (total_concluidas / total_doacoes) * 100 if total_doacoes > 0 else 0,
+        "itens_medios": itens_totais / total_doacoes if total_doacoes > 0 else 0,
+    }
+
+
+def contagem_status(fatia):
+    s = fatia.groupby("STATUS", observed=True)["QTD_DOACOES"].sum()
+    s = s[s > 0].sort_values(ascending=False, kind="stable")
+    df_status = s.reset_index()
+    df_status.columns = ["STATUS", "QTD"]
+    df_status["STATUS"] = df_status["STATUS"].astype(str)
+    return df_status
+
+
+def serie_diaria(fatia):
+    return fatia.groupby("DATA")["QTD_DOACOES"].sum().reset_index()
+
+
+def top_instituicoes(fatia, indice_instituicoes, n=10):
+    df_inst_count = fatia.groupby("ID_INSTITUICAO")["QTD_DOACOES"].sum().reset_index()
+    df_inst_count = df_inst_count.sort_values("QTD_DOACOES", ascending=False, kind="stable").head(n)
+    df_inst_count["NOME"] = indice_instituicoes.nomes_de(df_inst_count["ID_INSTITUICAO"].to_numpy())
+    return df_inst_count.reset_index(drop=True)
+
+
+def top_itens(fatia_itens, n=10):
+    df_items_count = fatia_itens.groupby("ITEM", observed=True)["QTDE"].sum().reset_index()
+    df_items_count = df_items_count[df_items_count["QTDE"] > 0]
+    df_items_count["ITEM"] = df_items_count["ITEM"].astype(str)
+    return df_items_count.sort_values("QTDE", ascending=False, kind="stable").head(n)
+
+
+def grade(linhas, n_linhas, colunas, n_colunas, pesos):
+    # matriz densa n_linhas x n_colunas com a soma dos pesos de cada célula,
+    # em um único bincount sobre códigos inteiros (linha * n_colunas + coluna)
+    celulas = np.asarray(linhas, dtype=np.int64) * n_colunas + np.asarray(colunas, dtype=np.int64)
+    z = np.bincount(celulas, weights=pesos, minlength=n_linhas * n_colunas)
+    return z.reshape(n_linhas, n_colunas).astype(np.int64)
+
+
+def matriz_heatmap(fatia):
+    # 7 x 24 (dia da semana x hora), sempre do mesmo tamanho
+    z = grade(fatia["DIA_SEMANA"].to_numpy(), 7, fatia["HORA"].to_numpy(), 24, fatia["QTD_DOACOES"].to_numpy())
+    return pd.DataFrame(z, index=list(DIAS_SEMANA.values()), columns=range(24))
+
+
+def numero_semana(datas):
+    # semanas (segunda a domingo) desde 1970-01-05, a primeira segunda-feira da época
+    return (np.asarray(datas, dtype="datetime64[D]").astype(np.int64) - 4) // 7
+
+
+def inicio_semana(semanas):
+    return pd.DatetimeIndex((np.datetime64("1970-01-05") + np.asarray(semanas) * 7).astype("datetime64[ns]"))
+
+
+def matriz_instituicao_semana(fatia, indice_instituicoes, n=15):
+    # instituições (as n maiores + "Outras") x semanas (segunda a domingo)
+    if fatia.empty:
+        return pd.DataFrame()
+
+    semanas = numero_semana(fatia["DATA"])
+    primeira = semanas.min()
+    n_semanas = int(semanas.max() - primeira) + 1
+
+    ids, codigos = np.unique(fatia["ID_INSTITUICAO"].to_numpy(), return_inverse=True)
+    pesos = fatia["QTD_DOACOES"].to_numpy()
+    totais = np.bincount(codigos, weights=pesos, minlength=len(ids))
+    maiores = np.argsort(-totais, kind="stable")[:n]
+
+    # linha de cada instituição: posição no ranking, ou a linha "Outras"
+    linha = np.full(len(ids), len(maiores), dtype=np.int64)
+    linha[maiores] = np.arange(len(maiores))
+    n_linhas = len(maiores) + (len(ids) > len(maiores))
+
+    z = grade(linha[codigos], n_linhas, semanas - primeira, n_semanas, pesos)
+    nomes = list(indice_instituicoes.nomes_de(ids[maiores]))
+    if n_linhas > len(maiores):
+        nomes.append("Outras")
+    return pd.DataFrame(z, index=nomes, columns=inicio_semana(primeira + np.arange(n_semanas)))
+
+
+AGREGADOS = ["kpis", "status", "serie", "top_instituicoes", "top_itens", "heatmap", "instituicao_semana"]
+
+CONSULTAS = {
+    "kpis": calcular_kpis,
+    "status": contagem_status,
+    "serie": serie_diaria,
+    "heatmap": matriz_heatmap,
+}
+
+
+def consultar(nome, fatia, indice_instituicoes):
+    # fatia já filtrada (do rollup de itens para "top_itens")
+    if nome == "top_itens":
+        return top_itens(fatia)
+    if nome == "top_instituicoes":
+        return top_instituicoes(fatia, indice_instituicoes)
+    if nome == "instituicao_semana":
+        return matriz_instituicao_semana(fatia, indice_instituicoes)
+    return CONSULTAS[nome](fatia)
+
+
+def calcular_agregado(nome, rollup, rollup_itens, indice_instituicoes, data_ini, data_fim, status=None, id_instituicao=None):
+    # um agregado por vez, para que cada seção do dashboard calcule só o que mostra
+    cubo = rollup_itens if nome == "top_itens" else rollup
+    return consultar(nome, fatiar(cubo, data_ini, data_fim, status, id_instituicao), indice_instituicoes)
+
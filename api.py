@@ -0,0 +1,375 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date
+from urllib.parse import parse_qs
+
+import numpy as np
+import pandas as pd
+
+import banco_dados
+import preparacao
+from agregacoes import AGREGADOS, calcular_agregado
+from busca import ENTIDADES
+from cache import CacheLRU
+from ciclo_vida import pendentes_atuais
+from correspondencia import corresponder
+from esquema import TABELAS
+from impacto import IMPACTOS, calcular_impacto
+from paralelo import pool_do_ambiente
+from filtros import chave_filtros, limites_datas, status_presentes
+from snapshot import marcas_dagua
+
+# =========================================================
+# API HTTP/JSON DOS INDICADORES (ASGI)
+# =========================================================
+# Os mesmos KPIs e agregados do dashboard, sem Streamlit, para integrações:
+#
+#   GET /saude                      versão dos dados e linhas por tabela
+#   GET /kpis                       total, concluídas, taxa, itens médios
+#   GET /agregados/<nome>           status, serie, top_instituicoes, ...
+#                                   e impacto_resumo, impacto_semanas, ...
+#   GET /correspondencias           instituições candidatas para itens
+#   GET /busca/<entidade>?q=...     usuarios, instituicoes ou itens
+#
+# Filtros na query string, os mesmos da sidebar: data_ini, data_fim
+# (AAAA-MM-DD), status (separados por vírgula) e instituicao (id). Em
+# /correspondencias os itens vêm de itens (ids separados por vírgula) ou de
+# desde/ate (DT_REGISTRO, AAAA-MM-DD), e n é o número de candidatas por item.
+# Em /busca, q é o texto digitado e n o número de resultados.
+#
+# As tabelas vêm de preparacao.py com o mesmo diretório de snapshot do
+# dashboard, então os dois processos leem os mesmos arquivos Arrow. Cada
+# resposta já serializada fica em cache pela versão dos dados + filtros, e
+# o ETag é calculado só a partir dessa chave: um poll com If-None-Match e
+# dados inalterados recebe 304 sem nenhum cálculo. As requisições rodam em
+# threads (asyncio.to_thread), então várias podem ser atendidas ao mesmo
+# tempo; a recarga periódica acontece em uma delas enquanto as outras
+# continuam usando a versão anterior.
+#
+#   python api.py [porta]          (requer uvicorn)
+
+TTL_DADOS = 300
+MAX_RESPOSTAS = 256
+
+# segundos que uma requisição espera pela primeira carga feita em outra thread
+ESPERA_CARGA = 120
+
+# estruturas e tabelas cujo conteúdo entra na versão dos dados
+ESTRUTURAS_VERSAO = ["rollup", "rollup_itens", "rollup_impacto", "cubo_fila"]
+TABELAS_VERSAO = ["INSTITUICAO", "ITEM"]
+
+
+class ErroRequisicao(ValueError):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+def versao_dados(tabelas, estruturas):
+    # Hash do conteúdo de cada carga: os rollups e o cubo da fila (tudo o que
+    # os agregados leem, inclusive mudanças de status sem data), INSTITUICAO e
+    # ITEM (correspondências), marcas d'água e linhas por tabela. Uma recarga
+    # com os mesmos dados mantém a versão, e os ETags continuam valendo.
+    conteudo = json.dumps({"marcas": marcas_dagua(tabelas), "linhas": [len(df) for df in tabelas]}, sort_keys=True)
+    h = hashlib.sha1(conteudo.encode("utf-8"))
+    for df in [estruturas[nome] for nome in ESTRUTURAS_VERSAO] + [tabelas[TABELAS.index(t)] for t in TABELAS_VERSAO]:
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+
+def serializar(valor):
+    if isinstance(valor, pd.DataFrame):
+        # matrizes (heatmaps) têm rótulos nas linhas: orient split os preserva;
+        # tabelas com índice numérico viram uma lista de registros
+        orient = "records" if pd.api.types.is_integer_dtype(valor.index.dtype) else "split"
+        return valor.to_json(orient=orient, date_format="iso", force_ascii=False).encode("utf-8")
+    return json.dumps(valor, ensure_ascii=False).encode("utf-8")
+
+
+def _data(texto, nome):
+    try:
+        return date.fromisoformat(texto)
+    except ValueError:
+        raise ErroRequisicao(400, f"{nome} inválida: {texto!r} (use AAAA-MM-DD)") from None
+
+
+def _etag(identidade):
+    return '"' + hashlib.sha1(identidade.encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def _nao_modificado(etag, if_none_match):
+    etags = {e.strip().removeprefix("W/") for e in if_none_match.split(",") if e.strip()}
+    return etag in etags or "*" in etags
+
+
+class ServicoIndicadores:
+    def __init__(self, carregar, ttl=TTL_DADOS, max_respostas=MAX_RESPOSTAS, calcular=calcular_agregado):
+        self.carregar = carregar  # () -> (tabelas, estruturas)
+        self.calcular = calcular  # calcular_agregado ou PoolAgregacoes.calcular
+        self.ttl = ttl
+        self.respostas = CacheLRU(max_entradas=max_respostas)
+        self._estado = None
+        self._recarregando = False
+        self._cargas = 0
+        self._lock = threading.Lock()
+        self._carga_concluida = threading.Condition(self._lock)
+
+    def _montar_estado(self):
+        tabelas, estruturas = self.carregar()
+        df_doacoes = tabelas[3]
+        return {
+            "tabelas": tabelas,
+            "estruturas": estruturas,
+            "versao": versao_dados(tabelas, estruturas),
+            "limites": limites_datas(df_doacoes),
+            "status": status_presentes(df_doacoes),
+            "carregado_em": time.monotonic(),
+        }
+
+    def estado(self):
+        with self._lock:
+            while True:
+                estado = self._estado
+                if estado is not None and time.monotonic() - estado["carregado_em"] <= self.ttl:
+                    return estado
+                if not self._recarregando:
+                    self._recarregando = True
+                    break
+                if estado is not None:
+                    return estado  # outra thread está recarregando: usa a versão anterior
+                # primeira carga em andamento em outra thread: espera por ela e
+                # falha junto se ela falhar
+                cargas = self._cargas
+                if not self._carga_concluida.wait_for(lambda: self._cargas != cargas, timeout=ESPERA_CARGA):
+                    raise ErroRequisicao(503, "dados ainda sendo carregados, tente novamente")
+                if self._estado is None:
+                    raise ErroRequisicao(503, "falha ao carregar os dados")
+
+        # qualquer falha libera a próxima tentativa de carga
+        novo = None
+        try:
+            novo = self._montar_estado()
+        except banco_dados.ErroBanco:
+            if estado is None:
+                raise
+            # banco fora do ar: segue com a versão anterior até o próximo TTL
+            novo = dict(estado, carregado_em=time.monotonic())
+        finally:
+            with self._lock:
+                if novo is not None:
+                    self._estado = novo
+                self._recarregando = False
+                self._cargas += 1
+                self._carga_concluida.notify_all()
+        return novo
+
+    def filtros(self, estado, query):
+        data_min, data_max = estado["limites"]
+        data_ini = _data(query["data_ini"], "data_ini") if query.get("data_ini") else data_min
+        data_fim = _data(query["data_fim"], "data_fim") if query.get("data_fim") else data_max
+        if data_ini is None or data_fim is None:
+            data_ini = data_fim = date.today()
+
+        status = [s.strip().upper() for s in query.get("status", "").split(",") if s.strip()]
+        desconhecidos = set(status) - set(estado["status"])
+        if desconhecidos:
+            raise ErroRequisicao(400, f"status desconhecido: {', '.join(sorted(desconhecidos))}")
+
+        instituicao = query.get("instituicao")
+        try:
+            id_instituicao = int(instituicao) if instituicao else None
+        except ValueError:
+            raise ErroRequisicao(400, f"instituicao inválida: {instituicao!r}") from None
+        return data_ini, data_fim, status or list(estado["status"]), id_instituicao
+
+    def responder(self, caminho, query, if_none_match=""):
+        # devolve (status, cabeçalhos, corpo)
+        try:
+            return self._responder(caminho.rstrip("/") or "/", query, if_none_match)
+        except ErroRequisicao as e:
+            return self._json(e.status, {"erro": str(e)})
+        except banco_dados.ErroBanco as e:
+            return self._json(503, {"erro": f"Erro ao consultar o banco: {e}"})
+
+    def _responder(self, caminho, query, if_none_match):
+        estado = self.estado()
+
+        if caminho == "/saude":
+            return self._json(200, {
+                "versao": estado["versao"],
+                "linhas": {tabela: len(df) for tabela, df in zip(TABELAS, estado["tabelas"])},
+                "agregados": AGREGADOS + IMPACTOS,
+            })
+
+        if caminho == "/correspondencias":
+            return self._correspondencias(estado, query, if_none_match)
+
+        if caminho.startswith("/busca/"):
+            return self._buscar(estado, caminho.removeprefix("/busca/"), query)
+
+        if caminho == "/kpis":
+            nome = "kpis"
+        elif caminho.startswith("/agregados/"):
+            nome = caminho.removeprefix("/agregados/")
+            if nome not in AGREGADOS and nome not in IMPACTOS:
+                raise ErroRequisicao(404, f"agregado desconhecido: {nome}")
+        else:
+            raise ErroRequisicao(404, f"rota desconhecida: {caminho}")
+
+        filtros = self.filtros(estado, query)
+        chave = (estado["versao"], nome) + chave_filtros(*filtros)
+        # estável entre processos (sem depender da ordem de um frozenset)
+        data_ini, data_fim, status, id_instituicao = filtros
+        identidade = repr((estado["versao"], nome, str(data_ini), str(data_fim), sorted(status), id_instituicao))
+        etag = _etag(identidade)
+        cabecalhos = [(b"etag", etag.encode()), (b"cache-control", b"no-cache")]
+        if _nao_modificado(etag, if_none_match):
+            return 304, cabecalhos, b""
+
+        estruturas = estado["estruturas"]
+        if nome in IMPACTOS:
+            calcular = lambda: calcular_impacto(nome, estruturas["rollup_impacto"], estruturas["instituicoes"], *filtros)
+        else:
+            calcular = lambda: self.calcular(
+                nome,
+                estruturas["rollup"],
+                estruturas["rollup_itens"],
+                estruturas["instituicoes"],
+                *filtros,
+            )
+        corpo = self.respostas.obter(chave, lambda: serializar(calcular()))
+        return 200, cabecalhos + [(b"content-type", b"application/json; charset=utf-8")], corpo
+
+    def _correspondencias(self, estado, query, if_none_match):
+        df_itens = estado["tabelas"][TABELAS.index("ITEM")]
+        try:
+            ids = tuple(sorted({int(i) for i in query.get("itens", "").split(",") if i.strip()}))
+            n = int(query.get("n", 5))
+        except ValueError:
+            raise ErroRequisicao(400, "itens e n devem ser inteiros") from None
+        desde = _data(query["desde"], "desde") if query.get("desde") else None
+        ate = _data(query["ate"], "ate") if query.get("ate") else None
+        if not ids and desde is None and ate is None:
+            raise ErroRequisicao(400, "informe itens ou desde/ate")
+        if not 1 <= n <= 50:
+            raise ErroRequisicao(400, "n deve estar entre 1 e 50")
+
+        identidade = repr((estado["versao"], "correspondencias", ids, str(desde), str(ate), n))
+        etag = _etag(identidade)
+        cabecalhos = [(b"etag", etag.encode()), (b"cache-control", b"no-cache")]
+        if _nao_modificado(etag, if_none_match):
+            return 304, cabecalhos, b""
+
+        def calcular():
+            selecao = np.ones(len(df_itens), dtype=bool)
+            if ids:
+                selecao &= df_itens["ID_ITEM"].isin(ids).to_numpy()
+            datas = df_itens["DT_REGISTRO"]
+            if desde is not None:
+                selecao &= (datas >= pd.Timestamp(desde)).to_numpy()
+            if ate is not None:
+                selecao &= (datas < pd.Timestamp(ate) + pd.Timedelta(days=1)).to_numpy()
+            estruturas = estado["estruturas"]
+            return corresponder(
+                estruturas["categorias"],
+                df_itens[selecao],
+                pendentes_atuais(estruturas["cubo_fila"]),
+                estruturas["instituicoes"],
+                n=n,
+            )
+
+        corpo = self.respostas.obter(("correspondencias", identidade), lambda: serializar(calcular()))
+        return 200, cabecalhos + [(b"content-type", b"application/json; charset=utf-8")], corpo
+
+    def _buscar(self, estado, entidade, query):
+        # sem cache de respostas: cada tecla é uma busca nova, e o índice
+        # responde em poucos milissegundos
+        if entidade not in ENTIDADES:
+            raise ErroRequisicao(404, f"entidade desconhecida: {entidade}")
+        try:
+            n = int(query.get("n", 10))
+        except ValueError:
+            raise ErroRequisicao(400, "n deve ser inteiro") from None
+        if not 1 <= n <= 50:
+            raise ErroRequisicao(400, "n deve estar entre 1 e 50")
+        resultados = estado["estruturas"]["busca"][entidade].resultados(query.get("q", ""), n)
+        return 200, [(b"content-type", b"application/json; charset=utf-8")], serializar(resultados)
+
+    @staticmethod
+    def _json(status, conteudo):
+        return status, [(b"content-type", b"application/json; charset=utf-8")], serializar(conteudo)
+
+
+def criar_app(servico):
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                mensagem = await receive()
+                if mensagem["type"] == "lifespan.startup":
+                    # primeira carga antes de aceitar requisições
+                    await asyncio.to_thread(servico.estado)
+                    await send({"type": "lifespan.startup.complete"})
+                elif mensagem["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        if scope["type"] != "http":
+            return
+
+        if scope["method"] not in ("GET", "HEAD"):
+            status, cabecalhos, corpo = ServicoIndicadores._json(405, {"erro": "use GET"})
+        else:
+            query = {k: v[-1] for k, v in parse_qs(scope["query_string"].decode("latin-1")).items()}
+            cabecalhos_req = dict(scope["headers"])
+            if_none_match = cabecalhos_req.get(b"if-none-match", b"").decode("latin-1")
+            status, cabecalhos, corpo = await asyncio.to_thread(servico.responder, scope["path"], query, if_none_match)
+
+        cabecalhos = cabecalhos + [(b"content-length", str(len(corpo)).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": cabecalhos})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else corpo})
+
+    return app
+
+
+def servico_do_ambiente():
+    # mesma configuração do dashboard: banco se HELPLINK_DB_URL, senão demo
+    diretorio = os.environ.get(
+        "HELPLINK_SNAPSHOT_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), ".helplink_snapshot"),
+    )
+    usar_snapshot = os.environ.get("HELPLINK_SNAPSHOT", "1") != "0"
+    url = os.environ.get("HELPLINK_DB_URL")
+    pool = pool_do_ambiente()
+    calcular = pool.calcular if pool is not None else calcular_agregado
+
+    if url:
+        pool_banco = banco_dados.criar_pool(url)
+        if usar_snapshot:
+            return ServicoIndicadores(lambda: preparacao.carregar_banco(pool_banco, url, diretorio), calcular=calcular)
+
+        def carregar():
+            tabelas = preparacao.preparar_tabelas(banco_dados.carregar_tabelas(pool_banco))
+            return tabelas, preparacao.construir_estruturas(tabelas)
+
+        return ServicoIndicadores(carregar, calcular=calcular)
+
+    escala = float(os.environ.get("HELPLINK_ESCALA_DEMO", "1"))
+    return ServicoIndicadores(lambda: preparacao.carregar_demo(escala, diretorio if usar_snapshot else None), calcular=calcular)
+
+
+if __name__ == "__main__":
+    #   python api.py 8000
+    #   curl -i 'http://127.0.0.1:8000/kpis?data_ini=2025-01-01&status=CONCLUIDA'
+    import sys
+
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("A API requer um servidor ASGI: pip install uvicorn")
+
+    porta = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    uvicorn.run(criar_app(servico_do_ambiente()), host="127.0.0.1", port=porta, log_level="warning")
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from cache import CacheLRU
+
+# =========================================================
+# ARMAZÉM DE TABELAS DO PROCESSO
+# =========================================================
+# Uma única cópia das tabelas carregadas (e dos rollups/índices) por
+# processo, lida por todas as sessões. st.cache_data não serve para isso:
+# ele guarda o resultado serializado e devolve uma cópia nova a cada rerun
+# de cada sessão, então a memória crescia com o número de usuários e cada
+# rerun pagava a desserialização.
+#
+# Aqui as sessões recebem os mesmos objetos e só os leem; o estado por
+# sessão fica restrito aos filtros. Para que uma sessão não altere os dados
+# das outras por engano, as colunas numéricas, de datas e os códigos das
+# categóricas das tabelas e dos rollups passam a ser views somente leitura
+# (uma atribuição como df.loc[i, c] = v falha), sem cópia. Vindas do
+# snapshot, essas colunas continuam apontando para os arquivos Arrow
+# mapeados em memória. Filtros e junções já criam DataFrames novos, e com o
+# Copy-on-Write do pandas o que é derivado deles nunca escreve no original.
+#
+# A carga de uma chave acontece uma vez: sessões que chegam durante ela
+# esperam o resultado em vez de carregar de novo.
+
+if int(pd.__version__.split(".")[0]) < 3:
+    # no pandas >= 3 o Copy-on-Write é sempre ligado
+    pd.set_option("mode.copy_on_write", True)
+
+
+def _somente_leitura(valores):
+    valores = valores.view()
+    valores.flags.writeable = False
+    return valores
+
+
+def congelar(df):
+    # mesmo conteúdo, com as colunas numpy como views somente leitura
+    colunas = {}
+    for nome in df.columns:
+        serie = df[nome]
+        if isinstance(serie.dtype, np.dtype):
+            colunas[nome] = _somente_leitura(serie.to_numpy())
+        elif isinstance(serie.dtype, pd.CategoricalDtype):
+            colunas[nome] = pd.Categorical.from_codes(_somente_leitura(serie.cat.codes.to_numpy()), dtype=serie.dtype)
+        else:
+            colunas[nome] = serie.array  # textos: arrays do Arrow ou do pandas
+    return pd.DataFrame(colunas, index=df.index, copy=False)
+
+
+class ArmazemTabelas:
+    def __init__(self, max_entradas=2, ttl=None):
+        self._entradas = CacheLRU(max_entradas=max_entradas, ttl=ttl)
+        self._cargas = {}  # chave -> lock da carga em andamento
+        self._lock = threading.Lock()
+        self.cargas = 0
+
+    def obter(self, chave, carregar):
+        # carregar() -> (tabelas, estruturas); devolve (tabelas, estruturas, versão)
+        encontrado, valor = self._entradas.consultar(chave)
+        if encontrado:
+            return valor
+
+        with self._lock:
+            carga = self._cargas.setdefault(chave, threading.Lock())
+        try:
+            with carga:
+                encontrado, valor = self._entradas.consultar(chave)
+                if not encontrado:
+                    tabelas, estruturas = carregar()
+                    estruturas = dict(estruturas)
+                    for nome in ("rollup", "rollup_itens", "rollup_impacto", "cubo_fila"):
+                        estruturas[nome] = congelar(estruturas[nome])
+                    # a versão identifica a carga nos caches derivados
+                    valor = (tuple(congelar(df) for df in tabelas), estruturas, time.time())
+                    self._entradas.guardar(chave, valor)
+                    self.cargas += 1
+        finally:
+            with self._lock:
+                if self._cargas.get(chave) is carga:
+                    del self._cargas[chave]
+        return valor
+
+    def limpar(self):
+        self._entradas.limpar()
+
+    def memoria_mb(self):
+        # tabelas guardadas, pelo relatório feito na carga (sem rollups e índices)
+        return sum(float(estruturas["memoria"]["MEMORIA_MB"].sum()) for _, estruturas, _ in self._entradas.valores())
+
+    def __len__(self):
+        return len(self._entradas)
@@ -0,0 +1,334 @@
+import argparse
+import gc
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+import numpy as np
+
+from agregacoes import AGREGADOS, calcular_agregado
+from busca import ENTIDADES, IndiceBusca
+from ciclo_vida import (
+    coortes_semanais,
+    distribuicao_espera,
+    fila_diaria,
+    pendentes_atuais,
+    pendentes_por_instituicao,
+    referencia_periodo,
+)
+from correspondencia import corresponder
+from dados_demo import escala_para_doacoes, gerar_dados_demo
+from esquema import TABELAS
+from filtros import filtrar_doacoes, limites_datas, status_presentes
+from paginacao import mascara_busca, ordem_coluna, paginar
+from preparacao import construir_estruturas, preparar_tabelas
+from impacto import IMPACTOS, calcular_impacto
+from resolucao import agrupar_serie, escolher_granularidade, tamanho_figura
+import snapshot
+
+# =========================================================
+# BENCHMARK DO PIPELINE DE DADOS DO DASHBOARD
+# =========================================================
+# Mede cada etapa do dashboard sem Streamlit, com o gerador de dados demo
+# em escalas de 10^3 a 10^7 doações: carga, preparação, filtros da sidebar,
+# filtro das tabelas filhas, cada agregado (inclusive impacto e ciclo de
+# vida), a correspondência dos itens com as instituições, os índices de
+# busca, cada figura e a paginação.
+#
+# Para cada etapa: tempo mínimo e mediano de algumas repetições e o pico de
+# memória alocada (tracemalloc, em uma execução separada para não distorcer
+# os tempos). Os resultados podem ser gravados em JSON e comparados com uma
+# execução anterior para barrar regressões antes do deploy:
+#
+#   python benchmark.py --saida base.json
+#   python benchmark.py --comparar base.json --tolerancia 1.3
+#   python benchmark.py --doacoes 1e3,1e4,1e5,1e6,1e7 --repeticoes 3
+
+DOACOES_PADRAO = [10**3, 10**4, 10**5, 10**6]
+REPETICOES = 5
+TOLERANCIA = 1.3
+# etapas mais rápidas que isto não contam como regressão (ruído do relógio)
+TEMPO_MINIMO_REGRESSAO = 0.005
+
+# termo digitado em cada busca medida
+BUSCAS = {"usuarios": "usuario 12", "instituicoes": "casa apoio", "itens": "roupa"}
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    resultado = None
+    for _ in range(repeticoes):
+        gc.collect()
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+
+    gc.collect()
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    medida = {
+        "min_s": min(tempos),
+        "mediana_s": statistics.median(tempos),
+        "pico_mb": pico / 1024 / 1024,
+    }
+    return resultado, medida
+
+
+def etapas(n_doacoes, diretorio):
+    # gera (nome, função) na ordem do dashboard; cada função usa o resultado
+    # das anteriores, como em uma execução real
+    escala = escala_para_doacoes(n_doacoes)
+    estado = {}
+
+    def carregar():
+        estado["brutas"] = gerar_dados_demo(escala=escala)
+        return estado["brutas"]
+
+    yield "carga_demo", carregar
+    yield "snapshot_gravar", lambda: snapshot.salvar_snapshot(diretorio, estado["brutas"], "benchmark")
+    yield "snapshot_ler", lambda: snapshot.ler_snapshot(diretorio, "benchmark")
+
+    def preparar():
+        estado["tabelas"] = preparar_tabelas(estado["brutas"])
+        return estado["tabelas"]
+
+    yield "preparar_tabelas", preparar
+
+    def estruturas():
+        estado["estruturas"] = construir_estruturas(estado["tabelas"])
+        return estado["estruturas"]
+
+    yield "construir_estruturas", estruturas
+
+    def opcoes_sidebar():
+        df_doacoes = estado["tabelas"][3]
+        data_min, data_max = limites_datas(df_doacoes)
+        status = status_presentes(df_doacoes)
+        # filtro típico: últimos 30 dias, dois status, todas as instituições
+        estado["filtros"] = (max(data_min, data_max - timedelta(days=30)), data_max, status[:2], None)
+        return estado["filtros"]
+
+    yield "opcoes_sidebar", opcoes_sidebar
+
+    def filtrar():
+        _, _, _, df_doacoes, df_impacto, df_doacao_itens = estado["tabelas"]
+        estado["visoes"] = filtrar_doacoes(
+            df_doacoes,
+            df_doacao_itens,
+            df_impacto,
+            estado["estruturas"]["juncao_itens"],
+            estado["estruturas"]["juncao_impacto"],
+            *estado["filtros"],
+        )
+        return estado["visoes"]
+
+    yield "filtrar_doacoes", filtrar
+
+    def filhas():
+        # só a parte das tabelas filhas (índice de junção), isolada
+        posicoes = np.arange(len(estado["visoes"][0]))
+        return estado["estruturas"]["juncao_itens"].linhas(posicoes), estado["estruturas"]["juncao_impacto"].linhas(posicoes)
+
+    yield "juncao_filhas", filhas
+
+    estado["agregados"] = {}
+    for nome in AGREGADOS:
+        def agregar(nome=nome):
+            estado["agregados"][nome] = calcular_agregado(
+                nome,
+                estado["estruturas"]["rollup"],
+                estado["estruturas"]["rollup_itens"],
+                estado["estruturas"]["instituicoes"],
+                *estado["filtros"],
+            )
+            return estado["agregados"][nome]
+
+        yield f"agregado:{nome}", agregar
+
+    for nome in IMPACTOS:
+        def analisar_impacto(nome=nome):
+            estado["agregados"][nome] = calcular_impacto(
+                nome,
+                estado["estruturas"]["rollup_impacto"],
+                estado["estruturas"]["instituicoes"],
+                *estado["filtros"],
+            )
+            return estado["agregados"][nome]
+
+        yield f"impacto:{nome}", analisar_impacto
+
+    data_ini, data_fim, _, id_instituicao = estado["filtros"]
+    doacoes_filtradas = lambda: estado["visoes"][0]
+    ciclo = {
+        "fila_diaria": lambda: fila_diaria(estado["estruturas"]["cubo_fila"], data_ini, data_fim, id_instituicao),
+        "espera": lambda: distribuicao_espera(doacoes_filtradas()),
+        "coortes": lambda: coortes_semanais(doacoes_filtradas()),
+        "pendentes": lambda: pendentes_por_instituicao(
+            estado["tabelas"][3], estado["estruturas"]["instituicoes"], referencia_periodo(data_fim), id_instituicao
+        ),
+    }
+    for nome, calcular in ciclo.items():
+        def analisar_ciclo(nome=nome, calcular=calcular):
+            estado["agregados"][nome] = calcular()
+            return estado["agregados"][nome]
+
+        yield f"ciclo:{nome}", analisar_ciclo
+
+    def encaminhar():
+        # todos os itens da carga, como um lote de itens recém-registrados
+        estruturas = estado["estruturas"]
+        return corresponder(
+            estruturas["categorias"],
+            estado["tabelas"][2],
+            pendentes_atuais(estruturas["cubo_fila"]),
+            estruturas["instituicoes"],
+        )
+
+    yield "correspondencia", encaminhar
+
+    # índice de busca de cada entidade (montado na primeira busca) e uma
+    # busca de type-ahead sobre ele
+    for entidade, termo in BUSCAS.items():
+        tabela, coluna_id, coluna_rotulo, colunas = ENTIDADES[entidade]
+
+        def montar(entidade=entidade, tabela=tabela, coluna_id=coluna_id, coluna_rotulo=coluna_rotulo, colunas=colunas):
+            df = estado["tabelas"][TABELAS.index(tabela)]
+            estado[f"busca:{entidade}"] = IndiceBusca(df, coluna_id, coluna_rotulo, colunas)
+            return estado[f"busca:{entidade}"]
+
+        yield f"indice_busca:{entidade}", montar
+        yield f"busca:{entidade}", lambda entidade=entidade, termo=termo: estado[f"busca:{entidade}"].buscar(termo, 10)
+
+    yield from etapas_figuras(estado)
+
+    def pagina():
+        df_doacoes = estado["tabelas"][3]
+        ordem = ordem_coluna(df_doacoes["ID_INSTITUICAO"], ascendente=False)
+        mascara = mascara_busca(df_doacoes, "CONCLUIDA")
+        return paginar(df_doacoes, 3, 50, ordem, mascara)
+
+    yield "pagina_detalhes", pagina
+
+
+def etapas_figuras(estado):
+    # plotly é opcional para o benchmark: sem ele, só as figuras ficam de fora
+    try:
+        import graficos
+    except ImportError:
+        return
+
+    agregados = estado["agregados"]
+    data_ini, data_fim = estado["filtros"][:2]
+    figuras = {
+        "status": lambda: graficos.figura_status_barras(agregados["status"]),
+        "serie": lambda: graficos.figura_serie(
+            agrupar_serie(agregados["serie"], "DATA", ["QTD_DOACOES"], escolher_granularidade(data_ini, data_fim))
+        ),
+        "top_instituicoes": lambda: graficos.figura_top_instituicoes(agregados["top_instituicoes"]),
+        "top_itens": lambda: graficos.figura_top_itens(agregados["top_itens"]),
+        "impacto": lambda: graficos.figura_impacto(agregados["impacto_distribuicao"]),
+        "impacto_semanas": lambda: graficos.figura_impacto_semanas(agregados["impacto_semanas"]),
+        "fila_diaria": lambda: graficos.figura_fila_diaria(agregados["fila_diaria"]),
+        "espera": lambda: graficos.figura_espera(agregados["espera"][0]),
+        "heatmap": lambda: graficos.figura_heatmap(agregados["heatmap"], "Hora", "Dia da semana"),
+        "instituicao_semana": lambda: graficos.figura_heatmap(agregados["instituicao_semana"], "Semana", "Instituição"),
+    }
+    for nome, construir in figuras.items():
+        # tempo de montar a figura e serializar o JSON que iria para o browser
+        yield f"figura:{nome}", lambda construir=construir: tamanho_figura(construir())
+
+
+def executar(doacoes, repeticoes):
+    resultados = {}
+    for n_doacoes in doacoes:
+        diretorio = tempfile.mkdtemp(prefix="helplink_benchmark_")
+        try:
+            medidas = {}
+            for nome, funcao in etapas(n_doacoes, diretorio):
+                resultado, medida = medir(funcao, repeticoes)
+                if nome.startswith("figura:"):
+                    medida["json_kb"] = resultado / 1024
+                medidas[nome] = medida
+                print(formatar(n_doacoes, nome, medida), flush=True)
+            resultados[str(n_doacoes)] = medidas
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+    return resultados
+
+
+def formatar(n_doacoes, nome, medida):
+    extra = f"  json {medida['json_kb']:8.1f} KB" if "json_kb" in medida else ""
+    return (
+        f"{n_doacoes:>10,}  {nome:<32} min {medida['min_s'] * 1000:10.2f} ms"
+        f"  mediana {medida['mediana_s'] * 1000:10.2f} ms  pico {medida['pico_mb']:9.1f} MB{extra}"
+    )
+
+
+def comparar(resultados, base, tolerancia):
+    # regressão: etapa presente nas duas execuções que ficou mais lenta que
+    # tolerancia x a base (pela mediana) ou alocou mais que tolerancia x
+    regressoes = []
+    for n_doacoes, medidas in resultados.items():
+        for nome, medida in medidas.items():
+            anterior = base.get(n_doacoes, {}).get(nome)
+            if anterior is None:
+                continue
+            if (
+                medida["mediana_s"] > TEMPO_MINIMO_REGRESSAO
+                and medida["mediana_s"] > anterior["mediana_s"] * tolerancia
+            ):
+                regressoes.append(
+                    f"{n_doacoes} {nome}: {anterior['mediana_s'] * 1000:.2f} ms -> {medida['mediana_s'] * 1000:.2f} ms"
+                )
+            if medida["pico_mb"] > 1 and medida["pico_mb"] > anterior["pico_mb"] * tolerancia:
+                regressoes.append(
+                    f"{n_doacoes} {nome}: pico {anterior['pico_mb']:.1f} MB -> {medida['pico_mb']:.1f} MB"
+                )
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline de dados do dashboard HelpLink")
+    parser.add_argument(
+        "--doacoes",
+        default=",".join(str(n) for n in DOACOES_PADRAO),
+        help="números de doações separados por vírgula (aceita 1e6)",
+    )
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES)
+    parser.add_argument("--saida", help="grava os resultados neste arquivo JSON")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    args = parser.parse_args(argv)
+
+    doacoes = [int(float(n)) for n in args.doacoes.split(",")]
+    resultados = executar(doacoes, args.repeticoes)
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(
+                {"python": sys.version.split()[0], "cpus": os.cpu_count(), "resultados": resultados},
+                f,
+                indent=2,
+            )
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)["resultados"]
+        regressoes = comparar(resultados, base, args.tolerancia)
+        for regressao in regressoes:
+            print(f"REGRESSÃO {regressao}")
+        return 1 if regressoes else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+import bisect
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from esquema import TABELAS
+from indices import expandir
+from texto import normalizar, normalizar_arrow
+
+# =========================================================
+# BUSCA TEXTUAL (USUÁRIOS, INSTITUIÇÕES E ITENS)
+# =========================================================
+# Índice para buscas do tipo "digite e veja as opções": cada texto é
+# normalizado (minúsculas, sem acentos) e quebrado em palavras; textos só
+# de dígitos e pontuação (CNPJ) também entram sem a pontuação, então
+# "12345678" encontra "12.345.678/0001-90". As palavras distintas ficam ordenadas em um
+# array do Arrow (buffer contínuo, sem um objeto Python por palavra) e cada
+# uma aponta para as linhas que a contêm (CSR).
+#
+# Um termo da busca casa com as palavras que começam com ele: como elas
+# estão ordenadas, é uma busca binária, e as linhas de todas essas palavras
+# são uma fatia contígua do CSR. Com vários termos, as linhas do termo mais
+# seletivo são conferidas contra os demais pelo CSR inverso (linha ->
+# palavras), só até juntar os n resultados pedidos. Se o prefixo não der n
+# resultados, o último termo (3+ letras) é procurado também no meio das
+# palavras por um índice de trigramas ("silva" em "joaosilva@...").
+#
+# O índice de cada entidade é montado na primeira busca e reaproveitado até
+# a tabela mudar; o nome exibido resolve o id por um dicionário.
+
+# entidade -> (tabela, coluna de id, coluna exibida, colunas pesquisadas)
+ENTIDADES = {
+    "usuarios": ("USUARIO", "ID_USUARIO", "NOME", ["NOME", "EMAIL"]),
+    "instituicoes": ("INSTITUICAO", "ID_INSTITUICAO", "NOME", ["NOME", "CNPJ"]),
+    "itens": ("ITEM", "ID_ITEM", "TITULO", ["TITULO", "DESCRICAO"]),
+}
+
+SEPARADOR = r"[^a-z0-9]+"
+FIM_PREFIXO = "\x7f"  # maior que qualquer caractere de uma palavra normalizada
+
+# acima deste número de pares (trigrama, palavra) o índice de trigramas não
+# é montado e a busca fica só por prefixo
+MAX_PARES_TRIGRAMAS = 30_000_000
+
+# linhas conferidas por resultado pedido, a cada rodada
+CANDIDATOS_POR_RESULTADO = 20
+
+
+class _Palavras:
+    # sequência ordenada para o bisect, lendo direto do array do Arrow
+    def __init__(self, palavras):
+        self.palavras = palavras
+
+    def __len__(self):
+        return len(self.palavras)
+
+    def __getitem__(self, i):
+        return self.palavras[i].as_py()
+
+
+def _termos(texto):
+    return [t for t in re.split(SEPARADOR, normalizar([texto])[0]) if t]
+
+
+def _trigramas(palavras):
+    # códigos (3 bytes) de cada trigrama das palavras ASCII, e a palavra de cada um
+    if len(palavras) == 0:
+        return np.empty(0, np.int32), np.empty(0, np.int64)
+    offsets = np.frombuffer(palavras.buffers()[1], dtype=np.int32)[palavras.offset:palavras.offset + len(palavras) + 1]
+    dados = np.frombuffer(palavras.buffers()[2], dtype=np.uint8)
+    quantos = np.maximum(np.diff(offsets) - 2, 0)
+    posicoes = expandir(offsets[:-1].astype(np.int64), quantos)
+    codigos = (dados[posicoes].astype(np.int32) << 16) | (dados[posicoes + 1].astype(np.int32) << 8) | dados[posicoes + 2]
+    return codigos, np.repeat(np.arange(len(palavras), dtype=np.int64), quantos)
+
+
+def _csr(chaves, valores, n_chaves=None):
+    # pares (chave, valor) sem repetição, agrupados por chave (sort + vizinhos:
+    # np.unique por hash é bem mais lento para dezenas de milhões de pares).
+    # Com n_chaves, as chaves são 0..n_chaves-1 e voltam só os offsets; sem,
+    # voltam também as chaves distintas.
+    base = int(valores.max(initial=0)) + 1
+    pares = np.sort(chaves.astype(np.int64) * base + valores)
+    pares = pares[np.concatenate([[True], pares[1:] != pares[:-1]])]
+    chaves, valores = pares // base, pares % base
+    if n_chaves is not None:
+        return np.searchsorted(chaves, np.arange(n_chaves + 1)), valores
+    inicio = np.flatnonzero(np.concatenate([[True], chaves[1:] != chaves[:-1]]))
+    return chaves[inicio], np.append(inicio, len(chaves)), valores
+
+
+class IndiceBusca:
+    def __init__(self, df, coluna_id, coluna_rotulo, colunas):
+        colunas = [c for c in colunas if c in df.columns]
+        self.n = len(df)
+        self.ids = df[coluna_id].to_numpy()
+        self.rotulos = df[coluna_rotulo].array
+        self._por_rotulo = None
+        self._em_ordem = None
+
+        # textos distintos de todas as colunas, normalizados uma vez cada
+        codigos_colunas, distintos = [], []
+        base = 0
+        for coluna in colunas:
+            codigos, valores = pd.factorize(df[coluna])
+            codigos_colunas.append(np.where(codigos >= 0, codigos + base, -1))
+            distintos.append(normalizar_arrow(valores))
+            base += len(valores)
+        textos = pa.concat_arrays(distintos) if distintos else pa.array([], type=pa.string())
+
+        listas = pc.split_pattern_regex(textos, SEPARADOR)
+        numericos = pc.match_substring_regex(textos, r"^[^a-z]*[0-9][^a-z]*$")
+        palavras = pa.concat_arrays([
+            pc.list_flatten(listas),
+            pc.replace_substring_regex(textos.filter(numericos), SEPARADOR, ""),
+        ])
+        texto_da_palavra = np.concatenate([
+            pc.list_parent_indices(listas).to_numpy(),
+            np.flatnonzero(numericos.to_numpy(zero_copy_only=False)),
+        ]).astype(np.int64)
+        nao_vazias = pc.greater(pc.utf8_length(palavras), 0)
+        palavras = palavras.filter(nao_vazias)
+        texto_da_palavra = texto_da_palavra[nao_vazias.to_numpy(zero_copy_only=False)]
+
+        distintas = pc.unique(palavras)
+        self.palavras = distintas.take(pc.sort_indices(distintas))
+        self._ordenadas = _Palavras(self.palavras)
+        codigos_palavras = pc.index_in(palavras, value_set=self.palavras).to_numpy()
+
+        # texto -> palavras, e daí linha -> palavras
+        ordem = np.argsort(texto_da_palavra)
+        offsets_texto = np.searchsorted(texto_da_palavra[ordem], np.arange(len(textos) + 1))
+        palavras_texto = codigos_palavras[ordem].astype(np.int64)
+        linhas, palavras_linha = [], []
+        for codigos in codigos_colunas:
+            validas = np.flatnonzero(codigos >= 0)
+            inicio = offsets_texto[codigos[validas]]
+            contagem = offsets_texto[codigos[validas] + 1] - inicio
+            linhas.append(np.repeat(validas, contagem))
+            palavras_linha.append(palavras_texto[expandir(inicio, contagem)])
+        linhas = np.concatenate(linhas) if linhas else np.empty(0, np.int64)
+        palavras_linha = np.concatenate(palavras_linha) if palavras_linha else np.empty(0, np.int64)
+
+        # palavra -> linhas (em ordem de palavra, então um prefixo é uma fatia)
+        self.offsets, self.linhas = _csr(palavras_linha, linhas, len(self.palavras))
+        # linha -> palavras, para conferir os demais termos
+        self.offsets_linha, self.palavras_da_linha = _csr(linhas, palavras_linha, self.n)
+
+        self.trigramas = None
+        codigos, donas = _trigramas(self.palavras)
+        if len(codigos) <= MAX_PARES_TRIGRAMAS:
+            self.trigramas, self.offsets_trigrama, self.palavras_trigrama = _csr(codigos, donas)
+
+    def __len__(self):
+        return self.n
+
+    # ---------------------------------------------------------
+    # TERMOS
+    # ---------------------------------------------------------
+    def _faixa(self, termo):
+        # palavras [a, b) que começam com o termo
+        a = bisect.bisect_left(self._ordenadas, termo)
+        return a, bisect.bisect_left(self._ordenadas, termo + FIM_PREFIXO, lo=a)
+
+    def _contendo(self, termo, limite=None):
+        # palavras com o termo em qualquer posição: as que têm todos os
+        # trigramas dele, conferidas (até `limite` encontradas, se dado)
+        if self.trigramas is None or len(termo) < 3:
+            return np.empty(0, np.int64)
+        bytes_termo = np.frombuffer(termo.encode("ascii"), dtype=np.uint8).astype(np.int32)
+        codigos = np.unique((bytes_termo[:-2] << 16) | (bytes_termo[1:-1] << 8) | bytes_termo[2:])
+        k = np.minimum(np.searchsorted(self.trigramas, codigos), len(self.trigramas) - 1)
+        if (self.trigramas[k] != codigos).any():
+            return np.empty(0, np.int64)
+        listas = sorted((self.palavras_trigrama[self.offsets_trigrama[i]:self.offsets_trigrama[i + 1]] for i in k), key=len)
+        # interseção partindo da menor lista, por busca binária nas outras
+        candidatas = listas[0]
+        for lista in listas[1:]:
+            j = np.minimum(np.searchsorted(lista, candidatas), len(lista) - 1)
+            candidatas = candidatas[lista[j] == candidatas]
+
+        passo = len(candidatas) if limite is None else max(limite, 1)
+        encontradas = []
+        for inicio in range(0, len(candidatas), passo):
+            bloco = candidatas[inicio:inicio + passo]
+            contem = pc.match_substring(self.palavras.take(pa.array(bloco)), termo).to_numpy(zero_copy_only=False)
+            encontradas.append(bloco[contem])
+            if limite is not None and sum(map(len, encontradas)) >= limite:
+                break
+        return np.concatenate(encontradas) if encontradas else np.empty(0, np.int64)
+
+    def _linhas_das_palavras(self, palavras):
+        inicio = self.offsets[palavras]
+        return self.linhas[expandir(inicio, self.offsets[palavras + 1] - inicio)]
+
+    def _conferir(self, linhas, condicoes):
+        # linhas que têm, para cada condição, alguma palavra que a satisfaz;
+        # condição: faixa (a, b) de palavras ou array ordenado de palavras
+        for condicao in condicoes:
+            inicio = self.offsets_linha[linhas]
+            contagem = self.offsets_linha[linhas + 1] - inicio
+            palavras = self.palavras_da_linha[expandir(inicio, contagem)]
+            if isinstance(condicao, tuple):
+                ok = (palavras >= condicao[0]) & (palavras < condicao[1])
+            else:
+                ok = np.isin(palavras, condicao)
+            linhas = linhas[np.bincount(np.repeat(np.arange(len(linhas)), contagem), weights=ok, minlength=len(linhas)) > 0]
+        return linhas
+
+    # ---------------------------------------------------------
+    # BUSCA
+    # ---------------------------------------------------------
+    def buscar(self, texto, n=None):
+        # posições das linhas encontradas: as n melhores (começo do nome
+        # primeiro) ou, com n=None, todas
+        termos = _termos(texto)
+        if not termos or self.n == 0:
+            return np.empty(0, np.int64)
+        faixas = [self._faixa(t) for t in termos]
+        encontradas = self._buscar(faixas, n)
+        if (n is None or len(encontradas) < n) and len(termos[-1]) >= 3:
+            # último termo no meio das palavras (as que começam com ele já foram)
+            a, b = faixas[-1]
+            meio = self._contendo(termos[-1], None if n is None else n * CANDIDATOS_POR_RESULTADO)
+            meio = meio[(meio < a) | (meio >= b)]
+            if len(meio):
+                extras = self._conferir(pd.unique(self._linhas_das_palavras(meio)), faixas[:-1])
+                encontradas = pd.unique(np.concatenate([encontradas, extras]))
+        if n is None:
+            return np.sort(encontradas)
+        return self._ordenar(encontradas, " ".join(termos))[:n]
+
+    def _buscar(self, faixas, n):
+        tamanhos = [self.offsets[b] - self.offsets[a] for a, b in faixas]
+        principal = int(np.argmin(tamanhos))
+        a, b = faixas[principal]
+        fatia = self.linhas[self.offsets[a]:self.offsets[b]]
+        outras = faixas[:principal] + faixas[principal + 1:]
+        if n is None:
+            return self._conferir(pd.unique(fatia), outras)
+
+        # rodadas de linhas candidatas (dobrando a cada uma) até juntar n
+        passo = max(n * CANDIDATOS_POR_RESULTADO, 1)
+        encontradas, vistas, total = [], 0, 0
+        while vistas < len(fatia) and total < n:
+            bloco = self._conferir(pd.unique(fatia[vistas:vistas + passo]), outras)
+            encontradas.append(bloco)
+            total += len(bloco)
+            vistas += passo
+            passo *= 2
+        return pd.unique(np.concatenate(encontradas)) if encontradas else np.empty(0, np.int64)
+
+    def _ordenar(self, linhas, busca):
+        # nome exibido começando com a busca primeiro, depois em ordem alfabética
+        if len(linhas) == 0:
+            return linhas
+        rotulos = normalizar(self.rotulos.take(linhas))
+        comeca = np.array([r.startswith(busca) for r in rotulos], dtype=bool)
+        return linhas[np.lexsort((rotulos.astype(str), ~comeca))]
+
+    # ---------------------------------------------------------
+    # RESULTADOS
+    # ---------------------------------------------------------
+    def resultados(self, texto, n=10):
+        linhas = self.buscar(texto, n)
+        return pd.DataFrame({"ID": self.ids[linhas], "ROTULO": self.rotulos.take(linhas)})
+
+    def rotulos_de(self, linhas):
+        return [str(r) for r in self.rotulos.take(linhas)]
+
+    def em_ordem(self):
+        # todos os nomes exibidos em ordem alfabética (sem acentos)
+        if self._em_ordem is None:
+            rotulos = np.asarray(self.rotulos, dtype=object)
+            self._em_ordem = [str(r) for r in rotulos[np.argsort(normalizar(rotulos).astype(str), kind="stable")]]
+        return self._em_ordem
+
+    def id_de(self, rotulo):
+        # id pelo nome exibido (o primeiro, se houver nomes repetidos)
+        if self._por_rotulo is None:
+            self._por_rotulo = dict(zip(reversed(list(self.rotulos)), reversed(self.ids.tolist())))
+        return self._por_rotulo.get(rotulo)
+
+
+class IndicesBusca:
+    # um IndiceBusca por entidade, montado na primeira busca
+    def __init__(self, tabelas, montados=None):
+        self._tabelas = {tabela: tabelas[TABELAS.index(tabela)] for tabela, *_ in ENTIDADES.values()}
+        self._indices = dict(montados or {})
+        self._lock = threading.Lock()
+
+    def __getitem__(self, entidade):
+        with self._lock:
+            if entidade not in self._indices:
+                tabela, coluna_id, coluna_rotulo, colunas = ENTIDADES[entidade]
+                self._indices[entidade] = IndiceBusca(self._tabelas[tabela], coluna_id, coluna_rotulo, colunas)
+            return self._indices[entidade]
+
+    def atualizado(self, tabelas, alteradas):
+        # novas tabelas; mantém os índices das entidades cuja tabela não mudou
+        with self._lock:
+            montados = {e: i for e, i in self._indices.items() if ENTIDADES[e][0] not in alteradas}
+        return IndicesBusca(tabelas, montados)
@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+
+# =========================================================
+# CACHE EM MEMÓRIA COM CONTADORES
+# =========================================================
+# Compartilhado entre as sessões do Streamlit (instanciado via
+# st.cache_resource), por isso todo acesso passa pelo lock.
+
+
+class ContadorCache:
+    def __init__(self):
+        self.chamadas = 0
+        self.falhas = 0
+        self._lock = threading.Lock()
+
+    def registrar_chamada(self):
+        with self._lock:
+            self.chamadas += 1
+
+    def registrar_falha(self):
+        with self._lock:
+            self.falhas += 1
+
+    @property
+    def acertos(self):
+        return max(self.chamadas - self.falhas, 0)
+
+
+def tamanho_bytes(valor):
+    # arrays (e tuplas de arrays) contam pelo nbytes; o resto conta como 0
+    if isinstance(valor, (tuple, list)):
+        return sum(tamanho_bytes(v) for v in valor)
+    return int(getattr(valor, "nbytes", 0) or 0)
+
+
+class CacheLRU:
+    # Limitado pelo número de entradas e, com max_bytes, também pelo tamanho
+    # dos arrays guardados; um valor maior que max_bytes não entra no cache.
+    def __init__(self, max_entradas=64, ttl=None, max_bytes=None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.acertos = 0
+        self.falhas = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave, calcular):
+        encontrado, valor = self.consultar(chave)
+        if encontrado:
+            return valor
+        valor = calcular()
+        self.guardar(chave, valor)
+        return valor
+
+    def consultar(self, chave):
+        agora = time.monotonic()
+        with self._lock:
+            if chave in self._entradas:
+                criado_em, valor, tamanho = self._entradas[chave]
+                if self.ttl is None or agora - criado_em < self.ttl:
+                    self._entradas.move_to_end(chave)
+                    self.acertos += 1
+                    return True, valor
+                del self._entradas[chave]
+                self.bytes -= tamanho
+            self.falhas += 1
+        return False, None
+
+    def guardar(self, chave, valor):
+        tamanho = tamanho_bytes(valor) if self.max_bytes is not None else 0
+        with self._lock:
+            if chave in self._entradas:
+                self.bytes -= self._entradas.pop(chave)[2]
+            if self.max_bytes is not None and tamanho > self.max_bytes:
+                return
+            self._entradas[chave] = (time.monotonic(), valor, tamanho)
+            self.bytes += tamanho
+            while len(self._entradas) > self.max_entradas or (
+                self.max_bytes is not None and self.bytes > self.max_bytes
+            ):
+                self.bytes -= self._entradas.popitem(last=False)[1][2]
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.bytes = 0
+
+    def valores(self):
+        with self._lock:
+            return [valor for _, valor, _ in self._entradas.values()]
+
+    def __len__(self):
+        return len(self._entradas)
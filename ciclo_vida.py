@@ -0,0 +1,203 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from agregacoes import grade, inicio_semana, numero_semana
+from resolucao import QUANTIS
+
+# =========================================================
+# CICLO DE VIDA DAS DOAÇÕES
+# =========================================================
+# Tempo até a confirmação (DT_CONFIRMACAO - DT_SOLICITACAO), fila de doações
+# pendentes por instituição com faixas de idade e a fila dia a dia. Tudo em
+# aritmética de datetime64 sobre as colunas de DOACAO, sem loops por linha.
+#
+# Uma doação está na fila do dia D se foi solicitada até D e ainda não tinha
+# sido confirmada ao fim de D. CANCELADA fica de fora: sem data de
+# cancelamento, não há como saber até quando ela esteve pendente.
+#
+# A fila diária vem de um cubo montado na carga (construir_cubo_fila): por
+# dia e instituição, entradas (solicitações) menos saídas (confirmações).
+# A fila de qualquer dia é a soma acumulada do cubo até ele, então o gráfico
+# de anos de histórico custa um cumsum sobre o cubo e um searchsorted, e a
+# ingestão incremental o atualiza como os rollups.
+
+CHAVES_CUBO_FILA = ["DATA", "ID_INSTITUICAO"]
+
+# faixas do tempo até a confirmação, em horas
+BORDAS_ESPERA = [0, 1, 6, 24, 72, 168, 720]
+ROTULOS_ESPERA = ["até 1 h", "1–6 h", "6–24 h", "1–3 dias", "3–7 dias", "7–30 dias", "mais de 30 dias"]
+
+# faixas de idade das pendentes, em dias
+BORDAS_IDADE = [0, 8, 31, 91]
+ROTULOS_IDADE = ["0–7 dias", "8–30 dias", "31–90 dias", "mais de 90 dias"]
+
+UMA_HORA = np.timedelta64(1, "h")
+UM_DIA = np.timedelta64(1, "D")
+
+
+def _datas(df_doacoes):
+    solicitacao = df_doacoes["DT_SOLICITACAO"].to_numpy(dtype="datetime64[ns]")
+    confirmacao = df_doacoes["DT_CONFIRMACAO"].to_numpy(dtype="datetime64[ns]")
+    return solicitacao, confirmacao
+
+
+def _na_fila(df_doacoes):
+    # doações que passam pela fila: solicitadas e não canceladas
+    solicitacao, _ = _datas(df_doacoes)
+    status = df_doacoes["STATUS"]
+    na_fila = ~np.isnat(solicitacao)
+    if "CANCELADA" in status.cat.categories:
+        na_fila &= status.cat.codes.to_numpy() != status.cat.categories.get_loc("CANCELADA")
+    return na_fila
+
+
+# ---------------------------------------------------------
+# CUBO DA FILA DIÁRIA
+# ---------------------------------------------------------
+def construir_cubo_fila(df_doacoes):
+    df_doacoes = df_doacoes[_na_fila(df_doacoes)]
+    solicitacao, confirmacao = _datas(df_doacoes)
+    instituicoes = df_doacoes["ID_INSTITUICAO"].to_numpy()
+
+    entrada = solicitacao.astype("datetime64[D]")
+    confirmadas = ~np.isnat(confirmacao)
+    # confirmação anterior à solicitação (dado inconsistente) sai no mesmo dia
+    saida = np.maximum(confirmacao[confirmadas].astype("datetime64[D]"), entrada[confirmadas])
+
+    movimentos = pd.DataFrame({
+        "DATA": np.concatenate([entrada, saida]).astype("datetime64[ns]"),
+        "ID_INSTITUICAO": np.concatenate([instituicoes, instituicoes[confirmadas]]),
+        "SALDO": np.concatenate([np.ones(len(entrada), np.int64), -np.ones(int(confirmadas.sum()), np.int64)]),
+    })
+    return consolidar_cubo(movimentos)
+
+
+def consolidar_cubo(movimentos):
+    # soma os movimentos (DATA, ID_INSTITUICAO, SALDO) por dia e instituição;
+    # também usado com os movimentos agregados no banco (banco_dados.movimentos_fila)
+    cubo = movimentos.groupby(CHAVES_CUBO_FILA, sort=True)["SALDO"].sum().reset_index()
+    return cubo[cubo["SALDO"] != 0].reset_index(drop=True)
+
+
+def fila_diaria(cubo, data_ini, data_fim, id_instituicao=None):
+    # pendentes ao fim de cada dia do período (o histórico anterior entra
+    # pela soma acumulada)
+    if id_instituicao is not None:
+        cubo = cubo[cubo["ID_INSTITUICAO"].to_numpy() == id_instituicao]
+    dias = np.arange(np.datetime64(data_ini, "D"), np.datetime64(data_fim, "D") + 1)
+    acumulado = np.concatenate([[0], np.cumsum(cubo["SALDO"].to_numpy())])
+    ate = np.searchsorted(cubo["DATA"].to_numpy(dtype="datetime64[ns]"), (dias + 1).astype("datetime64[ns]"), side="left")
+    return pd.DataFrame({"DATA": dias.astype("datetime64[ns]"), "PENDENTES": acumulado[ate]})
+
+
+def pendentes_atuais(cubo):
+    # fila de hoje por instituição: o saldo de todo o cubo
+    ids, codigos = np.unique(cubo["ID_INSTITUICAO"].to_numpy(), return_inverse=True)
+    saldo = np.bincount(codigos, weights=cubo["SALDO"].to_numpy(), minlength=len(ids)).astype(np.int64)
+    return pd.DataFrame({"ID_INSTITUICAO": ids, "PENDENTES": saldo})
+
+
+# ---------------------------------------------------------
+# TEMPO ATÉ A CONFIRMAÇÃO
+# ---------------------------------------------------------
+def horas_ate_confirmacao(df_doacoes):
+    solicitacao, confirmacao = _datas(df_doacoes)
+    validas = ~np.isnat(solicitacao) & ~np.isnat(confirmacao) & (confirmacao >= solicitacao)
+    return (confirmacao[validas] - solicitacao[validas]) / UMA_HORA, validas
+
+
+def distribuicao_espera(df_doacoes):
+    # doações confirmadas por faixa de espera + quantis em horas
+    horas, _ = horas_ate_confirmacao(df_doacoes)
+    faixas = np.searchsorted(BORDAS_ESPERA, horas, side="right") - 1
+    contagem = np.bincount(faixas, minlength=len(ROTULOS_ESPERA))
+    df = pd.DataFrame({"FAIXA": ROTULOS_ESPERA, "QTD": contagem})
+    quantis = dict(zip(QUANTIS, np.quantile(horas, QUANTIS).tolist())) if len(horas) else {}
+    return df, quantis
+
+
+def _quantis_por_grupo(grupos, valores, n_grupos, qs=QUANTIS):
+    # np.quantile (interpolação linear) de cada grupo, com uma ordenação só
+    if len(valores) == 0:
+        return {q: np.full(n_grupos, np.nan) for q in qs}
+    valores = valores[np.lexsort((valores, grupos))]
+    contagem = np.bincount(grupos, minlength=n_grupos)
+    inicio = np.cumsum(contagem) - contagem
+    ultimo = len(valores) - 1  # grupos vazios leem qualquer posição válida e viram NaN
+    resultado = {}
+    for q in qs:
+        h = (np.maximum(contagem, 1) - 1) * q
+        k = np.floor(h).astype(np.int64)
+        baixo = valores[np.minimum(inicio + k, ultimo)]
+        alto = valores[np.minimum(inicio + np.minimum(k + 1, np.maximum(contagem - 1, 0)), ultimo)]
+        resultado[q] = np.where(contagem > 0, baixo + (h - k) * (alto - baixo), np.nan)
+    return resultado
+
+
+def coortes_semanais(df_doacoes):
+    # por semana de solicitação: solicitadas, confirmadas e espera (horas)
+    colunas = ["SEMANA", "SOLICITADAS", "CONFIRMADAS", "TAXA_CONFIRMACAO"] + [f"P{int(q * 100)}_HORAS" for q in QUANTIS]
+    solicitacao, _ = _datas(df_doacoes)
+    com_data = ~np.isnat(solicitacao)
+    if not com_data.any():
+        return pd.DataFrame(columns=colunas)
+
+    semanas = numero_semana(solicitacao[com_data])
+    primeira = semanas.min()
+    n_semanas = int(semanas.max() - primeira) + 1
+    solicitadas = np.bincount(semanas - primeira, minlength=n_semanas)
+
+    horas, validas = horas_ate_confirmacao(df_doacoes)
+    grupos = numero_semana(solicitacao[validas]) - primeira
+    confirmadas = np.bincount(grupos, minlength=n_semanas)
+    quantis = _quantis_por_grupo(grupos, horas, n_semanas)
+
+    df = pd.DataFrame({
+        "SEMANA": inicio_semana(primeira + np.arange(n_semanas)),
+        "SOLICITADAS": solicitadas,
+        "CONFIRMADAS": confirmadas,
+        "TAXA_CONFIRMACAO": np.where(solicitadas > 0, confirmadas / np.maximum(solicitadas, 1) * 100, np.nan),
+    })
+    for q, valores in quantis.items():
+        df[f"P{int(q * 100)}_HORAS"] = valores
+    return df[colunas]
+
+
+# ---------------------------------------------------------
+# PENDENTES POR INSTITUIÇÃO
+# ---------------------------------------------------------
+def referencia_periodo(data_fim, agora=None):
+    # fim do último dia do período, ou agora se o período chega até hoje
+    agora = np.datetime64(agora or pd.Timestamp.now(), "ns")
+    fim = np.datetime64(data_fim + timedelta(days=1), "ns") - np.timedelta64(1, "ns")
+    return min(fim, agora)
+
+
+def pendentes_por_instituicao(df_doacoes, indice_instituicoes, referencia, id_instituicao=None, n=15):
+    # fila no instante `referencia`, por instituição e faixa de idade
+    solicitacao, confirmacao = _datas(df_doacoes)
+    pendentes = (
+        _na_fila(df_doacoes)
+        & (solicitacao <= referencia)
+        & (np.isnat(confirmacao) | (confirmacao > referencia))
+    )
+    instituicoes = df_doacoes["ID_INSTITUICAO"].to_numpy()
+    if id_instituicao is not None:
+        pendentes &= instituicoes == id_instituicao
+    if not pendentes.any():
+        return pd.DataFrame(columns=["ID_INSTITUICAO", "NOME", "PENDENTES"] + ROTULOS_IDADE + ["IDADE_MEDIA_DIAS"])
+
+    idade = (referencia - solicitacao[pendentes]) / UM_DIA
+    faixas = np.searchsorted(BORDAS_IDADE, idade, side="right") - 1
+    ids, codigos = np.unique(instituicoes[pendentes], return_inverse=True)
+    z = grade(codigos, len(ids), faixas, len(ROTULOS_IDADE), None)
+
+    df = pd.DataFrame(z, columns=ROTULOS_IDADE)
+    df.insert(0, "ID_INSTITUICAO", ids)
+    df.insert(1, "PENDENTES", z.sum(axis=1))
+    df["IDADE_MEDIA_DIAS"] = np.bincount(codigos, weights=idade, minlength=len(ids)) / df["PENDENTES"].to_numpy()
+    df = df.sort_values("PENDENTES", ascending=False, kind="stable").head(n)
+    df.insert(1, "NOME", indice_instituicoes.nomes_de(df["ID_INSTITUICAO"].to_numpy()))
+    return df.reset_index(drop=True)
@@ -0,0 +1,325 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import CacheLRU
+
+# =========================================================
+# CLASSIFICAÇÃO DO ESTADO DE CONSERVAÇÃO (IA)
+# =========================================================
+# Dois backends com a mesma interface (classificar / classificar_lote) e os
+# mesmos limiares BOM/REGULAR/RUIM:
+#
+# - ClassificadorHF: inferência do Hugging Face com uma Session compartilhada
+#   (conexões reaproveitadas), timeout e novas tentativas com backoff. Lotes
+#   são enviados em paralelo, com no máximo `max_paralelo` requisições.
+# - ClassificadorLocal: o mesmo ViT exportado para ONNX e executado na CPU
+#   com onnxruntime (dependência opcional), em lotes, sem chamadas externas.
+#
+# Nos dois, o resultado fica em um cache LRU pelo hash do conteúdo da imagem:
+# reenviar a mesma foto não roda a inferência de novo.
+
+HF_MODEL = "google/vit-base-patch16-224"
+API_URL = f"https://router.huggingface.co/hf-inference/models/{HF_MODEL}"
+
+LIMIAR_BOM = 0.75
+LIMIAR_REGULAR = 0.45
+
+MAX_PARALELO = 4
+TIMEOUT = (5, 30)  # (conexão, leitura) em segundos
+TENTATIVAS = 3
+ESPERA_BASE = 0.5
+ESPERA_MAXIMA = 10
+STATUS_TRANSITORIOS = {429, 500, 502, 503, 504}
+
+# Pré-processamento do google/vit-base-patch16-224 (preprocessor_config.json)
+TAMANHO_IMAGEM = 224
+MEDIA_PIXEL = 0.5
+DESVIO_PIXEL = 0.5
+TAMANHO_LOTE = 8
+
+
+class ErroClassificador(RuntimeError):
+    pass
+
+
+def condicao_por_score(score):
+    if score >= LIMIAR_BOM:
+        return "BOM"
+    if score >= LIMIAR_REGULAR:
+        return "REGULAR"
+    return "RUIM"
+
+
+def interpretar_resposta(result):
+    if not isinstance(result, list) or not result or not all(isinstance(x, dict) for x in result):
+        return None, f"Resposta inesperada da IA: {result}"
+
+    try:
+        score = max(float(x.get("score", 0.0)) for x in result)
+    except (TypeError, ValueError):
+        return None, f"Resposta inesperada da IA: {result}"
+    return condicao_por_score(score), score
+
+
+def hash_imagem(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+class Classificador:
+    # Base dos backends: deduplica o lote pelo hash, consulta o cache e só
+    # manda para _inferir_lote() as imagens que ainda não foram vistas.
+    descricao = ""
+
+    def __init__(self, max_cache=256):
+        self.cache = CacheLRU(max_entradas=max_cache)
+        self.chamadas = 0
+        self._lock = threading.Lock()
+
+    def _contar_chamada(self):
+        with self._lock:
+            self.chamadas += 1
+
+    def _inferir_lote(self, imagens):
+        raise NotImplementedError
+
+    def classificar(self, image_bytes, mime_type="image/png"):
+        return self.classificar_lote([(image_bytes, mime_type)])[0]
+
+    def classificar_lote(self, imagens):
+        # imagens: lista de (bytes, mime_type); o resultado sai na mesma ordem
+        chaves = [hash_imagem(image_bytes) for image_bytes, _ in imagens]
+        resultados = {}
+        pendentes = {}
+        for chave, imagem in zip(chaves, imagens):
+            if chave in resultados or chave in pendentes:
+                continue
+            encontrado, valor = self.cache.consultar(chave)
+            if encontrado:
+                resultados[chave] = valor
+            else:
+                pendentes[chave] = imagem
+
+        if pendentes:
+            inferidos = self._inferir_lote(list(pendentes.values()))
+            for chave, resultado in zip(pendentes, inferidos):
+                resultados[chave] = resultado
+                # erros não entram no cache, a próxima tentativa roda de novo
+                if resultado[0] is not None:
+                    self.cache.guardar(chave, resultado)
+
+        return [resultados[chave] for chave in chaves]
+
+    def fechar(self):
+        pass
+
+
+class ClassificadorHF(Classificador):
+    descricao = f"Hugging Face ({HF_MODEL})"
+
+    def __init__(
+        self,
+        token,
+        url=API_URL,
+        max_paralelo=MAX_PARALELO,
+        timeout=TIMEOUT,
+        tentativas=TENTATIVAS,
+        max_cache=256,
+    ):
+        super().__init__(max_cache)
+        self.url = url
+        self.timeout = timeout
+        self.tentativas = tentativas
+        self.max_paralelo = max_paralelo
+
+        self.session = requests.Session()
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=max_paralelo)
+        self.session.mount("https://", adaptador)
+        self.session.mount("http://", adaptador)
+
+    def _espera(self, tentativa, response=None):
+        # Retry-After do servidor tem prioridade sobre o backoff exponencial
+        if response is not None:
+            try:
+                return min(float(response.headers.get("Retry-After", "")), ESPERA_MAXIMA)
+            except ValueError:
+                pass
+        return min(ESPERA_BASE * 2 ** tentativa, ESPERA_MAXIMA)
+
+    def _inferir(self, image_bytes, mime_type):
+        headers = {"Content-Type": mime_type or "image/png"}
+        erro = None
+        for tentativa in range(self.tentativas):
+            if tentativa:
+                time.sleep(espera)
+            self._contar_chamada()
+            try:
+                response = self.session.post(self.url, headers=headers, data=image_bytes, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                erro = f"Erro ao chamar IA: {str(e)}"
+                espera = self._espera(tentativa)
+                continue
+            except requests.RequestException as e:
+                # demais falhas da requisição (redirecionamentos, cabeçalho
+                # inválido, resposta cortada) não melhoram com nova tentativa
+                return None, f"Erro ao chamar IA: {str(e)}"
+
+            if response.status_code == 200:
+                try:
+                    return interpretar_resposta(response.json())
+                except ValueError:
+                    return None, f"Resposta inesperada da IA: {response.text}"
+
+            erro = f"Erro da IA: {response.text}"
+            if response.status_code not in STATUS_TRANSITORIOS:
+                break
+            espera = self._espera(tentativa, response)
+        return None, erro
+
+    def _inferir_lote(self, imagens):
+        with ThreadPoolExecutor(max_workers=min(self.max_paralelo, len(imagens))) as executor:
+            return list(executor.map(lambda imagem: self._inferir(*imagem), imagens))
+
+    def fechar(self):
+        self.session.close()
+
+
+def preparar_imagem(image_bytes, tamanho=TAMANHO_IMAGEM):
+    # Pillow: decodifica, converte para RGB e redimensiona para a entrada do
+    # ViT; depois normaliza para [-1, 1] no formato CHW
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_bytes)) as imagem:
+        imagem = imagem.convert("RGB").resize((tamanho, tamanho), Image.BILINEAR)
+        pixels = np.asarray(imagem, dtype=np.float32) / 255.0
+    return ((pixels - MEDIA_PIXEL) / DESVIO_PIXEL).transpose(2, 0, 1)
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class ClassificadorLocal(Classificador):
+    # Exportar o modelo uma vez (requer `pip install optimum[exporters]`):
+    #   optimum-cli export onnx --model google/vit-base-patch16-224 vit_onnx/
+    def __init__(self, caminho_modelo, tamanho_lote=TAMANHO_LOTE, threads=None, max_cache=256):
+        super().__init__(max_cache)
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ErroClassificador("Backend local requer o pacote onnxruntime (pip install onnxruntime)") from e
+
+        opcoes = onnxruntime.SessionOptions()
+        if threads:
+            opcoes.intra_op_num_threads = threads
+        try:
+            self.sessao = onnxruntime.InferenceSession(
+                caminho_modelo, sess_options=opcoes, providers=["CPUExecutionProvider"]
+            )
+        except Exception as e:
+            raise ErroClassificador(f"Não foi possível carregar o modelo {caminho_modelo}: {e}") from e
+
+        self.entrada = self.sessao.get_inputs()[0].name
+        self.tamanho_lote = tamanho_lote
+        self.descricao = f"Local ({os.path.basename(caminho_modelo)}, CPU)"
+
+    def _inferir_lote(self, imagens):
+        resultados = [None] * len(imagens)
+        validas = []
+        for i, (image_bytes, _) in enumerate(imagens):
+            try:
+                validas.append((i, preparar_imagem(image_bytes)))
+            except Exception:
+                resultados[i] = (None, "Imagem inválida ou corrompida")
+
+        for inicio in range(0, len(validas), self.tamanho_lote):
+            lote = validas[inicio:inicio + self.tamanho_lote]
+            self._contar_chamada()
+            try:
+                logits = self.sessao.run(None, {self.entrada: np.stack([pixels for _, pixels in lote])})[0]
+                scores = _softmax(logits).max(axis=1)
+            except Exception as e:
+                # falha do modelo vira erro só das imagens deste lote (e não
+                # entra no cache); os outros lotes seguem
+                for i, _ in lote:
+                    resultados[i] = (None, f"Erro no modelo local: {e}")
+                continue
+            for (i, _), score in zip(lote, scores):
+                resultados[i] = (condicao_por_score(float(score)), float(score))
+        return resultados
+
+
+def criar_classificador(backend="auto", token=None, url=API_URL, caminho_modelo=None):
+    # auto: modelo local se houver um configurado, senão a API com token.
+    # Um endpoint próprio (ex.: o servidor simulado abaixo) dispensa o token.
+    # Devolve None quando nenhum backend está disponível.
+    if backend == "local" or (backend == "auto" and caminho_modelo):
+        if not caminho_modelo:
+            raise ErroClassificador("Backend local requer o caminho do modelo ONNX")
+        return ClassificadorLocal(caminho_modelo)
+    if backend in ("hf", "auto"):
+        return ClassificadorHF(token, url=url) if token or url != API_URL else None
+    raise ErroClassificador(f"Backend de IA desconhecido: {backend}")
+
+
+# ---------------------------------------------------------
+# SERVIDOR DE INFERÊNCIA SIMULADO (TESTES LOCAIS)
+# ---------------------------------------------------------
+def criar_servidor_mock(porta=8765, latencia=0.2, taxa_falha=0.0):
+    # Responde como a API do Hugging Face, com score derivado do hash da
+    # imagem (a mesma imagem sempre recebe o mesmo score). Com taxa_falha,
+    # parte das requisições volta 503 para exercitar o backoff.
+    import random
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            corpo = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latencia)
+            if random.random() < taxa_falha:
+                self._responder(503, {"error": "Model is currently loading"})
+                return
+            score = int(hash_imagem(corpo)[:8], 16) / 0xFFFFFFFF
+            self._responder(200, [{"label": "item", "score": score}, {"label": "outro", "score": score / 2}])
+
+        def _responder(self, status, conteudo):
+            dados = json.dumps(conteudo).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            try:
+                self.wfile.write(dados)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # cliente desistiu (timeout)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer(("127.0.0.1", porta), Handler)
+
+
+if __name__ == "__main__":
+    #   python classificacao.py [porta] [latencia_s] [taxa_falha]
+    #   HELPLINK_IA_URL=http://127.0.0.1:8765 streamlit run helplink_dashboard.py
+    import sys
+
+    porta = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    latencia = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    taxa_falha = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+
+    servidor = criar_servidor_mock(porta, latencia, taxa_falha)
+    print(f"Servidor de inferência simulado em http://127.0.0.1:{porta}")
+    servidor.serve_forever()
@@ -0,0 +1,186 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from indices import expandir, posicoes
+from texto import normalizar
+
+# =========================================================
+# CORRESPONDÊNCIA ITEM -> INSTITUIÇÃO
+# =========================================================
+# INSTITUICAO.CATEGORIAS_ACEITAS é texto livre ("Roupas, Alimentos,
+# Brinquedos"). O índice invertido abaixo guarda, para cada categoria
+# normalizada (minúsculas, sem acentos, espaços simples), os ids das
+# instituições que a aceitam, em CSR: um array de ids ordenado e os offsets
+# de cada categoria. O texto é separado uma vez por valor distinto da
+# coluna, não por linha.
+#
+# Um item corresponde a uma categoria quando todas as palavras dela
+# aparecem no título do item ("roupas" casa com "Roupas Infantis" e
+# "Roupas de Cama"). ITEM.ID_CATEGORIA não tem tabela de nomes no esquema:
+# quem tiver esse cadastro passa `nomes_categorias` (id -> nome como aparece
+# em CATEGORIAS_ACEITAS) e a categoria do item entra junto com as do título.
+#
+# Itens repetem título e categoria, então a correspondência é resolvida por
+# combinação distinta (título, ID_CATEGORIA) e expandida para os itens com
+# gathers. As candidatas de cada item vêm ordenadas pela fila atual de
+# doações pendentes (ciclo_vida.pendentes_atuais), da menos à mais carregada.
+#
+# Quando INSTITUICAO muda, `atualizado` devolve um índice novo que só volta
+# a separar o texto das instituições novas ou com CATEGORIAS_ACEITAS
+# alterada; as demais reaproveitam os pares (categoria, instituição) já
+# separados.
+
+SEPARADORES = re.compile(r"[,;/|]")
+
+
+def separar_categorias(texto):
+    # "Roupas, Alimentos" -> ["roupas", "alimentos"], sem vazios nem repetidas
+    partes = normalizar(SEPARADORES.split(texto)) if texto else []
+    return list(dict.fromkeys(p for p in partes if p))
+
+
+def _textos(df_instituicoes):
+    return df_instituicoes["CATEGORIAS_ACEITAS"].astype(object).fillna("").to_numpy(dtype=object)
+
+
+def _pares(ids, textos):
+    # (categoria, id) para cada categoria aceita por cada instituição,
+    # separando cada texto distinto uma vez só
+    codigos, distintos = pd.factorize(textos)
+    separados = [separar_categorias(str(t)) for t in distintos]
+    tamanhos = np.array([len(s) for s in separados], dtype=np.int64)
+    planos = np.array([c for s in separados for c in s], dtype=object)
+    inicio = np.cumsum(tamanhos) - tamanhos
+
+    contagem = tamanhos[codigos]
+    return planos[expandir(inicio[codigos], contagem)], np.repeat(ids, contagem)
+
+
+class IndiceCategorias:
+    def __init__(self, df_instituicoes=None, _estado=None):
+        if _estado is None:
+            ids = df_instituicoes["ID_INSTITUICAO"].to_numpy().astype(np.int64)
+            textos = _textos(df_instituicoes)
+            _estado = (ids, textos) + _pares(ids, textos)
+            self.reprocessadas = len(ids)
+        ids, textos, categorias_pares, ids_pares = _estado
+        ordem = np.argsort(ids, kind="stable")
+        self.ids, self.textos = ids[ordem], textos[ordem]
+        self._categorias_pares, self._ids_pares = categorias_pares, ids_pares
+
+        # CSR: instituições de cada categoria, em ordem de id
+        self.categorias, codigos = np.unique(categorias_pares.astype(str), return_inverse=True)
+        ordem = np.lexsort((ids_pares, codigos))
+        codigos, instituicoes = codigos[ordem], ids_pares[ordem]
+        unicos = np.ones(len(codigos), dtype=bool)
+        unicos[1:] = (codigos[1:] != codigos[:-1]) | (instituicoes[1:] != instituicoes[:-1])
+        codigos, self.instituicoes = codigos[unicos], instituicoes[unicos]
+        self.offsets = np.searchsorted(codigos, np.arange(len(self.categorias) + 1))
+
+        # palavra -> categorias que a contêm, para casar títulos sem testar
+        # todas as categorias
+        self._palavras = [frozenset(c.split()) for c in self.categorias]
+        self._por_palavra = {}
+        for codigo, palavras in enumerate(self._palavras):
+            for palavra in palavras:
+                self._por_palavra.setdefault(palavra, []).append(codigo)
+
+    def atualizado(self, df_instituicoes):
+        # novo índice para a tabela INSTITUICAO atual
+        ids = df_instituicoes["ID_INSTITUICAO"].to_numpy().astype(np.int64)
+        textos = _textos(df_instituicoes)
+        pos = posicoes(self.ids, ids)
+        iguais = pos >= 0
+        iguais[iguais] = self.textos[pos[iguais]] == textos[iguais]
+
+        mantidos = np.isin(self._ids_pares, ids[iguais])
+        categorias_novas, ids_novos = _pares(ids[~iguais], textos[~iguais])
+        indice = IndiceCategorias(_estado=(
+            ids,
+            textos,
+            np.concatenate([self._categorias_pares[mantidos], categorias_novas]),
+            np.concatenate([self._ids_pares[mantidos], ids_novos]),
+        ))
+        indice.reprocessadas = int((~iguais).sum())
+        return indice
+
+    def categorias_do_texto(self, texto):
+        # códigos das categorias cujas palavras estão todas em `texto`
+        palavras = frozenset(texto.split())
+        candidatas = {c for p in palavras for c in self._por_palavra.get(p, ())}
+        return sorted(c for c in candidatas if self._palavras[c] <= palavras)
+
+    def codigo(self, categoria):
+        k = np.searchsorted(self.categorias, categoria)
+        return int(k) if k < len(self.categorias) and self.categorias[k] == categoria else -1
+
+
+# ---------------------------------------------------------
+# CORRESPONDÊNCIA EM LOTE
+# ---------------------------------------------------------
+def corresponder(indice, df_itens, carga, indice_instituicoes=None, n=5, nomes_categorias=None):
+    # até n instituições candidatas por item, da menor para a maior fila de
+    # pendentes (`carga`: ID_INSTITUICAO, PENDENTES). Itens sem categoria
+    # aceita por nenhuma instituição ficam fora do resultado.
+    colunas = ["ID_ITEM", "ORDEM", "ID_INSTITUICAO", "PENDENTES"] + (["NOME"] if indice_instituicoes is not None else [])
+    if df_itens.empty or len(indice.categorias) == 0:
+        return pd.DataFrame(columns=colunas)
+
+    # combinações distintas (título, ID_CATEGORIA)
+    titulos, titulos_distintos = pd.factorize(df_itens["TITULO"].astype(object), use_na_sentinel=False)
+    id_categoria = df_itens["ID_CATEGORIA"].astype("Int64").fillna(-1).to_numpy(dtype=np.int64)
+    base = int(id_categoria.max()) + 2
+    grupos, chaves = pd.factorize(titulos.astype(np.int64) * base + id_categoria + 1)
+    combinacoes = np.column_stack([chaves // base, chaves % base - 1])
+
+    titulos_normalizados = normalizar(titulos_distintos)
+    nomes = dict(zip(nomes_categorias, normalizar(list(nomes_categorias.values())))) if nomes_categorias else {}
+    pares = []
+    for grupo, (titulo, categoria) in enumerate(combinacoes):
+        codigos = set(indice.categorias_do_texto(titulos_normalizados[titulo]))
+        if categoria in nomes and indice.codigo(nomes[categoria]) >= 0:
+            codigos.add(indice.codigo(nomes[categoria]))
+        pares.extend((grupo, c) for c in codigos)
+    if not pares:
+        return pd.DataFrame(columns=colunas)
+    pares = np.array(pares, dtype=np.int64)
+
+    # instituições de cada (grupo, categoria) pelo CSR, sem repetidas por grupo
+    inicio = indice.offsets[pares[:, 1]]
+    contagem = indice.offsets[pares[:, 1] + 1] - inicio
+    grupo_candidata = np.repeat(pares[:, 0], contagem)
+    candidatas = indice.instituicoes[expandir(inicio, contagem)]
+
+    pos = posicoes(carga["ID_INSTITUICAO"].to_numpy(), candidatas)
+    pendentes = np.where(pos >= 0, carga["PENDENTES"].to_numpy()[np.maximum(pos, 0)], 0)
+    ordem = np.lexsort((candidatas, pendentes, grupo_candidata))
+    grupo_candidata, candidatas, pendentes = grupo_candidata[ordem], candidatas[ordem], pendentes[ordem]
+    # a mesma instituição vinda de duas categorias do item tem a mesma fila,
+    # então as repetidas ficam vizinhas
+    unicas = np.ones(len(candidatas), dtype=bool)
+    unicas[1:] = (grupo_candidata[1:] != grupo_candidata[:-1]) | (candidatas[1:] != candidatas[:-1])
+    grupo_candidata, candidatas, pendentes = grupo_candidata[unicas], candidatas[unicas], pendentes[unicas]
+
+    # as n primeiras de cada grupo
+    offsets = np.searchsorted(grupo_candidata, np.arange(len(combinacoes) + 1))
+    ordem_no_grupo = np.arange(len(candidatas)) - offsets[grupo_candidata]
+    primeiras = ordem_no_grupo < n
+    grupo_candidata, candidatas, pendentes = grupo_candidata[primeiras], candidatas[primeiras], pendentes[primeiras]
+    ordem_no_grupo = ordem_no_grupo[primeiras]
+    offsets = np.searchsorted(grupo_candidata, np.arange(len(combinacoes) + 1))
+
+    # de volta aos itens
+    inicio = offsets[grupos]
+    contagem = offsets[grupos + 1] - inicio
+    linhas = expandir(inicio, contagem)
+    df = pd.DataFrame({
+        "ID_ITEM": np.repeat(df_itens["ID_ITEM"].to_numpy(), contagem),
+        "ORDEM": ordem_no_grupo[linhas] + 1,
+        "ID_INSTITUICAO": candidatas[linhas],
+        "PENDENTES": pendentes[linhas],
+    })
+    if indice_instituicoes is not None:
+        df["NOME"] = indice_instituicoes.nomes_de(df["ID_INSTITUICAO"].to_numpy())
+    return df
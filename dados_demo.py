@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+
+from esquema import STATUS_OPCOES, TABELAS, aplicar_esquema
+
+# =========================================================
+# GERADOR DE DADOS SIMULADOS (MODO DEMO / TESTE DE CARGA)
+# =========================================================
+# Todas as colunas são geradas de forma vetorizada a partir de um único
+# numpy.random.Generator, então a mesma seed sempre produz as mesmas tabelas.
+# Com escala=1 os volumes são os do modo demo original (150 usuários,
+# 200 itens, 300 doações, 150 impactos e 500 itens de doação). As tabelas
+# saem já nos tipos compactos de esquema.py.
+
+INSTITUICOES_NOMES = [
+    'Casa de Apoio São Francisco', 'Instituto Esperança', 'ONG Mãos Solidárias',
+    'Associação Vida Nova', 'Centro Comunitário Esperança', 'Instituto Recomeço',
+    'Casa de Acolhimento Luz', 'ONG Futuro Melhor', 'Associação Amigos do Bem',
+    'Centro Social Renascer', 'Instituto Solidário', 'Casa da Criança',
+    'ONG Novo Horizonte', 'Associação Comunidade Viva', 'Centro de Apoio Familiar'
+]
+
+ITENS_LISTA = [
+    'Cesta Básica', 'Roupas Infantis', 'Cobertores', 'Brinquedos',
+    'Material Escolar', 'Calçados', 'Agasalhos', 'Fraldas',
+    'Leite em Pó', 'Produtos de Higiene', 'Livros', 'Móveis',
+    'Eletrodomésticos', 'Colchões', 'Roupas de Cama'
+]
+
+ESTADOS_CONSERVACAO = ['NOVO', 'BOM', 'REGULAR']
+
+STATUS_PESOS = [0.25, 0.15, 0.50, 0.10]
+
+DIAS_HISTORICO = 90
+SEGUNDOS_DIA = 24 * 60 * 60
+
+VOLUMES_BASE = {
+    'usuarios': 150,
+    'itens': 200,
+    'doacoes': 300,
+    'impacto': 150,
+    'doacao_itens': 500,
+}
+
+
+def _volumes(escala):
+    volumes = {nome: max(1, int(round(qtd * escala))) for nome, qtd in VOLUMES_BASE.items()}
+    volumes['impacto'] = min(volumes['impacto'], volumes['doacoes'])
+    # Instituições crescem mais devagar que as doações: ~2.700 para 10M de doações.
+    volumes['instituicoes'] = max(len(INSTITUICOES_NOMES), int(round(len(INSTITUICOES_NOMES) * np.sqrt(escala))))
+    return volumes
+
+
+def _constante(valor, n):
+    return pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), categories=[valor])
+
+
+def _sorteio(rng, opcoes, n, p=None):
+    codigos = rng.choice(len(opcoes), size=n, p=p).astype(np.int8)
+    return pd.Categorical.from_codes(codigos, categories=opcoes)
+
+
+def _com_prefixo(prefixo, valores, sufixo=''):
+    return prefixo + pd.Series(valores).astype(str) + sufixo
+
+
+def _datas(rng, data_inicio, n, dias=DIAS_HISTORICO, com_hora=False):
+    # nunca passa de data_inicio + dias, para não gerar datas no futuro
+    if com_hora:
+        offsets = rng.integers(0, dias * SEGUNDOS_DIA + 1, size=n, dtype=np.int64)
+    else:
+        offsets = rng.integers(0, dias + 1, size=n, dtype=np.int64) * SEGUNDOS_DIA
+    datas = data_inicio.to_datetime64().astype('datetime64[s]') + offsets.astype('timedelta64[s]')
+    return pd.DatetimeIndex(datas.astype('datetime64[ns]'))
+
+
+def gerar_dados_demo(escala=1.0, seed=42, data_fim=None):
+    rng = np.random.default_rng(seed)
+    volumes = _volumes(escala)
+
+    if data_fim is None:
+        data_fim = pd.Timestamp.now().floor('s')
+    data_inicio = pd.Timestamp(data_fim) - pd.Timedelta(days=DIAS_HISTORICO)
+
+    # Usuários Demo
+    n_usuarios = volumes['usuarios']
+    ids_usuarios = np.arange(1, n_usuarios + 1, dtype=np.int32)
+    df_usuarios = pd.DataFrame({
+        'ID_USUARIO': ids_usuarios,
+        'NOME': _com_prefixo('Usuário ', ids_usuarios),
+        'SENHA': _constante('****', n_usuarios),
+        'DT_CADASTRO': _datas(rng, data_inicio, n_usuarios),
+        'EMAIL': _com_prefixo('usuario', ids_usuarios, '@email.com'),
+        'TELEFONE': (
+            _com_prefixo('11-9', rng.integers(1000, 10000, size=n_usuarios))
+            + _com_prefixo('-', rng.integers(1000, 10000, size=n_usuarios))
+        ),
+        'ID_ENDERECO': ids_usuarios,
+    })
+
+    # Instituições Demo
+    n_inst = volumes['instituicoes']
+    ids_inst = np.arange(1, n_inst + 1, dtype=np.int32)
+    base_nomes = pd.Series(np.resize(np.asarray(INSTITUICOES_NOMES, dtype=object), n_inst))
+    rodada = (ids_inst - 1) // len(INSTITUICOES_NOMES)
+    nomes_inst = base_nomes.where(rodada == 0, base_nomes + ' ' + pd.Series(rodada + 1).astype(str))
+    cnpj_partes = [
+        rng.integers(10, 100, size=n_inst),
+        rng.integers(100, 1000, size=n_inst),
+        rng.integers(100, 1000, size=n_inst),
+        rng.integers(10, 100, size=n_inst),
+    ]
+    df_instituicoes = pd.DataFrame({
+        'ID_INSTITUICAO': ids_inst,
+        'NOME': nomes_inst,
+        'EMAIL': nomes_inst.str.lower().str.replace(' ', '', regex=False).str[:10] + '@ong.org.br',
+        'TELEFONE': (
+            _com_prefixo('11-', rng.integers(2000, 6000, size=n_inst))
+            + _com_prefixo('-', rng.integers(1000, 10000, size=n_inst))
+        ),
+        'ID_ENDERECO': ids_inst + 100,
+        'CATEGORIAS_ACEITAS': _constante('Roupas, Alimentos, Brinquedos', n_inst),
+        'CNPJ': (
+            _com_prefixo('', cnpj_partes[0], '.') + _com_prefixo('', cnpj_partes[1], '.')
+            + _com_prefixo('', cnpj_partes[2], '/0001-') + pd.Series(cnpj_partes[3]).astype(str)
+        ),
+    })
+
+    # Itens Demo
+    n_itens = volumes['itens']
+    df_itens = pd.DataFrame({
+        'ID_ITEM': np.arange(1, n_itens + 1, dtype=np.int32),
+        'TITULO': _sorteio(rng, ITENS_LISTA, n_itens),
+        'FOTO_URL': _constante('https://exemplo.com/foto.jpg', n_itens),
+        'ESTADO_CONSERVACAO': _sorteio(rng, ESTADOS_CONSERVACAO, n_itens),
+        'DT_REGISTRO': _datas(rng, data_inicio, n_itens),
+        'DESCRICAO': _constante('Item em bom estado para doação', n_itens),
+        'ID_DOACAO': rng.integers(1, volumes['doacoes'] + 1, size=n_itens, dtype=np.int32),
+        'ID_USUARIO': rng.integers(1, n_usuarios + 1, size=n_itens, dtype=np.int32),
+        'ID_CATEGORIA': rng.integers(1, 11, size=n_itens, dtype=np.int8),
+    })
+
+    # Doações Demo
+    n_doacoes = volumes['doacoes']
+    status = _sorteio(rng, STATUS_OPCOES, n_doacoes, p=STATUS_PESOS)
+    dt_solicitacao = _datas(rng, data_inicio, n_doacoes, com_hora=True)
+    dias_confirmacao = rng.integers(1, 8, size=n_doacoes).astype('timedelta64[D]')
+    concluida = status.codes == STATUS_OPCOES.index('CONCLUIDA')
+    df_doacoes = pd.DataFrame({
+        'ID_DOACAO': np.arange(1, n_doacoes + 1, dtype=np.int32),
+        'STATUS': status,
+        'DT_SOLICITACAO': dt_solicitacao,
+        'DT_CONFIRMACAO': (dt_solicitacao + dias_confirmacao).where(concluida),
+        'ID_USUARIO': rng.integers(1, n_usuarios + 1, size=n_doacoes, dtype=np.int32),
+        'ID_INSTITUICAO': rng.integers(1, n_inst + 1, size=n_doacoes, dtype=np.int32),
+    })
+
+    # Impacto Demo
+    n_impacto = volumes['impacto']
+    df_impacto = pd.DataFrame({
+        'ID_IMPACTO': np.arange(1, n_impacto + 1, dtype=np.int32),
+        'ID_DOACAO': (rng.choice(n_doacoes, size=n_impacto, replace=False) + 1).astype(np.int32),
+        'PONTUACAO': rng.integers(70, 101, size=n_impacto, dtype=np.int8),
+        'OBSERVACAO': _constante('Impacto positivo na comunidade', n_impacto),
+    })
+
+    # Itens das doações
+    n_doacao_itens = volumes['doacao_itens']
+    df_doacao_itens = pd.DataFrame({
+        'ID_DOACAO_ITEM': np.arange(1, n_doacao_itens + 1, dtype=np.int32),
+        'QTDE': rng.integers(1, 11, size=n_doacao_itens, dtype=np.int8),
+        'ID_DOACAO': rng.integers(1, n_doacoes + 1, size=n_doacao_itens, dtype=np.int32),
+        'ITEM': _sorteio(rng, ITENS_LISTA, n_doacao_itens),
+    })
+
+    tabelas = (df_usuarios, df_instituicoes, df_itens, df_doacoes, df_impacto, df_doacao_itens)
+    return tuple(aplicar_esquema(df, nome) for nome, df in zip(TABELAS, tabelas))
+
+
+def escala_para_doacoes(n_doacoes):
+    return n_doacoes / VOLUMES_BASE['doacoes']
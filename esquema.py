@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+
+# =========================================================
+# ESQUEMA DAS TABELAS HELPLINK
+# =========================================================
+# Tipos compactos usados em memória, tanto pelo gerador demo quanto pela
+# leitura do banco: ids em int32, quantidades e pontuações em int8, textos
+# repetidos como category e textos únicos como string[pyarrow].
+#
+# Inteiros só são reduzidos quando os valores cabem no tipo; se não couberem
+# (ex.: uma QTDE acima de 127), a coluna sobe para o menor tipo que comporta.
+
+STATUS_OPCOES = ['ABERTA', 'EM_ANDAMENTO', 'CONCLUIDA', 'CANCELADA']
+
+TEXTO = 'string[pyarrow]'
+CATEGORIA = 'category'
+DATA = 'datetime64[ns]'
+
+TIPOS = {
+    'USUARIO': {
+        'ID_USUARIO': 'int32',
+        'NOME': TEXTO,
+        'SENHA': CATEGORIA,
+        'DT_CADASTRO': DATA,
+        'EMAIL': TEXTO,
+        'TELEFONE': TEXTO,
+        'ID_ENDERECO': 'Int32',
+    },
+    'INSTITUICAO': {
+        'ID_INSTITUICAO': 'int32',
+        'NOME': TEXTO,
+        'EMAIL': TEXTO,
+        'TELEFONE': TEXTO,
+        'ID_ENDERECO': 'Int32',
+        'CATEGORIAS_ACEITAS': CATEGORIA,
+        'CNPJ': TEXTO,
+    },
+    'ITEM': {
+        'ID_ITEM': 'int32',
+        'TITULO': CATEGORIA,
+        'FOTO_URL': CATEGORIA,
+        'ESTADO_CONSERVACAO': CATEGORIA,
+        'DT_REGISTRO': DATA,
+        'DESCRICAO': CATEGORIA,
+        'ID_DOACAO': 'Int32',
+        'ID_USUARIO': 'Int32',
+        'ID_CATEGORIA': 'Int8',
+    },
+    'DOACAO': {
+        'ID_DOACAO': 'int32',
+        'STATUS': pd.CategoricalDtype(STATUS_OPCOES),
+        'DT_SOLICITACAO': DATA,
+        'DT_CONFIRMACAO': DATA,
+        'ID_USUARIO': 'int32',
+        'ID_INSTITUICAO': 'int32',
+    },
+    'IMPACTO': {
+        'ID_IMPACTO': 'int32',
+        'ID_DOACAO': 'int32',
+        'PONTUACAO': 'int8',
+        'OBSERVACAO': CATEGORIA,
+    },
+    'DOACAO_ITEM': {
+        'ID_DOACAO_ITEM': 'int32',
+        'QTDE': 'int8',
+        'ID_DOACAO': 'int32',
+        'ITEM': CATEGORIA,
+    },
+}
+
+TABELAS = list(TIPOS)
+COLUNAS = {tabela: list(tipos) for tabela, tipos in TIPOS.items()}
+DATAS = {
+    tabela: [coluna for coluna, tipo in tipos.items() if tipo == DATA]
+    for tabela, tipos in TIPOS.items()
+}
+
+_INTEIROS = ['int8', 'int16', 'int32', 'int64']
+
+
+def _inteiro_compacto(serie, tipo):
+    anulavel = tipo[0] == 'I'
+    valores = serie.dropna() if anulavel else serie
+    if len(valores):
+        minimo, maximo = valores.min(), valores.max()
+        for candidato in _INTEIROS[_INTEIROS.index(tipo.lower()):]:
+            info = np.iinfo(candidato)
+            if info.min <= minimo and maximo <= info.max:
+                tipo = candidato.capitalize() if anulavel else candidato
+                break
+    if serie.dtype == tipo:
+        return serie
+    return serie.astype(tipo)
+
+
+def _converter(serie, tipo, categorias):
+    if isinstance(tipo, str) and tipo.lower() in _INTEIROS:
+        return _inteiro_compacto(serie, tipo)
+    if tipo == DATA:
+        return pd.to_datetime(serie).astype(DATA)
+    if tipo == TEXTO:
+        return serie.astype(TEXTO)
+    if not categorias:
+        return serie
+    if tipo == CATEGORIA and isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie
+    return serie.astype(tipo)
+
+
+def aplicar_esquema(df, tabela, categorias=True):
+    tipos = TIPOS[tabela]
+    return df.assign(**{
+        coluna: _converter(df[coluna], tipos[coluna], categorias)
+        for coluna in df.columns
+        if coluna in tipos
+    })
+
+
+def tabela_vazia(tabela, colunas=None):
+    colunas = colunas or COLUNAS[tabela]
+    return aplicar_esquema(pd.DataFrame({coluna: [] for coluna in colunas}), tabela)
+
+
+def relatorio_memoria(tabelas):
+    linhas = []
+    for nome, df in zip(TABELAS, tabelas):
+        linhas.append({
+            'TABELA': nome,
+            'LINHAS': len(df),
+            'MEMORIA_MB': df.memory_usage(deep=True, index=False).sum() / 1024 ** 2,
+        })
+    return pd.DataFrame(linhas)
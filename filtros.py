@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from esquema import STATUS_OPCOES
+
+# =========================================================
+# FILTROS DAS DOAÇÕES
+# =========================================================
+# Funções puras (sem Streamlit) para que o resultado possa ser memoizado
+# pela combinação de filtros escolhida na sidebar.
+#
+# preparar_doacoes() deixa DOACAO ordenada por DT_SOLICITACAO (NaT no fim,
+# a mesma ordem do numpy) e com STATUS categórico. Assim o período vira um
+# fatiamento por searchsorted e status/instituição são comparações entre
+# inteiros, sem criar objetos date por linha.
+
+
+def preparar_doacoes(df_doacoes):
+    df = df_doacoes
+    if not isinstance(df["STATUS"].dtype, pd.CategoricalDtype):
+        df = df.assign(STATUS=df["STATUS"].astype(pd.CategoricalDtype(STATUS_OPCOES)))
+    return df.sort_values("DT_SOLICITACAO", kind="stable", na_position="last", ignore_index=True)
+
+
+def _datas(df_doacoes):
+    return df_doacoes["DT_SOLICITACAO"].to_numpy(dtype="datetime64[ns]")
+
+
+def limites_datas(df_doacoes):
+    datas = _datas(df_doacoes)
+    n_validas = np.searchsorted(datas, np.datetime64("NaT"))
+    if n_validas == 0:
+        return None, None
+    return pd.Timestamp(datas[0]).date(), pd.Timestamp(datas[n_validas - 1]).date()
+
+
+def status_presentes(df_doacoes):
+    status = df_doacoes["STATUS"]
+    codigos = status.cat.codes.to_numpy()
+    contagem = np.bincount(codigos[codigos >= 0], minlength=len(status.cat.categories))
+    return sorted(c for c, n in zip(status.cat.categories, contagem) if n > 0)
+
+
+def fatia_periodo(datas, data_ini, data_fim):
+    inicio = np.searchsorted(datas, np.datetime64(data_ini, "ns"), side="left")
+    fim = np.searchsorted(datas, np.datetime64(data_fim + timedelta(days=1), "ns"), side="left")
+    return slice(inicio, fim)
+
+
+def mascara_status(categorias, codigos, status):
+    selecionados = np.isin(np.asarray(categorias, dtype=object), list(status))
+    # código -1 (status nulo) cai na última posição, sempre False
+    return np.append(selecionados, False)[codigos]
+
+
+def chave_filtros(data_ini, data_fim, status, id_instituicao):
+    return data_ini, data_fim, frozenset(status or ()), id_instituicao
+
+
+def mascara_status_instituicao(df, status=None, id_instituicao=None):
+    mascara = None
+    if status:
+        mascara = mascara_status(df["STATUS"].cat.categories, df["STATUS"].cat.codes.to_numpy(), status)
+
+    if id_instituicao is not None:
+        mascara_inst = df["ID_INSTITUICAO"].to_numpy() == id_instituicao
+        mascara = mascara_inst if mascara is None else mascara & mascara_inst
+    return mascara
+
+
+def filtrar_doacoes(
+    df_doacoes,
+    df_doacao_itens,
+    df_impacto,
+    juncao_itens,
+    juncao_impacto,
+    data_ini,
+    data_fim,
+    status=None,
+    id_instituicao=None,
+):
+    periodo = fatia_periodo(_datas(df_doacoes), data_ini, data_fim)
+    posicoes_doacoes = np.arange(periodo.start, periodo.stop)
+
+    mascara = mascara_status_instituicao(df_doacoes.iloc[periodo], status, id_instituicao)
+    if mascara is not None:
+        posicoes_doacoes = posicoes_doacoes[mascara]
+
+    df_doacoes_filtrado = df_doacoes.iloc[posicoes_doacoes]
+    df_doacao_itens_filtrado = df_doacao_itens.iloc[juncao_itens.linhas(posicoes_doacoes)]
+    df_impacto_filtrado = df_impacto.iloc[juncao_impacto.linhas(posicoes_doacoes)]
+
+    return df_doacoes_filtrado, df_doacao_itens_filtrado, df_impacto_filtrado
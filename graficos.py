@@ -0,0 +1,178 @@
+import plotly.express as px
+import plotly.graph_objects as go
+
+from resolucao import MAX_PONTOS_SERIE, figura_no_orcamento, modo_render, reduzir_serie
+
+# =========================================================
+# FIGURAS DO DASHBOARD
+# =========================================================
+# Cada função recebe um agregado já calculado (agregacoes.py / resolucao.py)
+# e devolve a figura plotly, sem depender do Streamlit. O dashboard só
+# importa este módulo dentro das seções, então o plotly continua sendo
+# carregado apenas quando algum gráfico é exibido.
+
+ESCALA_HEATMAP = [
+    [0.0, '#0a0a0a'],
+    [0.2, '#1a1a2e'],
+    [0.4, '#16213e'],
+    [0.6, '#0f3460'],
+    [0.8, '#1e5f8e'],
+    [1.0, '#4a9eda']
+]
+
+
+def figura_status_barras(df_status):
+    fig = px.bar(
+        df_status,
+        x="STATUS",
+        y="QTD",
+        text="QTD",
+        template="plotly_dark",
+        labels={"STATUS": "Status", "QTD": "Quantidade"},
+    )
+    fig.update_traces(textposition="outside")
+    fig.update_layout(height=400, showlegend=False)
+    return fig
+
+
+def figura_status_pizza(df_status):
+    fig = px.pie(
+        df_status,
+        names="STATUS",
+        values="QTD",
+        hole=0.4,
+        template="plotly_dark",
+    )
+    fig.update_layout(height=400)
+    return fig
+
+
+def figura_serie(df_tempo, max_pontos=MAX_PONTOS_SERIE):
+    # df_tempo já agrupado por dia/semana/mês; LTTB e orçamento de tamanho aqui
+    def construir(max_pontos):
+        df_linha = reduzir_serie(df_tempo, "DATA", "QTD_DOACOES", max_pontos)
+        fig = px.line(
+            df_linha,
+            x="DATA",
+            y="QTD_DOACOES",
+            markers=len(df_linha) <= MAX_PONTOS_SERIE,
+            render_mode=modo_render(len(df_linha)),
+            template="plotly_dark",
+            labels={"DATA": "Data", "QTD_DOACOES": "Qtd de Doações"},
+        )
+        fig.update_layout(height=450)
+        return fig
+
+    return figura_no_orcamento(construir, max_pontos)
+
+
+def figura_top_instituicoes(df_inst_count):
+    fig = px.bar(
+        df_inst_count,
+        x="QTD_DOACOES",
+        y="NOME",
+        orientation="h",
+        template="plotly_dark",
+    )
+    fig.update_layout(height=450)
+    return fig
+
+
+def figura_top_itens(df_items_count):
+    fig = px.bar(
+        df_items_count,
+        x="QTDE",
+        y="ITEM",
+        orientation="h",
+        template="plotly_dark",
+    )
+    fig.update_layout(height=450)
+    return fig
+
+
+def figura_impacto(df_hist):
+    fig = px.bar(
+        df_hist,
+        x="INICIO",
+        y="QTD",
+        template="plotly_dark",
+        labels={"INICIO": "Pontuação", "QTD": "Doações"},
+    )
+    # cada barra começa em INICIO e cobre 90% da faixa
+    fig.update_traces(offset=0, width=(df_hist["FIM"] - df_hist["INICIO"]).to_numpy() * 0.9)
+    fig.update_layout(height=450)
+    return fig
+
+
+def figura_impacto_semanas(df_semanas):
+    # média e quantis da pontuação por semana; semanas sem avaliação ficam
+    # como lacunas na linha
+    df_linhas = df_semanas.melt(
+        id_vars="SEMANA",
+        value_vars=["MEDIA", "P50", "P90", "P99"],
+        var_name="MEDIDA",
+        value_name="PONTUACAO",
+    )
+    fig = px.line(
+        df_linhas,
+        x="SEMANA",
+        y="PONTUACAO",
+        color="MEDIDA",
+        markers=True,
+        template="plotly_dark",
+        labels={"SEMANA": "Semana", "PONTUACAO": "Pontuação", "MEDIDA": ""},
+    )
+    fig.update_layout(height=400)
+    return fig
+
+
+def figura_fila_diaria(df_fila, max_pontos=MAX_PONTOS_SERIE):
+    # pendentes ao fim de cada dia; anos de histórico passam pelo LTTB
+    def construir(max_pontos):
+        df_linha = reduzir_serie(df_fila, "DATA", "PENDENTES", max_pontos)
+        fig = px.area(
+            df_linha,
+            x="DATA",
+            y="PENDENTES",
+            template="plotly_dark",
+            labels={"DATA": "Data", "PENDENTES": "Doações pendentes"},
+        )
+        fig.update_layout(height=400)
+        return fig
+
+    return figura_no_orcamento(construir, max_pontos)
+
+
+def figura_espera(df_espera):
+    fig = px.bar(
+        df_espera,
+        x="FAIXA",
+        y="QTD",
+        text="QTD",
+        template="plotly_dark",
+        labels={"FAIXA": "Tempo até a confirmação", "QTD": "Doações"},
+    )
+    fig.update_traces(textposition="outside")
+    fig.update_layout(height=400, showlegend=False)
+    return fig
+
+
+def figura_heatmap(df_heat, rotulo_x, rotulo_y):
+    # df_heat: matriz densa (linhas = eixo y, colunas = eixo x)
+    fig = go.Figure(
+        go.Heatmap(
+            z=df_heat.to_numpy(),
+            x=df_heat.columns,
+            y=df_heat.index,
+            colorscale=ESCALA_HEATMAP,
+            colorbar={"title": "Doações"},
+        )
+    )
+    fig.update_layout(
+        template="plotly_dark",
+        height=500,
+        xaxis_title=rotulo_x,
+        yaxis_title=rotulo_y,
+        yaxis_autorange="reversed",
+    )
+    return fig
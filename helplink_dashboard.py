@@ -1,10 +1,40 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
-import random
-import numpy as np
+import functools
+import os
+
+import banco_dados
+from cache import CacheLRU, ContadorCache
+from agregacoes import calcular_agregado
+from armazem import ArmazemTabelas
+from busca import ENTIDADES, IndiceBusca
+from paginacao import mascara_busca, ordem_coluna, paginar
+from resolucao import (
+    GRANULARIDADES,
+    MAX_PONTOS_DENSOS,
+    MAX_PONTOS_SERIE,
+    QUANTIS,
+    agrupar_serie,
+    escolher_granularidade,
+)
+from ciclo_vida import (
+    consolidar_cubo,
+    coortes_semanais,
+    distribuicao_espera,
+    fila_diaria,
+    pendentes_atuais,
+    pendentes_por_instituicao,
+    referencia_periodo,
+)
+from correspondencia import corresponder
+from impacto import calcular_impacto
+from ingestao import FonteArquivo, FonteBanco, IngestaoIncremental
+from instrumentacao import Perfil
+from paralelo import pool_do_ambiente
+from filtros import chave_filtros, filtrar_doacoes, limites_datas, status_presentes
+from preparacao import construir_estruturas, preparar_tabelas
+import preparacao
 
 # =========================================================
 # CONFIG BÁSICA DA PÁGINA
@@ -44,103 +74,40 @@ st.markdown(
 # =========================================================
 # MODO DEMO - DADOS SIMULADOS
 # =========================================================
-def gerar_dados_demo():
-    np.random.seed(42)
-    data_inicio = datetime.now() - timedelta(days=90)
-    datas = pd.date_range(start=data_inicio, end=datetime.now(), freq='D')
-
-    # Usuários Demo
-    df_usuarios = pd.DataFrame({
-        'ID_USUARIO': range(1, 151),
-        'NOME': [f'Usuário {i}' for i in range(1, 151)],
-        'SENHA': ['****' for _ in range(150)],
-        'DT_CADASTRO': pd.to_datetime([data_inicio + timedelta(days=random.randint(0, 90)) for _ in range(150)]),
-        'EMAIL': [f'usuario{i}@email.com' for i in range(1, 151)],
-        'TELEFONE': [f'11-9{random.randint(1000, 9999)}-{random.randint(1000, 9999)}' for _ in range(150)],
-        'ID_ENDERECO': range(1, 151)
-    })
-
-    # Instituições Demo
-    instituicoes_nomes = [
-        'Casa de Apoio São Francisco', 'Instituto Esperança', 'ONG Mãos Solidárias',
-        'Associação Vida Nova', 'Centro Comunitário Esperança', 'Instituto Recomeço',
-        'Casa de Acolhimento Luz', 'ONG Futuro Melhor', 'Associação Amigos do Bem',
-        'Centro Social Renascer', 'Instituto Solidário', 'Casa da Criança',
-        'ONG Novo Horizonte', 'Associação Comunidade Viva', 'Centro de Apoio Familiar'
-    ]
-
-    df_instituicoes = pd.DataFrame({
-        'ID_INSTITUICAO': range(1, len(instituicoes_nomes) + 1),
-        'NOME': instituicoes_nomes,
-        'EMAIL': [f'{nome.lower().replace(" ", "")[:10]}@ong.org.br' for nome in instituicoes_nomes],
-        'TELEFONE': [f'11-{random.randint(2000, 5999)}-{random.randint(1000, 9999)}' for _ in instituicoes_nomes],
-        'ID_ENDERECO': range(101, 101 + len(instituicoes_nomes)),
-        'CATEGORIAS_ACEITAS': ['Roupas, Alimentos, Brinquedos' for _ in instituicoes_nomes],
-        'CNPJ': [f'{random.randint(10, 99)}.{random.randint(100, 999)}.{random.randint(100, 999)}/0001-{random.randint(10, 99)}' for _ in instituicoes_nomes]
-    })
-
-    # Itens Demo
-    itens_lista = [
-        'Cesta Básica', 'Roupas Infantis', 'Cobertores', 'Brinquedos',
-        'Material Escolar', 'Calçados', 'Agasalhos', 'Fraldas',
-        'Leite em Pó', 'Produtos de Higiene', 'Livros', 'Móveis',
-        'Eletrodomésticos', 'Colchões', 'Roupas de Cama'
-    ]
-
-    df_itens = pd.DataFrame({
-        'ID_ITEM': range(1, 201),
-        'TITULO': [random.choice(itens_lista) for _ in range(200)],
-        'FOTO_URL': ['https://exemplo.com/foto.jpg' for _ in range(200)],
-        'ESTADO_CONSERVACAO': [random.choice(['NOVO', 'BOM', 'REGULAR']) for _ in range(200)],
-        'DT_REGISTRO': pd.to_datetime([data_inicio + timedelta(days=random.randint(0, 90)) for _ in range(200)]),
-        'DESCRICAO': ['Item em bom estado para doação' for _ in range(200)],
-        'ID_DOACAO': [random.randint(1, 300) for _ in range(200)],
-        'ID_USUARIO': [random.randint(1, 150) for _ in range(200)],
-        'ID_CATEGORIA': [random.randint(1, 10) for _ in range(200)]
-    })
-
-    # Doações Demo
-    status_opcoes = ['ABERTA', 'EM_ANDAMENTO', 'CONCLUIDA', 'CANCELADA']
-    status_pesos = [0.25, 0.15, 0.50, 0.10]
-
-    doacoes_data = []
-    for i in range(1, 301):
-        dt_solicitacao = data_inicio + timedelta(days=random.randint(0, 90))
-        status = np.random.choice(status_opcoes, p=status_pesos)
-        dt_confirmacao = dt_solicitacao + timedelta(days=random.randint(1, 7)) if status == 'CONCLUIDA' else None
-
-        doacoes_data.append({
-            'ID_DOACAO': i,
-            'STATUS': status,
-            'DT_SOLICITACAO': dt_solicitacao,
-            'DT_CONFIRMACAO': pd.to_datetime(dt_confirmacao) if dt_confirmacao else pd.NaT,
-            'ID_USUARIO': random.randint(1, 150),
-            'ID_INSTITUICAO': random.randint(1, len(instituicoes_nomes))
-        })
-
-    df_doacoes = pd.DataFrame(doacoes_data)
-
-    # Impacto Demo
-    df_impacto = pd.DataFrame({
-        'ID_IMPACTO': range(1, 151),
-        'ID_DOACAO': random.sample(range(1, 301), 150),
-        'PONTUACAO': [random.randint(70, 100) for _ in range(150)],
-        'OBSERVACAO': ['Impacto positivo na comunidade' for _ in range(150)]
-    })
-
-    # Itens das doações
-    doacao_itens_data = []
-    for i in range(1, 501):
-        doacao_itens_data.append({
-            'ID_DOACAO_ITEM': i,
-            'QTDE': random.randint(1, 10),
-            'ID_DOACAO': random.randint(1, 300),
-            'ITEM': random.choice(itens_lista)
-        })
-
-    df_doacao_itens = pd.DataFrame(doacao_itens_data)
-
-    return df_usuarios, df_instituicoes, df_itens, df_doacoes, df_impacto, df_doacao_itens
+# HELPLINK_ESCALA_DEMO multiplica os volumes do modo demo (testes de carga).
+ESCALA_DEMO = float(os.environ.get("HELPLINK_ESCALA_DEMO", "1"))
+
+# ---------------------------------------------------------
+# SNAPSHOT LOCAL – partida a frio sem reconstruir/consultar tudo
+# ---------------------------------------------------------
+# HELPLINK_SNAPSHOT=0 desliga o snapshot; com banco configurado os filtros
+# voltam a ser aplicados direto no SQL a cada combinação escolhida.
+USAR_SNAPSHOT = os.environ.get("HELPLINK_SNAPSHOT", "1") != "0"
+DIR_SNAPSHOT = os.environ.get(
+    "HELPLINK_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".helplink_snapshot"),
+)
+
+# ---------------------------------------------------------
+# TEMPO REAL – ingestão incremental de doações novas
+# ---------------------------------------------------------
+# HELPLINK_EVENTOS aponta para um arquivo JSON Lines de eventos (ver
+# ingestao.py); sem ele, o banco é consultado pelas marcas d'água.
+# HELPLINK_TEMPO_REAL é o intervalo de verificação em segundos (0 desliga).
+ARQUIVO_EVENTOS = os.environ.get("HELPLINK_EVENTOS")
+INTERVALO_TEMPO_REAL = float(os.environ.get("HELPLINK_TEMPO_REAL", "5" if ARQUIVO_EVENTOS else "0"))
+
+# ---------------------------------------------------------
+# INSTRUMENTAÇÃO – tempo e memória de cada etapa
+# ---------------------------------------------------------
+# HELPLINK_DEBUG=1 (ou ?debug=1 na URL) mostra o painel de desempenho na
+# sidebar. HELPLINK_PERFIL_MEMORIA=1 mede memória com tracemalloc (tem custo).
+# HELPLINK_PERFIL_JSON grava uma linha JSON por execução e
+# HELPLINK_PERFIL_PROMETHEUS mantém um arquivo no formato do Prometheus.
+DEBUG = os.environ.get("HELPLINK_DEBUG") == "1" or st.query_params.get("debug") == "1"
+PERFIL_MEMORIA = os.environ.get("HELPLINK_PERFIL_MEMORIA") == "1"
+PERFIL_JSON = os.environ.get("HELPLINK_PERFIL_JSON")
+PERFIL_PROMETHEUS = os.environ.get("HELPLINK_PERFIL_PROMETHEUS")
 
 
 # =========================================================
@@ -149,23 +116,231 @@ def gerar_dados_demo():
 
 @st.cache_resource(show_spinner=False, ttl=300)
 def get_connection():
-    return None
+    url = os.environ.get("HELPLINK_DB_URL")
+    if not url:
+        return None
+    return banco_dados.criar_pool(url)
 
 
-def carregar_dados():
-    try:
-        conn = get_connection()
-        if conn is None:
-            raise Exception("Sem conexão")
-    except:
-        st.sidebar.warning("Dados da HelpLink")
-        st.sidebar.caption("Banco de Dados HelpLink")
-        return gerar_dados_demo()
+# ---------------------------------------------------------
+# CACHE – tabelas carregadas e visões filtradas
+# ---------------------------------------------------------
+TTL_DADOS = 300
+
+# teto do cache de ordens e buscas das tabelas paginadas, em MB por processo
+MAX_MB_PAGINAS = 256
+
+# instituições listadas no seletor da sidebar sem precisar de busca
+MAX_OPCOES_INSTITUICOES = 200
+
+
+@st.cache_resource(show_spinner=False)
+def perfil_dashboard():
+    return Perfil(memoria=PERFIL_MEMORIA, arquivo_json=PERFIL_JSON, arquivo_prometheus=PERFIL_PROMETHEUS)
+
+
+execucao = perfil_dashboard().execucao()
+
+
+@st.cache_resource(show_spinner=False)
+def pool_agregacoes():
+    # um pool de processos para todas as sessões (HELPLINK_PROCESSOS)
+    return pool_do_ambiente()
+
+
+@st.cache_resource(show_spinner=False)
+def caches_dashboard():
+    # tabelas, visões/agregados por filtro e ordens/buscas das tabelas paginadas
+    return (
+        ContadorCache(),
+        CacheLRU(max_entradas=64, ttl=TTL_DADOS),
+        CacheLRU(max_entradas=16, ttl=TTL_DADOS, max_bytes=MAX_MB_PAGINAS * 2**20),
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def armazens_tabelas():
+    # uma cópia das tabelas por processo, lida por todas as sessões: cargas
+    # completas (demo ou banco) e cargas já filtradas no SQL (sem snapshot)
+    return ArmazemTabelas(max_entradas=2, ttl=TTL_DADOS), ArmazemTabelas(max_entradas=32, ttl=TTL_DADOS)
+
+
+@st.cache_resource(show_spinner=False, ttl=TTL_DADOS)
+def indice_busca_instituicoes(df_instituicoes):
+    # índice da sidebar quando as tabelas vêm filtradas do SQL: um por
+    # conteúdo da tabela de instituições, não um por rerun
+    return IndiceBusca(df_instituicoes, *ENTIDADES["instituicoes"][1:])
+
+
+def carregar_demo(escala):
+    def carregar():
+        caches_dashboard()[0].registrar_falha()
+        with st.spinner("Gerando dados..."):
+            return preparacao.carregar_demo(escala, DIR_SNAPSHOT if USAR_SNAPSHOT else None)
+
+    return armazens_tabelas()[0].obter(("demo", escala), carregar)
+
+
+def carregar_banco_completo(pool, url):
+    def carregar():
+        caches_dashboard()[0].registrar_falha()
+        with st.spinner("Atualizando dados do banco..."):
+            return preparacao.carregar_banco(pool, url, DIR_SNAPSHOT)
+
+    return armazens_tabelas()[0].obter(("banco", url), carregar)
+
+
+def carregar_banco(pool, url, data_ini, data_fim, status, id_instituicao):
+    def carregar():
+        caches_dashboard()[0].registrar_falha()
+        with st.spinner("Consultando o banco..."):
+            tabelas = preparar_tabelas(banco_dados.carregar_tabelas(
+                pool,
+                data_ini=data_ini,
+                data_fim=data_fim,
+                status=list(status),
+                id_instituicao=id_instituicao,
+            ))
+            estruturas = construir_estruturas(tabelas)
+            # A fila de pendentes não segue os filtros (inclui doações
+            # anteriores ao período e ignora o status): cubo e pendentes vêm
+            # de consultas próprias sobre todas as doações.
+            estruturas["cubo_fila"] = consolidar_cubo(banco_dados.movimentos_fila(pool))
+            estruturas["doacoes_fila"] = banco_dados.ler_doacoes_pendentes(
+                pool, referencia_periodo(data_fim), id_instituicao
+            )
+        return tabelas, estruturas
+
+    return armazens_tabelas()[1].obter((url, data_ini, data_fim, status, id_instituicao), carregar)
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def ingestao_tempo_real(versao_base, _tabelas, _estruturas, _pool):
+    # uma ingestão por carga base, compartilhada entre as sessões
+    fonte = FonteArquivo(ARQUIVO_EVENTOS) if ARQUIVO_EVENTOS else FonteBanco(_pool, _tabelas)
+    return IngestaoIncremental(_tabelas, _estruturas, fonte, construir_estruturas)
+
+
+def carregar_dados(pool=None, filtros=None):
+    caches_dashboard()[0].registrar_chamada()
+    if pool is not None:
+        url = os.environ.get("HELPLINK_DB_URL")
+        try:
+            if filtros is None:
+                resultado = carregar_banco_completo(pool, url)
+            else:
+                data_ini, data_fim, status, id_instituicao = filtros
+                resultado = carregar_banco(pool, url, data_ini, data_fim, tuple(sorted(status)), id_instituicao)
+            st.sidebar.caption("Banco de Dados HelpLink")
+            return resultado
+        except banco_dados.ErroBanco as e:
+            st.sidebar.error(f"Erro ao consultar o banco: {e}")
+
+    st.sidebar.warning("Dados da HelpLink")
+    st.sidebar.caption("Banco de Dados HelpLink")
+    return carregar_demo(ESCALA_DEMO)
 
 
 # =========================================================
 # CARREGAMENTO DOS DADOS
 # =========================================================
+# Com snapshot, as tabelas completas vêm do arquivo local (mais o que mudou
+# no banco desde a última carga) e os filtros rodam em memória. Sem snapshot,
+# a sidebar é montada a partir de consultas leves (min/max de datas, status e
+# instituições) e as tabelas só são lidas depois, já filtradas no SQL.
+with execucao.etapa("carga"):
+    pool = get_connection()
+    opcoes_filtros = None
+
+    if pool is not None and not USAR_SNAPSHOT:
+        try:
+            opcoes_filtros = banco_dados.opcoes_filtros(pool)
+        except banco_dados.ErroBanco as e:
+            st.sidebar.error(f"Erro ao conectar ao banco: {e}")
+            pool = None
+
+    ingestao = None
+
+    if opcoes_filtros is None:
+        tabelas, estruturas, versao_dados = carregar_dados(pool)
+
+        if INTERVALO_TEMPO_REAL > 0 and (ARQUIVO_EVENTOS or pool is not None):
+            ingestao = ingestao_tempo_real(versao_dados, tabelas, estruturas, pool)
+            tabelas, estruturas, versao_ingestao = ingestao.estado()
+            versao_dados = (versao_dados, versao_ingestao)
+
+        df_doacoes, df_inst_opcoes = tabelas[3], tabelas[1]
+
+        min_data, max_data = limites_datas(df_doacoes)
+        status_unicos = status_presentes(df_doacoes)
+    else:
+        min_data, max_data, status_unicos, df_inst_opcoes = opcoes_filtros
+
+# =========================================================
+# SIDEBAR – FILTROS
+# =========================================================
+with execucao.etapa("filtros"):
+    st.sidebar.header("⚙️ Filtros")
+
+    if min_data is None or max_data is None:
+        hoje = datetime.today().date()
+        min_data = hoje - timedelta(days=30)
+        max_data = hoje
+
+    periodo = st.sidebar.date_input(
+        "Período das doações",
+        value=(min_data, max_data),
+        min_value=min_data,
+        max_value=max_data,
+    )
+
+    if isinstance(periodo, tuple):
+        data_ini, data_fim = periodo
+    else:
+        data_ini = periodo
+        data_fim = periodo
+
+    status_default = status_unicos
+
+    status_selecionados = st.sidebar.multiselect(
+        "Status das doações",
+        options=status_unicos,
+        default=status_default,
+    )
+
+    # Até MAX_OPCOES_INSTITUICOES a lista vem inteira; acima disso, a caixa
+    # de busca (nome ou CNPJ, sem acentos) escolhe as opções do seletor.
+    if opcoes_filtros is None:
+        busca_inst = estruturas["busca"]["instituicoes"]
+    else:
+        busca_inst = indice_busca_instituicoes(df_inst_opcoes)
+
+    if len(busca_inst) <= MAX_OPCOES_INSTITUICOES:
+        nomes_inst = busca_inst.em_ordem()
+    else:
+        termo_inst = st.sidebar.text_input("Buscar instituição", placeholder="nome ou CNPJ", key="busca_instituicao")
+        nomes_inst = busca_inst.rotulos_de(busca_inst.buscar(termo_inst, MAX_OPCOES_INSTITUICOES)) if termo_inst.strip() else []
+        # a instituição já escolhida continua no seletor durante uma nova busca
+        anterior = st.session_state.get("instituicao", "Todas")
+        if anterior != "Todas" and anterior not in nomes_inst:
+            nomes_inst = [anterior] + nomes_inst
+    inst_escolhida = st.sidebar.selectbox(
+        "Filtrar por instituição (opcional)", ["Todas"] + nomes_inst, key="instituicao"
+    )
+
+    id_inst_escolhida = None
+    if inst_escolhida != "Todas":
+        id_inst = busca_inst.id_de(inst_escolhida)
+        if id_inst is not None:
+            id_inst_escolhida = int(id_inst)
+
+if opcoes_filtros is not None:
+    with execucao.etapa("carga_filtrada"):
+        tabelas, estruturas, versao_dados = carregar_dados(
+            pool,
+            filtros=(data_ini, data_fim, status_selecionados, id_inst_escolhida),
+        )
+
 (
     df_usuarios,
     df_instituicoes,
@@ -173,69 +348,110 @@ def carregar_dados():
     df_doacoes,
     df_impacto,
     df_doacao_itens,
-) = carregar_dados()
+) = tabelas
+
+cache_tabelas, cache_filtros, cache_paginas = caches_dashboard()
+
+chave_visao = (versao_dados,) + chave_filtros(data_ini, data_fim, status_selecionados, id_inst_escolhida)
+
+
+# As visões filtradas e os agregados só são calculados quando alguma seção
+# visível pede por eles (e ficam no cache de filtros para os próximos reruns).
+def visoes_filtradas():
+    with execucao.etapa("visoes_filtradas"):
+        return cache_filtros.obter(
+            chave_visao,
+            lambda: filtrar_doacoes(
+                df_doacoes,
+                df_doacao_itens,
+                df_impacto,
+                estruturas["juncao_itens"],
+                estruturas["juncao_impacto"],
+                data_ini,
+                data_fim,
+                status_selecionados,
+                id_inst_escolhida,
+            ),
+        )
 
-# =========================================================
-# SIDEBAR – FILTROS
-# =========================================================
-st.sidebar.header("⚙️ Filtros")
-
-if not df_doacoes.empty:
-    min_data = df_doacoes["DT_SOLICITACAO"].dt.date.min()
-    max_data = df_doacoes["DT_SOLICITACAO"].dt.date.max()
-else:
-    hoje = datetime.today().date()
-    min_data = hoje - timedelta(days=30)
-    max_data = hoje
-
-periodo = st.sidebar.date_input(
-    "Período das doações",
-    value=(min_data, max_data),
-    min_value=min_data,
-    max_value=max_data,
-)
 
-if isinstance(periodo, tuple):
-    data_ini, data_fim = periodo
-else:
-    data_ini = periodo
-    data_fim = periodo
+def agregado(nome):
+    pool = pool_agregacoes()
+    calcular = pool.calcular if pool is not None else calcular_agregado
+    with execucao.etapa(f"agregado:{nome}"):
+        return cache_filtros.obter(
+            chave_visao + (nome,),
+            lambda: calcular(
+                nome,
+                estruturas["rollup"],
+                estruturas["rollup_itens"],
+                estruturas["instituicoes"],
+                data_ini,
+                data_fim,
+                status_selecionados,
+                id_inst_escolhida,
+            ),
+        )
 
-status_unicos = sorted(df_doacoes["STATUS"].dropna().unique())
-status_default = status_unicos
 
-status_selecionados = st.sidebar.multiselect(
-    "Status das doações",
-    options=status_unicos,
-    default=status_default,
-)
+def medida(nome):
+    # etapa em volta de uma seção; como `execucao` é lida na chamada, também
+    # mede o fragmento quando ele é reexecutado sozinho
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def medida_funcao(*args, **kwargs):
+            with execucao.etapa(nome):
+                return funcao(*args, **kwargs)
+        return medida_funcao
+    return decorador
+
 
-opcoes_inst = ["Todas"] + sorted(df_instituicoes["NOME"].tolist())
-inst_escolhida = st.sidebar.selectbox("Filtrar por instituição (opcional)", opcoes_inst)
+def grafico(nome, figura):
+    # montar a figura e serializá-la para o browser (st.plotly_chart)
+    with execucao.etapa(f"grafico:{nome}"):
+        fig = figura()
+        st.plotly_chart(fig, use_container_width=True)
+    return fig
 
-df_doacoes_filtrado = df_doacoes.copy()
 
-df_doacoes_filtrado = df_doacoes_filtrado[
-    (df_doacoes_filtrado["DT_SOLICITACAO"].dt.date >= data_ini)
-    & (df_doacoes_filtrado["DT_SOLICITACAO"].dt.date <= data_fim)
-]
+with execucao.etapa("kpis"):
+    kpis = agregado("kpis")
 
-if status_selecionados:
-    df_doacoes_filtrado = df_doacoes_filtrado[
-        df_doacoes_filtrado["STATUS"].isin(status_selecionados)
-    ]
+st.sidebar.markdown("---")
+st.sidebar.caption(
+    f"Cache de tabelas: {cache_tabelas.acertos} acertos / {cache_tabelas.falhas} falhas "
+    f"({sum(a.memoria_mb() for a in armazens_tabelas()):.2f} MB compartilhados entre as sessões)"
+)
+st.sidebar.caption(
+    f"Cache de filtros: {cache_filtros.acertos} acertos / {cache_filtros.falhas} falhas "
+    f"({len(cache_filtros)} visões)"
+)
 
-if inst_escolhida != "Todas":
-    id_inst = df_instituicoes[df_instituicoes["NOME"] == inst_escolhida]["ID_INSTITUICAO"]
-    if not id_inst.empty:
-        df_doacoes_filtrado = df_doacoes_filtrado[
-            df_doacoes_filtrado["ID_INSTITUICAO"] == int(id_inst.iloc[0])
-        ]
+if ingestao is not None:
+    @st.fragment(run_every=INTERVALO_TEMPO_REAL)
+    def acompanhar_tempo_real():
+        try:
+            with execucao.etapa("tempo_real"):
+                mudou = ingestao.atualizar()
+            if mudou:
+                st.rerun()
+        except banco_dados.ErroBanco as e:
+            st.error(f"Erro ao buscar novidades: {e}")
+        st.caption(
+            f"🔴 Tempo real: {ingestao.eventos} eventos aplicados "
+            f"(verificado às {datetime.fromtimestamp(ingestao.ultima_leitura):%H:%M:%S})"
+        )
 
-ids_doacoes_filtradas = df_doacoes_filtrado["ID_DOACAO"].tolist()
+    with st.sidebar:
+        acompanhar_tempo_real()
 
-df_doacao_itens_filtrado = df_doacao_itens[df_doacao_itens["ID_DOACAO"].isin(ids_doacoes_filtradas)]
-df_impacto_filtrado = df_impacto[df_impacto["ID_DOACAO"].isin(ids_doacoes_filtradas)]
+with st.sidebar.expander("💾 Memória das tabelas"):
+    df_memoria = estruturas["memoria"]
+    st.dataframe(df_memoria, use_container_width=True, hide_index=True)
+    st.caption(f"Total: {df_memoria['MEMORIA_MB'].sum():.2f} MB")
+
+# preenchido no fim do script, quando todas as etapas já foram medidas
+painel_desempenho = st.sidebar.expander("⏱️ Desempenho") if DEBUG else None
 
 # =========================================================
 # TÍTULO
@@ -254,16 +470,10 @@ col1, col2, col3, col4, col5, col6 = st.columns(6)
 total_usuarios = len(df_usuarios)
 total_instituicoes = len(df_instituicoes)
 total_itens = len(df_itens)
-total_doacoes_periodo = len(df_doacoes_filtrado)
-total_concluidas = (df_doacoes_filtrado["STATUS"] == "CONCLUIDA").sum()
-
-if not df_doacao_itens_filtrado.empty and total_doacoes_periodo > 0:
-    itens_totais = df_doacao_itens_filtrado["QTDE"].sum()
-    itens_medios = itens_totais / total_doacoes_periodo
-else:
-    itens_medios = 0
-
-taxa_conclusao = (total_concluidas / total_doacoes_periodo) * 100 if total_doacoes_periodo > 0 else 0
+total_doacoes_periodo = kpis["total_doacoes"]
+total_concluidas = kpis["total_concluidas"]
+itens_medios = kpis["itens_medios"]
+taxa_conclusao = kpis["taxa_conclusao"]
 
 col1.metric("Usuários cadastrados", total_usuarios)
 col2.metric("Instituições", total_instituicoes)
@@ -275,283 +485,475 @@ col6.metric("Taxa de conclusão", f"{taxa_conclusao:.1f}%")
 st.markdown("---")
 
 # =========================================================
-# DOAÇÕES
+# SEÇÕES
 # =========================================================
-st.subheader("📊 Visão Geral das Doações")
-
-col_left, col_right = st.columns(2)
-
-with col_left:
-    st.markdown("#### Doações por Status")
-    if not df_doacoes_filtrado.empty:
-        s = df_doacoes_filtrado["STATUS"].value_counts()
-        df_status = s.reset_index()
-        df_status.columns = ["STATUS", "QTD"]
-
-        fig_bar_status = px.bar(
-            df_status,
-            x="STATUS",
-            y="QTD",
-            text="QTD",
-            template="plotly_dark",
-            labels={"STATUS": "Status", "QTD": "Quantidade"},
-        )
-        fig_bar_status.update_traces(textposition="outside")
-        fig_bar_status.update_layout(height=400, showlegend=False)
-        st.plotly_chart(fig_bar_status, use_container_width=True)
-    else:
-        st.info("Nenhuma doação encontrada.")
-
-with col_right:
-    st.markdown("#### Distribuição de Doações por Status")
-    if not df_doacoes_filtrado.empty:
-        fig_pie_status = px.pie(
-            df_status,
-            names="STATUS",
-            values="QTD",
-            hole=0.4,
-            template="plotly_dark",
-        )
-        fig_pie_status.update_layout(height=400)
-        st.plotly_chart(fig_pie_status, use_container_width=True)
-    else:
-        st.info("Sem dados.")
+# Cada seção é um fragmento: só a seção escolhida é executada (gráficos,
+# tabelas e imports pesados como plotly e o cliente da IA), e interações
+# dentro dela não reexecutam o restante do dashboard.
 
-st.markdown("---")
 
-# =========================================================
+# ---------------------------------------------------------
+# DOAÇÕES
+# ---------------------------------------------------------
+@st.fragment
+@medida("secao:visao_geral")
+def secao_visao_geral():
+    from graficos import figura_status_barras, figura_status_pizza
+
+    st.subheader("📊 Visão Geral das Doações")
+
+    col_left, col_right = st.columns(2)
+
+    with col_left:
+        st.markdown("#### Doações por Status")
+        df_status = agregado("status")
+        if not df_status.empty:
+            grafico("status_barras", lambda: figura_status_barras(df_status))
+        else:
+            st.info("Nenhuma doação encontrada.")
+
+    with col_right:
+        st.markdown("#### Distribuição de Doações por Status")
+        if not df_status.empty:
+            grafico("status_pizza", lambda: figura_status_pizza(df_status))
+        else:
+            st.info("Sem dados.")
+
+
+# ---------------------------------------------------------
 # EVOLUÇÃO TEMPORAL
-# =========================================================
-st.subheader("📈 Evolução das Doações ao Longo do Tempo")
-
-if not df_doacoes_filtrado.empty:
-    df_tempo = df_doacoes_filtrado.copy()
-    df_tempo["DATA"] = df_tempo["DT_SOLICITACAO"].dt.date
-    df_tempo = df_tempo.groupby("DATA")["ID_DOACAO"].count().reset_index(name="QTD_DOACOES")
-
-    fig_line_tempo = px.line(
-        df_tempo,
-        x="DATA",
-        y="QTD_DOACOES",
-        markers=True,
-        template="plotly_dark",
-        labels={"DATA": "Data", "QTD_DOACOES": "Qtd de Doações"},
-    )
-    fig_line_tempo.update_layout(height=450)
-    st.plotly_chart(fig_line_tempo, use_container_width=True)
-else:
-    st.info("Nenhuma informação temporal disponível.")
+# ---------------------------------------------------------
+@st.fragment
+@medida("secao:evolucao")
+def secao_evolucao():
+    from graficos import figura_serie
+
+    st.subheader("📈 Evolução das Doações ao Longo do Tempo")
+
+    df_tempo = agregado("serie")
+    if not df_tempo.empty:
+        automatica = escolher_granularidade(data_ini, data_fim)
+        opcoes = ["Automática"] + list(GRANULARIDADES)
+        escolha = st.radio("Agrupar por", opcoes, horizontal=True, key="granularidade")
+        granularidade = automatica if escolha == "Automática" else escolha
+        df_tempo = agrupar_serie(df_tempo, "DATA", ["QTD_DOACOES"], granularidade)
+        max_pontos = MAX_PONTOS_SERIE if escolha == "Automática" else MAX_PONTOS_DENSOS
+
+        fig_line_tempo = grafico("serie", lambda: figura_serie(df_tempo, max_pontos))
+        st.caption(f"{len(df_tempo)} pontos por {granularidade.lower()}, {len(fig_line_tempo.data[0].x)} desenhados")
+    else:
+        st.info("Nenhuma informação temporal disponível.")
 
-st.markdown("---")
 
-# =========================================================
+# ---------------------------------------------------------
 # INSTITUIÇÕES, ITENS E IMPACTO
-# =========================================================
-st.subheader("🏢 Instituições, 🎁 Itens e 🌱 Impacto")
-
-c1, c2, c3 = st.columns(3)
-
-with c1:
-    st.markdown("#### Top Instituições por Doações")
-    if not df_doacoes_filtrado.empty:
-        df_inst_count = df_doacoes_filtrado.groupby("ID_INSTITUICAO")["ID_DOACAO"].count().reset_index(name="QTD_DOACOES")
-        df_inst_count = df_inst_count.merge(df_instituicoes[["ID_INSTITUICAO", "NOME"]], on="ID_INSTITUICAO", how="left")
-        df_inst_count = df_inst_count.sort_values("QTD_DOACOES", ascending=False).head(10)
-
-        fig_inst = px.bar(
-            df_inst_count,
-            x="QTD_DOACOES",
-            y="NOME",
-            orientation="h",
-            template="plotly_dark",
+# ---------------------------------------------------------
+def impacto(nome):
+    # do rollup de impacto (histograma por pontuação): não passa pelas linhas
+    # de IMPACTO, e o tamanho do resultado não depende do número de doações
+    with execucao.etapa(f"impacto:{nome}"):
+        return cache_filtros.obter(
+            chave_visao + (nome,),
+            lambda: calcular_impacto(
+                nome,
+                estruturas["rollup_impacto"],
+                estruturas["instituicoes"],
+                data_ini,
+                data_fim,
+                status_selecionados,
+                id_inst_escolhida,
+            ),
         )
-        fig_inst.update_layout(height=450)
-        st.plotly_chart(fig_inst, use_container_width=True)
-    else:
-        st.info("Sem doações.")
-
-with c2:
-    st.markdown("#### Itens mais doados")
-    if not df_doacao_itens_filtrado.empty:
-        df_items_count = df_doacao_itens_filtrado.groupby("ITEM")["QTDE"].sum().reset_index()
-        df_items_count = df_items_count.sort_values("QTDE", ascending=False).head(10)
-
-        fig_itens = px.bar(
-            df_items_count,
-            x="QTDE",
-            y="ITEM",
-            orientation="h",
-            template="plotly_dark",
+
+
+@st.fragment
+@medida("secao:instituicoes_itens_impacto")
+def secao_instituicoes_itens_impacto():
+    from graficos import figura_impacto, figura_impacto_semanas, figura_top_instituicoes, figura_top_itens
+
+    st.subheader("🏢 Instituições, 🎁 Itens e 🌱 Impacto")
+
+    c1, c2, c3 = st.columns(3)
+
+    with c1:
+        st.markdown("#### Top Instituições por Doações")
+        df_inst_count = agregado("top_instituicoes")
+        if not df_inst_count.empty:
+            grafico("top_instituicoes", lambda: figura_top_instituicoes(df_inst_count))
+        else:
+            st.info("Sem doações.")
+
+    with c2:
+        st.markdown("#### Itens mais doados")
+        df_items_count = agregado("top_itens")
+        if not df_items_count.empty:
+            grafico("top_itens", lambda: figura_top_itens(df_items_count))
+        else:
+            st.info("Nenhum item encontrado.")
+
+    with c3:
+        st.markdown("#### Distribuição da Pontuação de Impacto")
+        df_hist = impacto("impacto_distribuicao")
+        resumo = impacto("impacto_resumo")
+        if not df_hist.empty:
+            grafico("impacto", lambda: figura_impacto(df_hist))
+            st.caption(
+                f"{resumo['qtd']} avaliações · média: {resumo['media']:.1f} · "
+                + " · ".join(f"p{int(q * 100)}: {resumo[f'p{int(q * 100)}']:.1f}" for q in QUANTIS)
+            )
+        else:
+            st.info("Sem impacto registrado.")
+
+    if resumo:
+        st.markdown("#### 🌱 Impacto por instituição e por semana")
+        c4, c5 = st.columns(2)
+        with c4:
+            st.dataframe(
+                impacto("impacto_instituicoes").drop(columns="ID_INSTITUICAO"),
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    "QTD": st.column_config.NumberColumn("Avaliações"),
+                    "MEDIA": st.column_config.NumberColumn("Média", format="%.1f"),
+                    **{c: st.column_config.NumberColumn(c, format="%.1f") for c in ("P50", "P90", "P99")},
+                },
+            )
+        with c5:
+            df_semanas = impacto("impacto_semanas")
+            grafico("impacto_semanas", lambda: figura_impacto_semanas(df_semanas))
+
+
+# ---------------------------------------------------------
+# CICLO DE VIDA
+# ---------------------------------------------------------
+def formatar_horas(horas):
+    return f"{horas:.1f} h" if horas < 48 else f"{horas / 24:.1f} dias"
+
+
+def ciclo(nome, calcular):
+    with execucao.etapa(f"ciclo:{nome}"):
+        return cache_filtros.obter(chave_visao + (nome,), calcular)
+
+
+def encaminhamento(n=3):
+    # itens registrados no período x índice de categorias das instituições
+    datas = df_itens["DT_REGISTRO"]
+    novos = df_itens[(datas >= pd.Timestamp(data_ini)) & (datas < pd.Timestamp(data_fim) + pd.Timedelta(days=1))]
+    df = corresponder(
+        estruturas["categorias"], novos, pendentes_atuais(estruturas["cubo_fila"]), estruturas["instituicoes"], n=n
+    )
+    if id_inst_escolhida is not None:
+        df = df[df["ID_INSTITUICAO"] == id_inst_escolhida]
+    titulos = novos[["ID_ITEM", "TITULO"]].drop_duplicates("ID_ITEM")
+    return df.merge(titulos, on="ID_ITEM", how="left")[["ID_ITEM", "TITULO", "ORDEM", "ID_INSTITUICAO", "NOME", "PENDENTES"]]
+
+
+@st.fragment
+@medida("secao:ciclo_vida")
+def secao_ciclo_vida():
+    from graficos import figura_espera, figura_fila_diaria
+
+    st.subheader("⏳ Ciclo de Vida das Doações")
+    st.caption(
+        "Pendentes: solicitadas e ainda não confirmadas (ABERTA/EM_ANDAMENTO), "
+        "sem o filtro de status. Tempo até a confirmação: doações filtradas."
+    )
+
+    df_fila = ciclo("fila_diaria", lambda: fila_diaria(estruturas["cubo_fila"], data_ini, data_fim, id_inst_escolhida))
+    df_espera, quantis_espera = ciclo("espera", lambda: distribuicao_espera(visoes_filtradas()[0]))
+
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Pendentes ao fim do período", int(df_fila["PENDENTES"].iloc[-1]) if not df_fila.empty else 0)
+    if quantis_espera:
+        c2.metric("Confirmação (mediana)", formatar_horas(quantis_espera[0.5]))
+        c3.metric("Confirmação (p90)", formatar_horas(quantis_espera[0.9]))
+
+    c4, c5 = st.columns(2)
+    with c4:
+        st.markdown("#### Doações pendentes por dia")
+        grafico("fila_diaria", lambda: figura_fila_diaria(df_fila))
+    with c5:
+        st.markdown("#### Tempo até a confirmação")
+        if quantis_espera:
+            grafico("espera", lambda: figura_espera(df_espera))
+        else:
+            st.info("Nenhuma doação confirmada no filtro.")
+
+    st.markdown("#### Pendentes por instituição e idade")
+    # com as tabelas filtradas no SQL, as pendentes vêm de uma consulta sem filtros
+    doacoes_fila = estruturas.get("doacoes_fila", df_doacoes)
+    df_pendentes = ciclo(
+        "pendentes",
+        lambda: pendentes_por_instituicao(
+            doacoes_fila, estruturas["instituicoes"], referencia_periodo(data_fim), id_inst_escolhida
+        ),
+    )
+    if not df_pendentes.empty:
+        st.dataframe(
+            df_pendentes.drop(columns="ID_INSTITUICAO"),
+            hide_index=True,
+            use_container_width=True,
+            column_config={"IDADE_MEDIA_DIAS": st.column_config.NumberColumn("Idade média (dias)", format="%.1f")},
         )
-        fig_itens.update_layout(height=450)
-        st.plotly_chart(fig_itens, use_container_width=True)
     else:
-        st.info("Nenhum item encontrado.")
-
-with c3:
-    st.markdown("#### Pontuação de Impacto por Doação")
-    if not df_impacto_filtrado.empty:
-        df_imp = df_impacto_filtrado.copy()
-        df_imp = df_imp.sort_values("ID_DOACAO")
-
-        fig_imp = px.bar(
-            df_imp,
-            x="ID_DOACAO",
-            y="PONTUACAO",
-            template="plotly_dark",
+        st.info("Nenhuma doação pendente.")
+
+    st.markdown("#### Encaminhamento dos itens registrados no período")
+    st.caption(
+        "Instituições que aceitam a categoria de cada item (CATEGORIAS_ACEITAS), "
+        "da menor para a maior fila de doações pendentes hoje."
+    )
+    df_encaminhamento = ciclo("encaminhamento", encaminhamento)
+    if not df_encaminhamento.empty:
+        st.dataframe(
+            df_encaminhamento.drop(columns="ID_INSTITUICAO"),
+            hide_index=True,
+            use_container_width=True,
+            column_config={"ORDEM": st.column_config.NumberColumn("Opção"), "PENDENTES": "Pendentes hoje"},
         )
-        fig_imp.update_layout(height=450)
-        st.plotly_chart(fig_imp, use_container_width=True)
     else:
-        st.info("Sem impacto registrado.")
+        st.info("Nenhum item do período corresponde às categorias aceitas pelas instituições.")
+
+    st.markdown("#### Coortes semanais (semana da solicitação)")
+    df_coortes = ciclo("coortes", lambda: coortes_semanais(visoes_filtradas()[0]))
+    st.dataframe(
+        df_coortes,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "SEMANA": st.column_config.DateColumn("Semana"),
+            "TAXA_CONFIRMACAO": st.column_config.NumberColumn("Confirmadas (%)", format="%.1f"),
+            **{c: st.column_config.NumberColumn(c, format="%.1f") for c in df_coortes.columns if c.endswith("_HORAS")},
+        },
+    )
 
-st.markdown("---")
 
-# =========================================================
+# ---------------------------------------------------------
 # HEATMAP
-# =========================================================
-st.subheader("🔥 Heatmap – Horários de Pico de Doações")
-
-if not df_doacoes_filtrado.empty:
-    df_heat = df_doacoes_filtrado.copy()
-    df_heat = df_heat.dropna(subset=["DT_SOLICITACAO"])
-    df_heat["HORA"] = df_heat["DT_SOLICITACAO"].dt.hour
-    df_heat["DIA_SEMANA_IDX"] = df_heat["DT_SOLICITACAO"].dt.dayofweek
-
-    mapa_dias = {
-        0: "Segunda",
-        1: "Terça",
-        2: "Quarta",
-        3: "Quinta",
-        4: "Sexta",
-        5: "Sábado",
-        6: "Domingo",
-    }
+# ---------------------------------------------------------
+GRADES_HEATMAP = {
+    "Dia da semana × hora": ("heatmap", "Hora", "Dia da semana"),
+    "Instituição × semana": ("instituicao_semana", "Semana", "Instituição"),
+}
 
-    df_heat["DIA_SEMANA"] = df_heat["DIA_SEMANA_IDX"].map(mapa_dias)
-
-    custom_colorscale = [
-        [0.0, '#0a0a0a'],
-        [0.2, '#1a1a2e'],
-        [0.4, '#16213e'],
-        [0.6, '#0f3460'],
-        [0.8, '#1e5f8e'],
-        [1.0, '#4a9eda']
-    ]
-
-    fig_heat = px.density_heatmap(
-        df_heat,
-        x="HORA",
-        y="DIA_SEMANA",
-        nbinsx=24,
-        template="plotly_dark",
-        color_continuous_scale=custom_colorscale,
-    )
-    fig_heat.update_layout(height=500)
-    st.plotly_chart(fig_heat, use_container_width=True)
-else:
-    st.info("Sem dados para o heatmap.")
 
-st.markdown("---")
+@st.fragment
+@medida("secao:heatmap")
+def secao_heatmap():
+    from graficos import figura_heatmap
 
-# =========================================================
-# DADOS DETALHADOS
-# =========================================================
-st.subheader("📑 Dados Detalhados")
+    st.subheader("🔥 Heatmap – Horários de Pico de Doações")
 
-tabs = st.tabs(["Usuários", "Instituições", "Itens", "Doações", "Itens das Doações", "Impacto"])
+    escolha = st.radio("Grade", list(GRADES_HEATMAP), horizontal=True, key="grade_heatmap")
+    nome, rotulo_x, rotulo_y = GRADES_HEATMAP[escolha]
 
-with tabs[0]:
-    st.markdown("### 👤 Usuários")
-    st.dataframe(df_usuarios, use_container_width=True, hide_index=True)
+    # matriz já agregada (tamanho fixo pela grade, não pelo número de doações)
+    df_heat = agregado(nome)
+    if df_heat.to_numpy().any():
+        grafico(nome, lambda: figura_heatmap(df_heat, rotulo_x, rotulo_y))
+    else:
+        st.info("Sem dados para o heatmap.")
 
-with tabs[1]:
-    st.markdown("### 🏢 Instituições")
-    st.dataframe(df_instituicoes, use_container_width=True, hide_index=True)
 
-with tabs[2]:
-    st.markdown("### 🎁 Itens")
-    st.dataframe(df_itens, use_container_width=True, hide_index=True)
+# ---------------------------------------------------------
+# DADOS DETALHADOS
+# ---------------------------------------------------------
+TAMANHOS_PAGINA = [25, 50, 100, 500]
 
-with tabs[3]:
-    st.markdown("### 📦 Doações (filtradas)")
-    st.dataframe(df_doacoes_filtrado, use_container_width=True, hide_index=True)
 
-with tabs[4]:
-    st.markdown("### 🎁 Itens das Doações (filtradas)")
-    st.dataframe(df_doacao_itens_filtrado, use_container_width=True, hide_index=True)
+def tabela_paginada(nome, df, versao):
+    # Só a página atual vai para o browser. A ordem de cada coluna e a máscara
+    # da última busca de cada tabela ficam em cache pela versão da tabela; o
+    # cache é limitado em bytes (MAX_MB_PAGINAS).
+    colunas = list(df.columns)
+    chave_pagina = f"{nome}_pagina"
 
-with tabs[5]:
-    st.markdown("### 🌱 Impacto (filtrado)")
-    st.dataframe(df_impacto_filtrado, use_container_width=True, hide_index=True)
+    def voltar_para_primeira():
+        st.session_state[chave_pagina] = 1
 
-st.markdown("---")
-st.caption("Dashboard Helplink - FIAP 2025")
+    c_busca, c_ordem, c_direcao, c_tamanho = st.columns([3, 2, 1, 1])
+    busca = c_busca.text_input("Buscar", key=f"{nome}_busca", on_change=voltar_para_primeira)
+    ordenar_por = c_ordem.selectbox(
+        "Ordenar por", ["(padrão)"] + colunas, key=f"{nome}_ordenar", on_change=voltar_para_primeira
+    )
+    direcao = c_direcao.selectbox("Ordem", ["↑", "↓"], key=f"{nome}_direcao", on_change=voltar_para_primeira)
+    tamanho = c_tamanho.selectbox("Linhas", TAMANHOS_PAGINA, index=1, key=f"{nome}_tamanho")
+    visiveis = st.multiselect("Colunas", colunas, default=colunas, key=f"{nome}_colunas")
+
+    with execucao.etapa(f"tabela:{nome}"):
+        ordem = None
+        if ordenar_por != "(padrão)":
+            ascendente = direcao == "↑"
+            ordem = cache_paginas.obter(
+                versao + (nome, "ordem", ordenar_por, ascendente),
+                lambda: ordem_coluna(df[ordenar_por], ascendente),
+            )
+        # uma máscara por tabela: uma busca nova substitui a anterior
+        termo = busca.strip().lower()
+        mascara = None
+        if termo:
+            chave_busca = versao + (nome, "busca")
+            encontrado, guardada = cache_paginas.consultar(chave_busca)
+            if encontrado and guardada[0] == termo:
+                mascara = guardada[1]
+            else:
+                mascara = mascara_busca(df, busca)
+                cache_paginas.guardar(chave_busca, (termo, mascara))
+
+        total = len(df) if mascara is None else int(mascara.sum())
+        n_paginas = max(1, -(-total // tamanho))
+        if st.session_state.get(chave_pagina, 1) > n_paginas:
+            st.session_state[chave_pagina] = n_paginas
+        pagina = st.number_input("Página", min_value=1, max_value=n_paginas, step=1, key=chave_pagina)
+
+        linhas, total = paginar(df, pagina, tamanho, ordem, mascara, visiveis)
+        st.dataframe(linhas, use_container_width=True, hide_index=True)
+        st.caption(f"{total:,} linhas · página {pagina} de {n_paginas}".replace(",", "."))
+
+
+@st.fragment
+@medida("secao:dados_detalhados")
+def secao_dados_detalhados():
+    st.subheader("📑 Dados Detalhados")
+
+    # radio em vez de st.tabs: abas renderizam todas as tabelas a cada rerun
+    aba = st.radio(
+        "Tabela",
+        ["Usuários", "Instituições", "Itens", "Doações", "Itens das Doações", "Impacto"],
+        horizontal=True,
+        label_visibility="collapsed",
+        key="aba_dados",
+    )
 
-# =========================================================
-# IA
-# =========================================================
-import requests
+    if aba == "Usuários":
+        st.markdown("### 👤 Usuários")
+        tabela_paginada("usuarios", df_usuarios, (versao_dados,))
 
-HF_TOKEN = st.secrets["HF_TOKEN"]
-HF_MODEL = "google/vit-base-patch16-224"
-API_URL = f"https://router.huggingface.co/hf-inference/models/{HF_MODEL}"
+    elif aba == "Instituições":
+        st.markdown("### 🏢 Instituições")
+        tabela_paginada("instituicoes", df_instituicoes, (versao_dados,))
 
-def classify_condition(image_bytes: bytes, mime_type: str = "image/png"):
-    if not mime_type:
-        mime_type = "image/png"
+    elif aba == "Itens":
+        st.markdown("### 🎁 Itens")
+        tabela_paginada("itens", df_itens, (versao_dados,))
+
+    elif aba == "Doações":
+        st.markdown("### 📦 Doações (filtradas)")
+        tabela_paginada("doacoes", visoes_filtradas()[0], chave_visao)
+
+    elif aba == "Itens das Doações":
+        st.markdown("### 🎁 Itens das Doações (filtradas)")
+        tabela_paginada("doacao_itens", visoes_filtradas()[1], chave_visao)
+
+    else:
+        st.markdown("### 🌱 Impacto (filtrado)")
+        tabela_paginada("impacto", visoes_filtradas()[2], chave_visao)
 
-    headers = {
-        "Authorization": f"Bearer {HF_TOKEN}",
-        "Content-Type": mime_type,
-    }
 
+# ---------------------------------------------------------
+# IA
+# ---------------------------------------------------------
+def segredo(nome):
+    # st.secrets sem arquivo de segredos levanta FileNotFoundError
     try:
-        response = requests.post(API_URL, headers=headers, data=image_bytes)
+        return st.secrets.get(nome) or os.environ.get(nome)
+    except FileNotFoundError:
+        return os.environ.get(nome)
 
-        if response.status_code != 200:
-            return None, f"Erro da IA: {response.text}"
 
-        result = response.json()
+# HELPLINK_IA_BACKEND escolhe o backend: "hf", "local" ou "auto" (padrão:
+# modelo local se HELPLINK_IA_MODELO apontar para um .onnx, senão a API).
+# HELPLINK_IA_URL troca o endpoint, ex.: o servidor simulado de classificacao.py
+IA_BACKEND = os.environ.get("HELPLINK_IA_BACKEND", "auto")
+IA_MODELO = os.environ.get("HELPLINK_IA_MODELO")
+IA_URL = os.environ.get("HELPLINK_IA_URL")
 
-        if not isinstance(result, list) or not result:
-            return None, f"Resposta inesperada da IA: {result}"
 
-        best = max(result, key=lambda x: x.get("score", 0))
-        score = float(best.get("score", 0.0))
+@st.cache_resource(show_spinner="Carregando o classificador...")
+def classificador_ia():
+    # compartilhado entre as sessões: conexões/modelo e cache de resultados
+    from classificacao import API_URL, criar_classificador
 
-        if score >= 0.75:
-            cond = "BOM"
-        elif score >= 0.45:
-            cond = "REGULAR"
-        else:
-            cond = "RUIM"
+    return criar_classificador(
+        IA_BACKEND, token=segredo("HF_TOKEN"), url=IA_URL or API_URL, caminho_modelo=IA_MODELO
+    )
 
-        return cond, score
 
-    except Exception as e:
-        return None, f"Erro ao chamar IA: {str(e)}"
+@st.fragment
+@medida("secao:ia")
+def secao_ia():
+    from classificacao import ErroClassificador
 
-st.markdown("## 🤖 IA – Análise do Estado de Conservação de Itens")
-st.caption("Envie uma imagem e a IA irá classificar automaticamente.")
+    st.markdown("## 🤖 IA – Análise do Estado de Conservação de Itens")
+    st.caption("Envie uma ou mais imagens e a IA irá classificar automaticamente.")
 
-uploaded = st.file_uploader("Envie uma imagem para análise", type=["jpg", "jpeg", "png"])
+    try:
+        classificador = classificador_ia()
+    except ErroClassificador as e:
+        classificador = None
+        st.error(str(e))
+
+    if classificador is None:
+        st.info("IA indisponível: configure o segredo HF_TOKEN ou um modelo local em HELPLINK_IA_MODELO.")
+        return
+
+    uploads = st.file_uploader(
+        "Envie imagens para análise",
+        type=["jpg", "jpeg", "png"],
+        accept_multiple_files=True,
+    )
+    if not uploads:
+        return
+
+    with st.spinner(f"🔍 Analisando {len(uploads)} imagem(ns) com IA..."):
+        with execucao.etapa("ia:classificar"):
+            resultados = classificador.classificar_lote([(f.getvalue(), f.type) for f in uploads])
+
+    colunas_ia = st.columns(min(len(uploads), 3))
+    for i, (uploaded, (condicao, resultado)) in enumerate(zip(uploads, resultados)):
+        with colunas_ia[i % len(colunas_ia)]:
+            st.image(uploaded, caption=uploaded.name, use_container_width=True)
+
+            if condicao is None:
+                st.error(resultado)
+            elif condicao == "BOM":
+                st.success(f"🟢 Estado de Conservação: **BOM** (confiança {resultado:.4f})")
+            elif condicao == "REGULAR":
+                st.warning(f"🟡 Estado de Conservação: **REGULAR** (confiança {resultado:.4f})")
+            else:
+                st.error(f"🔴 Estado de Conservação: **RUIM** (confiança {resultado:.4f})")
+
+    st.caption(
+        f"{classificador.descricao} · cache: {classificador.cache.acertos} acertos / "
+        f"{classificador.cache.falhas} falhas · {classificador.chamadas} chamadas de inferência"
+    )
 
-if uploaded:
-    st.image(uploaded, use_container_width=True)
-    st.info("🔍 Analisando imagem com IA...")
 
-    img_bytes = uploaded.getvalue()
-    mime_type = uploaded.type
+SECOES = {
+    "📊 Visão Geral": secao_visao_geral,
+    "📈 Evolução": secao_evolucao,
+    "🏢 Instituições, Itens e Impacto": secao_instituicoes_itens_impacto,
+    "⏳ Ciclo de Vida": secao_ciclo_vida,
+    "🔥 Heatmap": secao_heatmap,
+    "📑 Dados Detalhados": secao_dados_detalhados,
+    "🤖 IA": secao_ia,
+}
 
-    condicao, resultado = classify_condition(img_bytes, mime_type)
+secao = st.radio("Seção", list(SECOES), horizontal=True, label_visibility="collapsed", key="secao")
+SECOES[secao]()
 
-    if condicao is None:
-        st.error(resultado)
-    else:
-        if condicao == "BOM":
-            st.success(f"🟢 Estado de Conservação: **BOM** (confiança {resultado:.4f})")
-        elif condicao == "REGULAR":
-            st.warning(f"🟡 Estado de Conservação: **REGULAR** (confiança {resultado:.4f})")
-        else:
-            st.error(f"🔴 Estado de Conservação: **RUIM** (confiança {resultado:.4f})")
+st.markdown("---")
+st.caption("Dashboard Helplink - FIAP 2025")
+
+execucao.finalizar()
+
+if painel_desempenho is not None:
+    with painel_desempenho:
+        st.caption(f"Esta execução: {execucao.total_ms():.0f} ms")
+        df_etapas = pd.DataFrame(execucao.etapas).sort_values("inicio_ms", ignore_index=True)
+        df_etapas["ETAPA"] = ["  " * nivel + nome for nivel, nome in zip(df_etapas["nivel"], df_etapas["nome"])]
+        colunas_etapas = ["ETAPA", "duracao_ms"] + (["pico_mb"] if "pico_mb" in df_etapas else [])
+        st.dataframe(df_etapas[colunas_etapas].round(2), use_container_width=True, hide_index=True)
+
+        st.caption(f"Tendência das últimas {len(perfil_dashboard().historico)} execuções")
+        st.dataframe(perfil_dashboard().tendencia().round(2), use_container_width=True, hide_index=True)
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+from agregacoes import fatiar, grade, inicio_semana, numero_semana
+from resolucao import QUANTIS
+
+# =========================================================
+# ANÁLISE DA PONTUAÇÃO DE IMPACTO
+# =========================================================
+# Respondida pelo rollup de impacto (agregacoes.construir_rollup_impacto),
+# que guarda, por dia/status/instituição da doação, quantas linhas de
+# IMPACTO tiveram cada pontuação. O histograma com uma posição por pontuação
+# é um resumo exato e somável: juntar grupos ou aplicar linhas novas da
+# ingestão é somar contagens, e quantidade, média e quantis (p50/p90/p99)
+# saem do histograma, sem voltar às linhas, com o mesmo valor de np.quantile
+# sobre as pontuações.
+#
+# As posições do histograma são as pontuações distintas da fatia consultada
+# (até 256 enquanto PONTUACAO for int8; o esquema alarga a coluna para int16
+# se vier um valor fora dessa faixa).
+#
+# O rollup é atualizado pela ingestão incremental junto com os outros, então
+# as consultas abaixo valem para qualquer filtro da sidebar.
+
+IMPACTOS = ["impacto_distribuicao", "impacto_resumo", "impacto_instituicoes", "impacto_semanas"]
+
+
+def histogramas(fatia, grupos=None, n_grupos=1):
+    # matriz n_grupos x pontuações distintas com as contagens de cada uma, e
+    # as pontuações de cada coluna em ordem crescente
+    if grupos is None:
+        grupos = np.zeros(len(fatia), dtype=np.int64)
+    validas = fatia["PONTUACAO"].notna().to_numpy()
+    pontuacoes, posicoes = np.unique(fatia["PONTUACAO"][validas].to_numpy().astype(np.int64), return_inverse=True)
+    if len(pontuacoes) == 0:
+        pontuacoes = np.zeros(1, dtype=np.int64)
+    z = grade(np.asarray(grupos)[validas], n_grupos, posicoes, len(pontuacoes), fatia["QTD"].to_numpy()[validas])
+    return z, pontuacoes
+
+
+def quantis_histograma(z, pontuacoes, qs=QUANTIS):
+    # mesmo método de np.quantile (interpolação linear entre as posições
+    # vizinhas da amostra ordenada), lendo as posições do acumulado
+    acumulado = np.cumsum(z, axis=1)
+    n = acumulado[:, -1]
+    ultima = len(pontuacoes) - 1  # grupos vazios leem qualquer posição válida e viram NaN
+    resultado = {}
+    for q in qs:
+        h = (np.maximum(n, 1) - 1) * q
+        k = np.floor(h).astype(np.int64)
+        # k-ésima menor pontuação: primeira posição com acumulado > k
+        baixo = pontuacoes[np.minimum((acumulado <= k[:, None]).sum(axis=1), ultima)]
+        alto = pontuacoes[np.minimum((acumulado <= np.minimum(k + 1, np.maximum(n - 1, 0))[:, None]).sum(axis=1), ultima)]
+        resultado[q] = np.where(n > 0, baixo + (h - k) * (alto - baixo), np.nan)
+    return resultado
+
+
+def resumir(z, pontuacoes):
+    n = z.sum(axis=1)
+    soma = z @ pontuacoes
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = np.where(n > 0, soma / np.maximum(n, 1), np.nan)
+    colunas = {"QTD": n, "MEDIA": media}
+    for q, valores in quantis_histograma(z, pontuacoes).items():
+        colunas[f"P{int(q * 100)}"] = valores
+    return pd.DataFrame(colunas)
+
+
+# ---------------------------------------------------------
+# CONSULTAS
+# ---------------------------------------------------------
+def distribuicao(fatia):
+    # barras de uma pontuação cada, do menor ao maior valor presente
+    z, pontuacoes = histogramas(fatia)
+    z = z[0]
+    if not z.any():
+        return pd.DataFrame({"INICIO": [], "FIM": [], "QTD": []})
+    inicio = np.arange(pontuacoes[0], pontuacoes[-1] + 1)
+    qtd = np.zeros(len(inicio), dtype=np.int64)
+    qtd[pontuacoes - pontuacoes[0]] = z
+    return pd.DataFrame({"INICIO": inicio, "FIM": inicio + 1, "QTD": qtd})
+
+
+def resumo(fatia):
+    # {"qtd", "media", "p50", "p90", "p99"}; vazio sem impacto no filtro
+    linha = resumir(*histogramas(fatia)).iloc[0]
+    if linha["QTD"] == 0:
+        return {}
+    return {coluna.lower(): (int(v) if coluna == "QTD" else float(v)) for coluna, v in linha.items()}
+
+
+def por_instituicao(fatia, indice_instituicoes, n=15):
+    # as n instituições com mais avaliações de impacto
+    ids, codigos = np.unique(fatia["ID_INSTITUICAO"].to_numpy(), return_inverse=True)
+    df = resumir(*histogramas(fatia, codigos, len(ids)))
+    df.insert(0, "ID_INSTITUICAO", ids)
+    df = df.sort_values("QTD", ascending=False, kind="stable").head(n)
+    df.insert(1, "NOME", indice_instituicoes.nomes_de(df["ID_INSTITUICAO"].to_numpy()))
+    return df.reset_index(drop=True)
+
+
+def por_semana(fatia):
+    # uma linha por semana (segunda a domingo), inclusive as sem avaliação
+    if fatia.empty:
+        return pd.DataFrame(columns=["SEMANA", "QTD", "MEDIA"] + [f"P{int(q * 100)}" for q in QUANTIS])
+    semanas = numero_semana(fatia["DATA"])
+    primeira = semanas.min()
+    n_semanas = int(semanas.max() - primeira) + 1
+    df = resumir(*histogramas(fatia, semanas - primeira, n_semanas))
+    df.insert(0, "SEMANA", inicio_semana(primeira + np.arange(n_semanas)))
+    return df
+
+
+def calcular_impacto(nome, rollup_impacto, indice_instituicoes, data_ini, data_fim, status=None, id_instituicao=None):
+    fatia = fatiar(rollup_impacto, data_ini, data_fim, status, id_instituicao)
+    if nome == "impacto_distribuicao":
+        return distribuicao(fatia)
+    if nome == "impacto_resumo":
+        return resumo(fatia)
+    if nome == "impacto_instituicoes":
+        return por_instituicao(fatia, indice_instituicoes)
+    return por_semana(fatia)
@@ -0,0 +1,137 @@
+import numpy as np
+
+# =========================================================
+# ÍNDICES DE JUNÇÃO
+# =========================================================
+# Construídos uma vez por carga de dados. Ligam cada linha de uma tabela filha
+# (DOACAO_ITEM, IMPACTO) à posição da doação correspondente em DOACAO, então
+# filtrar as filhas a partir das doações filtradas é uma máscara booleana ou
+# um gather por offsets, sem passar por listas Python nem por isin.
+
+# Abaixo desta fração de doações selecionadas o gather por offsets sai mais
+# barato que varrer a tabela filha inteira com uma máscara.
+FRACAO_GATHER = 0.05
+
+
+class IndiceIds:
+    # ids ordenados + posição original, para localizar ids por searchsorted
+    def __init__(self, ids):
+        ids = np.asarray(ids)
+        self.n = len(ids)
+        self.ordem = np.argsort(ids, kind="stable")
+        self.ids_ordenados = ids[self.ordem]
+
+    def posicoes(self, ids_busca):
+        ids_busca = np.asarray(ids_busca)
+        if self.n == 0:
+            return np.full(len(ids_busca), -1, dtype=np.int64)
+        k = np.minimum(np.searchsorted(self.ids_ordenados, ids_busca), self.n - 1)
+        return np.where(self.ids_ordenados[k] == ids_busca, self.ordem[k], -1)
+
+    def anexar(self, ids_novos):
+        # novos ids entram nas posições n, n+1, ... sem reordenar tudo
+        ids_novos = np.asarray(ids_novos)
+        ordem_novos = np.argsort(ids_novos, kind="stable")
+        onde = np.searchsorted(self.ids_ordenados, ids_novos[ordem_novos], side="right")
+        self.ids_ordenados = np.insert(self.ids_ordenados, onde, ids_novos[ordem_novos])
+        self.ordem = np.insert(self.ordem, onde, self.n + ordem_novos)
+        self.n += len(ids_novos)
+
+
+# Posições inicio[i] .. inicio[i] + contagem[i] - 1 de cada grupo, concatenadas
+# (gather das fatias de um CSR).
+def expandir(inicio, contagem):
+    total = int(contagem.sum())
+    return np.repeat(inicio - np.cumsum(contagem) + contagem, contagem) + np.arange(total)
+
+
+# Posição de cada id de ids_busca em ids_referencia (-1 se não existir).
+def posicoes(ids_referencia, ids_busca):
+    return IndiceIds(ids_referencia).posicoes(ids_busca)
+
+
+class IndiceJuncao:
+    def __init__(self, ids_pai, ids_filho):
+        self.n_pai = len(ids_pai)
+        self.n_filho = len(ids_filho)
+        self.pai_do_filho = posicoes(ids_pai, ids_filho)
+
+        # CSR: linhas filhas agrupadas pela posição do pai (órfãos ficam fora)
+        self.ordem = np.argsort(self.pai_do_filho, kind="stable")
+        self.offsets = np.searchsorted(self.pai_do_filho[self.ordem], np.arange(self.n_pai + 1))
+
+    def linhas(self, posicoes_pai):
+        posicoes_pai = np.asarray(posicoes_pai, dtype=np.int64)
+        if len(posicoes_pai) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        if len(posicoes_pai) > FRACAO_GATHER * self.n_pai:
+            selecionados = np.zeros(self.n_pai + 1, dtype=bool)
+            selecionados[posicoes_pai] = True
+            # pai_do_filho == -1 aponta para a sentinela final, sempre False
+            return np.flatnonzero(selecionados[self.pai_do_filho])
+
+        inicio = self.offsets[posicoes_pai]
+        linhas = self.ordem[expandir(inicio, self.offsets[posicoes_pai + 1] - inicio)]
+        linhas.sort()
+        return linhas
+
+    def anexar(self, n_pai, pai_dos_novos):
+        # Pais novos entram no fim da tabela pai e filhos novos no fim da
+        # tabela filha: cada filho novo é inserido no fim do grupo do seu pai
+        # no CSR, sem ordenar de novo as linhas antigas.
+        pai_dos_novos = np.asarray(pai_dos_novos, dtype=np.int64)
+        offsets = np.concatenate([self.offsets, np.full(n_pai - self.n_pai, self.offsets[-1])])
+
+        ordem_novos = np.argsort(pai_dos_novos, kind="stable")
+        pais_ordenados = pai_dos_novos[ordem_novos]
+        self.ordem = np.insert(self.ordem, offsets[pais_ordenados + 1], self.n_filho + ordem_novos)
+
+        # offsets[k] conta os filhos com pai < k, inclusive os órfãos (-1)
+        self.offsets = offsets + np.cumsum(np.bincount(pai_dos_novos + 1, minlength=n_pai + 1))
+        self.pai_do_filho = np.concatenate([self.pai_do_filho, pai_dos_novos])
+        self.n_pai = n_pai
+        self.n_filho += len(pai_dos_novos)
+
+    def orfaos(self):
+        # linhas filhas sem pai (ficam no início do CSR)
+        return self.ordem[:self.offsets[0]]
+
+    def religar(self, filhos, pais):
+        # Órfãos cujo pai chegou depois deles saem do início do CSR e entram
+        # no fim do grupo do pai.
+        filhos = np.asarray(filhos, dtype=np.int64)
+        pais = np.asarray(pais, dtype=np.int64)
+        self.pai_do_filho = self.pai_do_filho.copy()
+        self.pai_do_filho[filhos] = pais
+
+        orfaos = self.orfaos()
+        continuam = orfaos[self.pai_do_filho[orfaos] < 0]
+        offsets = self.offsets - self.offsets[0]
+        ordem_religados = np.argsort(pais, kind="stable")
+        ligados = np.insert(
+            self.ordem[self.offsets[0]:], offsets[pais[ordem_religados] + 1], filhos[ordem_religados]
+        )
+        self.ordem = np.concatenate([continuam, ligados])
+        self.offsets = len(continuam) + offsets + np.cumsum(np.bincount(pais + 1, minlength=self.n_pai + 1))
+
+
+class IndiceInstituicoes:
+    def __init__(self, df_instituicoes):
+        ids = df_instituicoes["ID_INSTITUICAO"].to_numpy()
+        ordem = np.argsort(ids, kind="stable")
+        self.ids = ids[ordem]
+        self.nomes = df_instituicoes["NOME"].to_numpy(dtype=object)[ordem]
+
+    def nomes_de(self, ids):
+        pos = posicoes(self.ids, ids)
+        return np.where(pos >= 0, self.nomes[np.maximum(pos, 0)], None)
+
+
+def construir_indices(df_instituicoes, df_doacoes, df_impacto, df_doacao_itens):
+    ids_doacoes = df_doacoes["ID_DOACAO"].to_numpy()
+    return {
+        "juncao_itens": IndiceJuncao(ids_doacoes, df_doacao_itens["ID_DOACAO"].to_numpy()),
+        "juncao_impacto": IndiceJuncao(ids_doacoes, df_impacto["ID_DOACAO"].to_numpy()),
+        "instituicoes": IndiceInstituicoes(df_instituicoes),
+    }
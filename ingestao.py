@@ -0,0 +1,474 @@
+import copy
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+import banco_dados
+import snapshot
+from agregacoes import (
+    CHAVES_ROLLUP,
+    CHAVES_ROLLUP_IMPACTO,
+    CHAVES_ROLLUP_ITENS,
+    atualizar_rollup,
+    construir_rollup,
+    construir_rollup_impacto,
+    construir_rollup_itens,
+)
+from ciclo_vida import CHAVES_CUBO_FILA, construir_cubo_fila
+from esquema import COLUNAS, TABELAS, aplicar_esquema, relatorio_memoria, tabela_vazia
+from filtros import preparar_doacoes
+from indices import IndiceIds, IndiceInstituicoes, IndiceJuncao
+
+# =========================================================
+# INGESTÃO INCREMENTAL (TEMPO REAL)
+# =========================================================
+# Em vez de recarregar tudo quando o TTL vence, uma fonte de eventos entrega
+# só as linhas novas ou alteradas desde a última leitura. Elas são aplicadas
+# como upsert pela chave primária nas tabelas em memória e os rollups são
+# corrigidos pelo delta das doações afetadas (contribuição nova menos a
+# antiga), sem reagrupar o histórico inteiro.
+#
+# O caminho rápido vale para o caso comum: doações novas chegando com
+# DT_SOLICITACAO depois da última já carregada, e alterações que não mudam
+# DT_SOLICITACAO (ex.: confirmação). Fora disso, DOACAO é reordenada e as
+# estruturas são reconstruídas com a função recebida em `reconstruir`.
+
+TABELAS_INCREMENTAIS = ("DOACAO", "IMPACTO", "DOACAO_ITEM")
+
+
+# ---------------------------------------------------------
+# FONTES DE EVENTOS
+# ---------------------------------------------------------
+class FonteArquivo:
+    # Acompanha um arquivo JSON Lines, uma linha completa por evento:
+    # {"tabela": "DOACAO", "ID_DOACAO": 301, "STATUS": "ABERTA", ...}
+    # Linhas ainda sendo escritas (sem quebra de linha) ficam para a próxima
+    # leitura. Se o arquivo encolher, foi truncado: a leitura recomeça do
+    # início, o que é seguro porque os eventos são upserts.
+    #
+    # Eventos sem alguma coluna ou com valores que não convertem para o tipo
+    # da coluna são descartados e contados em `invalidas`. Posição e contagem
+    # só avançam em confirmar(), depois que o bloco lido foi aplicado: se a
+    # aplicação falhar, o mesmo bloco é lido de novo.
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.posicao = 0
+        self.invalidas = 0
+        self._proxima = 0
+        self._invalidas_bloco = 0
+
+    def ler(self):
+        try:
+            tamanho = os.path.getsize(self.caminho)
+        except OSError:
+            return {}
+        if tamanho < self.posicao:
+            self.posicao = 0
+        self._proxima = self.posicao
+        self._invalidas_bloco = 0
+        if tamanho == self.posicao:
+            return {}
+
+        with open(self.caminho, "rb") as f:
+            f.seek(self.posicao)
+            bloco = f.read(tamanho - self.posicao)
+        fim = bloco.rfind(b"\n") + 1
+        self._proxima = self.posicao + fim
+
+        registros = defaultdict(list)
+        for linha in bloco[:fim].splitlines():
+            if not linha.strip():
+                continue
+            try:
+                evento = json.loads(linha)
+                tabela = evento.pop("tabela")
+            except (ValueError, KeyError, AttributeError):
+                self._invalidas_bloco += 1
+                continue
+            # eventos são linhas completas; sem alguma coluna, o evento é descartado
+            if tabela not in COLUNAS or not set(COLUNAS[tabela]) <= evento.keys():
+                self._invalidas_bloco += 1
+                continue
+            registros[tabela].append(evento)
+
+        return {tabela: self._converter(tabela, linhas) for tabela, linhas in registros.items()}
+
+    def _converter(self, tabela, linhas):
+        try:
+            return aplicar_esquema(pd.DataFrame(linhas, columns=COLUNAS[tabela]), tabela)
+        except (ValueError, TypeError, OverflowError):
+            pass
+        # algum valor não converte: evento a evento, para descartar só os ruins
+        convertidas = []
+        for linha in linhas:
+            try:
+                convertidas.append(aplicar_esquema(pd.DataFrame([linha], columns=COLUNAS[tabela]), tabela))
+            except (ValueError, TypeError, OverflowError):
+                self._invalidas_bloco += 1
+        if not convertidas:
+            return tabela_vazia(tabela)
+        return aplicar_esquema(pd.concat(convertidas, ignore_index=True), tabela)
+
+    def confirmar(self):
+        self.posicao = self._proxima
+        self.invalidas += self._invalidas_bloco
+        self._invalidas_bloco = 0
+
+
+class FonteBanco:
+    # Consulta o banco pelas marcas d'água (ver banco_dados.carregar_novidades)
+    # e avança as marcas a cada leitura. INSTITUICAO volta inteira do banco e
+    # só é entregue quando muda.
+    #
+    # A consulta inclui o horário da marca (>=), então as linhas com esse
+    # horário voltam em toda leitura até a marca avançar; as idênticas às da
+    # leitura anterior (comparadas por hash da linha) não são entregues de
+    # novo, senão cada leitura contaria como uma atualização.
+    #
+    # Como em FonteArquivo, marcas e hashes só avançam em confirmar().
+    def __init__(self, pool, tabelas):
+        self.pool = pool
+        self.marcas = snapshot.marcas_dagua(tabelas)
+        self.instituicoes = tabelas[TABELAS.index("INSTITUICAO")]
+        self._lidas = {}
+        self._proximo = None
+
+    def ler(self):
+        novidades = dict(zip(TABELAS, banco_dados.carregar_novidades(self.pool, self.marcas)))
+
+        marcas = dict(self.marcas)
+        for chave, valor in snapshot.marcas_dagua(tuple(novidades.values())).items():
+            atual = marcas.get(chave)
+            if valor is not None and (atual is None or pd.Timestamp(valor) > pd.Timestamp(atual)):
+                marcas[chave] = valor
+
+        lidas = {}
+        for tabela, df in novidades.items():
+            if tabela == "INSTITUICAO":
+                continue
+            lidas[tabela] = pd.util.hash_pandas_object(df, index=False).to_numpy()
+            anteriores = self._lidas.get(tabela)
+            if anteriores is not None and len(df):
+                novidades[tabela] = df[~np.isin(lidas[tabela], anteriores)].reset_index(drop=True)
+
+        instituicoes = novidades["INSTITUICAO"]
+        if instituicoes.equals(self.instituicoes):
+            del novidades["INSTITUICAO"]
+        self._proximo = (marcas, lidas, instituicoes)
+        return {tabela: df for tabela, df in novidades.items() if len(df)}
+
+    def confirmar(self):
+        if self._proximo is not None:
+            self.marcas, self._lidas, self.instituicoes = self._proximo
+            self._proximo = None
+
+
+# ---------------------------------------------------------
+# UPSERT NAS TABELAS EM MEMÓRIA
+# ---------------------------------------------------------
+def _alinhar_tipos(df, novas):
+    # categorias novas entram no dicionário da coluna e inteiros que não
+    # cabem no tipo atual sobem para o tipo comum
+    colunas_df, colunas_novas = {}, {}
+    for coluna in df.columns:
+        atual = df[coluna].dtype
+        if isinstance(atual, pd.CategoricalDtype):
+            valores = novas[coluna].dropna().unique()
+            faltando = pd.Index(valores).difference(atual.categories)
+            if len(faltando):
+                colunas_df[coluna] = df[coluna].cat.add_categories(faltando)
+                atual = colunas_df[coluna].dtype
+        elif novas[coluna].dtype != atual:
+            comum = pd.concat([df[coluna].iloc[:0], novas[coluna].iloc[:0]]).dtype
+            if comum != atual:
+                colunas_df[coluna] = df[coluna].astype(comum)
+                atual = comum
+        if novas[coluna].dtype != atual:
+            colunas_novas[coluna] = novas[coluna].astype(atual)
+    return df.assign(**colunas_df), novas.assign(**colunas_novas)
+
+
+def upsert(df, novas, indice_ids, tabela):
+    # Devolve a tabela nova (a antiga não é alterada, outras sessões podem
+    # estar lendo), as posições das linhas atualizadas, as linhas inseridas
+    # (no fim) e a versão anterior das linhas atualizadas.
+    chave = COLUNAS[tabela][0]
+    novas = novas.drop_duplicates(chave, keep="last")
+    posicoes = indice_ids.posicoes(novas[chave].to_numpy())
+    existentes = posicoes >= 0
+
+    df, novas = _alinhar_tipos(df, novas)
+    inseridas = novas[~existentes]
+    anteriores = df.iloc[posicoes[existentes]]
+
+    resultado = pd.concat([df, inseridas], ignore_index=True) if len(inseridas) else df
+    if existentes.any():
+        # só as colunas com valores alterados são copiadas; as demais são
+        # compartilhadas com a tabela antiga
+        alvo = posicoes[existentes]
+        atualizadas = novas[existentes].reset_index(drop=True)
+        colunas = {}
+        for coluna in resultado.columns:
+            if resultado[coluna].iloc[alvo].reset_index(drop=True).equals(atualizadas[coluna]):
+                continue
+            serie = resultado[coluna].copy()
+            serie.iloc[alvo] = atualizadas[coluna].array
+            colunas[coluna] = serie
+        if colunas:
+            resultado = resultado.assign(**colunas)
+
+    indice_ids.anexar(inseridas[chave].to_numpy())
+    return resultado, posicoes[existentes], inseridas, anteriores
+
+
+def _contribuicao(tabelas, estruturas, indice_doacoes, ids_doacoes):
+    # parcela dos rollups (e do cubo da fila) que vem destas doações, com
+    # seus itens e impactos
+    posicoes = indice_doacoes.posicoes(ids_doacoes)
+    posicoes = np.unique(posicoes[posicoes >= 0])
+    doacoes = tabelas[TABELAS.index("DOACAO")].iloc[posicoes]
+    itens = tabelas[TABELAS.index("DOACAO_ITEM")].iloc[estruturas["juncao_itens"].linhas(posicoes)]
+    impacto = tabelas[TABELAS.index("IMPACTO")].iloc[estruturas["juncao_impacto"].linhas(posicoes)]
+    return (
+        construir_rollup(doacoes, itens),
+        construir_rollup_itens(doacoes, itens),
+        construir_rollup_impacto(doacoes, impacto),
+        construir_cubo_fila(doacoes),
+    )
+
+
+class IngestaoIncremental:
+    def __init__(self, tabelas, estruturas, fonte, reconstruir):
+        self.tabelas = list(tabelas)
+        self.estruturas = dict(estruturas)
+        self.fonte = fonte
+        self.reconstruir = reconstruir
+        self.versao = 0
+        self.eventos = 0
+        self.reconstrucoes = 0
+        self.ultima_leitura = None
+        self._lock = threading.Lock()
+        self._indexar()
+
+    def _indexar(self):
+        self.ids = {
+            tabela: IndiceIds(self.tabelas[TABELAS.index(tabela)][COLUNAS[tabela][0]].to_numpy())
+            for tabela in TABELAS_INCREMENTAIS
+        }
+
+    def estado(self):
+        with self._lock:
+            return tuple(self.tabelas), dict(self.estruturas), self.versao
+
+    def atualizar(self):
+        # lê a fonte e aplica o que chegou; True se algo mudou
+        with self._lock:
+            novidades = self.fonte.ler()
+            self.ultima_leitura = time.time()
+            if not any(len(df) for df in novidades.values()):
+                self.fonte.confirmar()
+                return False
+            self._aplicar(novidades)
+            # só depois de aplicado a fonte avança (posição ou marcas d'água)
+            self.fonte.confirmar()
+            self.eventos += sum(len(df) for df in novidades.values())
+            self.versao += 1
+            return True
+
+    def _aplicar(self, novidades):
+        # trabalha sobre cópias rasas e só publica no fim, então uma falha no
+        # meio não deixa tabelas e índices desencontrados
+        tabelas = list(self.tabelas)
+        estruturas = dict(self.estruturas)
+        ids = {tabela: copy.copy(indice) for tabela, indice in self.ids.items()}
+        i_doacoes, i_impacto, i_itens = (TABELAS.index(t) for t in TABELAS_INCREMENTAIS)
+        vazia = {tabela: tabela_vazia(tabela) for tabela in TABELAS_INCREMENTAIS}
+        novas_doacoes = novidades.get("DOACAO", vazia["DOACAO"])
+        novos_impactos = novidades.get("IMPACTO", vazia["IMPACTO"])
+        novos_itens = novidades.get("DOACAO_ITEM", vazia["DOACAO_ITEM"])
+
+        # Doações cujo rollup muda: as alteradas/novas, as que ganharam itens
+        # ou impactos e as que perderam itens/impactos alterados para outra
+        # doação.
+        posicoes_itens = ids["DOACAO_ITEM"].posicoes(novos_itens["ID_DOACAO_ITEM"].to_numpy())
+        pais_anteriores = tabelas[i_itens]["ID_DOACAO"].to_numpy()[posicoes_itens[posicoes_itens >= 0]]
+        posicoes_impactos = ids["IMPACTO"].posicoes(novos_impactos["ID_IMPACTO"].to_numpy())
+        pais_anteriores_impacto = tabelas[i_impacto]["ID_DOACAO"].to_numpy()[posicoes_impactos[posicoes_impactos >= 0]]
+        ids_afetados = np.unique(np.concatenate([
+            novas_doacoes["ID_DOACAO"].to_numpy(),
+            novos_itens["ID_DOACAO"].to_numpy(),
+            pais_anteriores,
+            novos_impactos["ID_DOACAO"].to_numpy(),
+            pais_anteriores_impacto,
+        ]))
+        saida = _contribuicao(tabelas, estruturas, ids["DOACAO"], ids_afetados)
+
+        # Doações novas entram em ordem de DT_SOLICITACAO.
+        novas_doacoes = novas_doacoes.sort_values("DT_SOLICITACAO", kind="stable", na_position="last")
+        doacoes_antigas = tabelas[i_doacoes]
+        doacoes, atualizadas, inseridas, anteriores = upsert(
+            doacoes_antigas, novas_doacoes, ids["DOACAO"], "DOACAO"
+        )
+        tabelas[i_doacoes] = doacoes
+        em_ordem = self._em_ordem(doacoes_antigas, doacoes, atualizadas, inseridas, anteriores)
+
+        impacto, _, impactos_inseridos, impactos_anteriores = upsert(
+            tabelas[i_impacto], novos_impactos, ids["IMPACTO"], "IMPACTO"
+        )
+        itens, _, itens_inseridos, itens_anteriores = upsert(
+            tabelas[i_itens], novos_itens, ids["DOACAO_ITEM"], "DOACAO_ITEM"
+        )
+        tabelas[i_impacto], tabelas[i_itens] = impacto, itens
+
+        alteradas = [tabela for tabela in ("USUARIO", "ITEM", "INSTITUICAO") if tabela in novidades]
+        for tabela in alteradas:
+            i = TABELAS.index(tabela)
+            tabelas[i] = snapshot.mesclar(tabelas[i], novidades[tabela], tabela)
+        if alteradas:
+            # índices de busca dessas tabelas são montados de novo na próxima busca
+            estruturas["busca"] = estruturas["busca"].atualizado(tabelas, alteradas)
+        if "INSTITUICAO" in novidades:
+            estruturas["instituicoes"] = IndiceInstituicoes(tabelas[TABELAS.index("INSTITUICAO")])
+            # só as instituições novas ou com CATEGORIAS_ACEITAS alterada
+            # voltam a ter o texto separado
+            estruturas["categorias"] = estruturas["categorias"].atualizado(tabelas[TABELAS.index("INSTITUICAO")])
+
+        if not em_ordem:
+            self.reconstrucoes += 1
+            tabelas[i_doacoes] = preparar_doacoes(doacoes)
+            self.estruturas = self.reconstruir(tuple(tabelas))
+            self.tabelas = tabelas
+            self._indexar()
+            return
+
+        ids_doacoes = ids["DOACAO"]
+        for nome, filhos, inseridos, anteriores_filhos, novos in (
+            ("juncao_impacto", impacto, impactos_inseridos, impactos_anteriores, novos_impactos),
+            ("juncao_itens", itens, itens_inseridos, itens_anteriores, novos_itens),
+        ):
+            mudou_pai = self._filho_mudou_de_pai(anteriores_filhos, novos)
+            if mudou_pai:
+                estruturas[nome] = IndiceJuncao(doacoes["ID_DOACAO"].to_numpy(), filhos["ID_DOACAO"].to_numpy())
+            else:
+                juncao = copy.copy(estruturas[nome])
+                juncao.anexar(len(doacoes), ids_doacoes.posicoes(inseridos["ID_DOACAO"].to_numpy()))
+                # filhos que chegaram antes da sua doação ficaram sem pai (-1)
+                # e são ligados a ela quando ela chega
+                orfaos = juncao.orfaos()
+                if len(inseridas) and len(orfaos):
+                    pais = ids_doacoes.posicoes(filhos["ID_DOACAO"].to_numpy()[orfaos])
+                    if (pais >= 0).any():
+                        juncao.religar(orfaos[pais >= 0], pais[pais >= 0])
+                estruturas[nome] = juncao
+
+        entrada = _contribuicao(tabelas, estruturas, ids_doacoes, ids_afetados)
+        estruturas["rollup"] = atualizar_rollup(estruturas["rollup"], CHAVES_ROLLUP, entrada[0], saida[0])
+        estruturas["rollup_itens"] = atualizar_rollup(
+            estruturas["rollup_itens"], CHAVES_ROLLUP_ITENS, entrada[1], saida[1]
+        )
+        estruturas["rollup_impacto"] = atualizar_rollup(
+            estruturas["rollup_impacto"], CHAVES_ROLLUP_IMPACTO, entrada[2], saida[2]
+        )
+        estruturas["cubo_fila"] = atualizar_rollup(estruturas["cubo_fila"], CHAVES_CUBO_FILA, entrada[3], saida[3])
+        estruturas["memoria"] = relatorio_memoria(tabelas)
+        self.tabelas, self.estruturas, self.ids = tabelas, estruturas, ids
+
+    @staticmethod
+    def _em_ordem(antigas, doacoes, atualizadas, inseridas, anteriores):
+        # DOACAO continua ordenada por DT_SOLICITACAO se as alterações não
+        # mexeram na data e as novas vieram depois da última já carregada
+        datas = doacoes["DT_SOLICITACAO"].to_numpy(dtype="datetime64[ns]")
+        if len(atualizadas) and not np.array_equal(
+            datas[atualizadas], anteriores["DT_SOLICITACAO"].to_numpy(dtype="datetime64[ns]")
+        ):
+            return False
+        if len(inseridas) == 0:
+            return True
+        datas_antigas = datas[:len(antigas)]
+        datas_novas = datas[len(antigas):]
+        if np.isnat(datas_novas).any():
+            return False
+        if len(datas_antigas) == 0:
+            return True
+        return not np.isnat(datas_antigas[-1]) and datas_novas[0] >= datas_antigas[-1]
+
+    @staticmethod
+    def _filho_mudou_de_pai(anteriores, novos):
+        if anteriores.empty:
+            return False
+        chave = anteriores.columns[0]
+        pais = novos.drop_duplicates(chave, keep="last").set_index(chave)["ID_DOACAO"]
+        return not np.array_equal(
+            anteriores["ID_DOACAO"].to_numpy(), pais.reindex(anteriores[chave].to_numpy()).to_numpy()
+        )
+
+
+# ---------------------------------------------------------
+# PRODUTOR DE EVENTOS DE TESTE
+# ---------------------------------------------------------
+def gerar_eventos(rng, id_inicial, n_doacoes, agora, n_instituicoes=15, n_usuarios=150, pendentes=()):
+    # Doações novas (com itens e, às vezes, impacto) solicitadas agora, mais
+    # a confirmação das doações pendentes da rodada anterior.
+    from dados_demo import ITENS_LISTA
+
+    eventos = []
+    ids = np.arange(id_inicial, id_inicial + n_doacoes)
+    for id_doacao in ids:
+        eventos.append({
+            "tabela": "DOACAO",
+            "ID_DOACAO": int(id_doacao),
+            "STATUS": "ABERTA",
+            "DT_SOLICITACAO": agora.isoformat(),
+            "DT_CONFIRMACAO": None,
+            "ID_USUARIO": int(rng.integers(1, n_usuarios + 1)),
+            "ID_INSTITUICAO": int(rng.integers(1, n_instituicoes + 1)),
+        })
+        for k in range(int(rng.integers(1, 4))):
+            eventos.append({
+                "tabela": "DOACAO_ITEM",
+                "ID_DOACAO_ITEM": int(id_doacao) * 4 + k,
+                "QTDE": int(rng.integers(1, 11)),
+                "ID_DOACAO": int(id_doacao),
+                "ITEM": ITENS_LISTA[int(rng.integers(len(ITENS_LISTA)))],
+            })
+
+    for evento in pendentes:
+        eventos.append({**evento, "STATUS": "CONCLUIDA", "DT_CONFIRMACAO": agora.isoformat()})
+        if rng.random() < 0.5:
+            eventos.append({
+                "tabela": "IMPACTO",
+                "ID_IMPACTO": evento["ID_DOACAO"],
+                "ID_DOACAO": evento["ID_DOACAO"],
+                "PONTUACAO": int(rng.integers(70, 101)),
+                "OBSERVACAO": "Impacto positivo na comunidade",
+            })
+    return eventos
+
+
+if __name__ == "__main__":
+    # Fonte local para testar o modo tempo real sem banco:
+    #   python ingestao.py eventos.jsonl [doacoes_por_rodada] [intervalo_s]
+    #   HELPLINK_EVENTOS=eventos.jsonl streamlit run helplink_dashboard.py
+    import sys
+
+    destino = sys.argv[1] if len(sys.argv) > 1 else "eventos.jsonl"
+    por_rodada = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    intervalo = float(sys.argv[3]) if len(sys.argv) > 3 else 2.0
+
+    rng = np.random.default_rng()
+    # ids bem acima dos do modo demo para não colidir com linhas existentes
+    proximo_id = 10_000_000
+    pendentes = []
+    while True:
+        eventos = gerar_eventos(rng, proximo_id, por_rodada, pd.Timestamp.now().floor("s"), pendentes=pendentes)
+        with open(destino, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(evento) + "\n" for evento in eventos)
+        pendentes = [e for e in eventos if e["tabela"] == "DOACAO" and rng.random() < 0.5]
+        proximo_id += por_rodada
+        print(f"{len(eventos)} eventos gravados em {destino}")
+        time.sleep(intervalo)
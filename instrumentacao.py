@@ -0,0 +1,213 @@
+import json
+import os
+import statistics
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+# =========================================================
+# INSTRUMENTAÇÃO POR ETAPA (TEMPO E MEMÓRIA)
+# =========================================================
+# Cada execução do script (ou de um fragmento) abre uma Execucao e marca suas
+# etapas com `with execucao.etapa("nome"):`. Ao final, a execução vai para o
+# Perfil, compartilhado entre as sessões, que guarda as últimas execuções
+# (tendência por etapa) e, se configurado, grava:
+#
+# - uma linha JSON por execução (arquivo_json), para análise posterior;
+# - um arquivo texto no formato do Prometheus (arquivo_prometheus), lido
+#   pelo textfile collector do node_exporter.
+#
+# Tempo é sempre medido (perf_counter). Memória usa tracemalloc, que tem
+# custo, e só liga com memoria=True; o pico de cada etapa é relativo ao
+# que estava alocado quando ela começou. Como o tracemalloc é do processo,
+# com várias sessões simultâneas o pico é aproximado.
+
+
+class Execucao:
+    def __init__(self, perfil, tipo="script"):
+        self.perfil = perfil
+        self.tipo = tipo
+        self.inicio = time.time()
+        self.etapas = []
+        self.finalizada = False
+        self._relogio = time.perf_counter()
+        self._pilha = []
+        self._automatica = False
+
+    @contextmanager
+    def etapa(self, nome):
+        if self.finalizada and not self._pilha:
+            # fragmento reexecutado sozinho depois do fim do script: vira uma
+            # execução própria, encerrada quando a etapa externa terminar
+            self._reabrir("fragmento")
+
+        memoria = self.perfil.memoria and tracemalloc.is_tracing()
+        quadro = {"nome": nome, "nivel": len(self._pilha), "pico": 0}
+        if memoria:
+            atual, pico = tracemalloc.get_traced_memory()
+            if self._pilha:
+                self._pilha[-1]["pico"] = max(self._pilha[-1]["pico"], pico)
+            tracemalloc.reset_peak()
+            quadro["base"] = atual
+        self._pilha.append(quadro)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracao = time.perf_counter() - inicio
+            self._pilha.pop()
+            registro = {
+                "nome": nome,
+                "nivel": quadro["nivel"],
+                "inicio_ms": (inicio - self._relogio) * 1000,
+                "duracao_ms": duracao * 1000,
+            }
+            if memoria:
+                pico = max(quadro["pico"], tracemalloc.get_traced_memory()[1])
+                registro["pico_mb"] = max(pico - quadro["base"], 0) / 1024 / 1024
+                if self._pilha:
+                    # o pico da etapa filha também é pico da etapa mãe
+                    self._pilha[-1]["pico"] = max(self._pilha[-1]["pico"], pico)
+            self.etapas.append(registro)
+            if self._automatica and not self._pilha:
+                self.finalizar()
+
+    def _reabrir(self, tipo):
+        self.tipo = tipo
+        self.inicio = time.time()
+        self.etapas = []
+        self.finalizada = False
+        self._relogio = time.perf_counter()
+        self._automatica = True
+
+    def total_ms(self):
+        return (time.perf_counter() - self._relogio) * 1000
+
+    def finalizar(self):
+        if self.finalizada:
+            return
+        self.finalizada = True
+        self.perfil.registrar(self)
+
+    def como_dict(self):
+        return {
+            "ts": self.inicio,
+            "tipo": self.tipo,
+            "total_ms": self.total_ms(),
+            "etapas": sorted(self.etapas, key=lambda e: e["inicio_ms"]),
+        }
+
+
+class Perfil:
+    def __init__(self, max_execucoes=100, memoria=False, arquivo_json=None, arquivo_prometheus=None):
+        self.memoria = memoria
+        self.arquivo_json = arquivo_json
+        self.arquivo_prometheus = arquivo_prometheus
+        self.historico = deque(maxlen=max_execucoes)
+        # acumulados desde a partida do processo (contadores do Prometheus)
+        self.totais = {}
+        self._lock = threading.Lock()
+        if memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def execucao(self, tipo="script"):
+        return Execucao(self, tipo)
+
+    def registrar(self, execucao):
+        registro = execucao.como_dict()
+        with self._lock:
+            self.historico.append(registro)
+            for etapa in registro["etapas"]:
+                total = self.totais.setdefault(etapa["nome"], {"execucoes": 0, "segundos": 0.0})
+                total["execucoes"] += 1
+                total["segundos"] += etapa["duracao_ms"] / 1000
+            ultimas = self._ultimas_por_etapa()
+            totais = {nome: dict(total) for nome, total in self.totais.items()}
+
+        # arquivos fora do lock; erro de escrita não derruba o dashboard
+        try:
+            if self.arquivo_json:
+                with open(self.arquivo_json, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            if self.arquivo_prometheus:
+                gravar_prometheus(self.arquivo_prometheus, ultimas, totais)
+        except OSError:
+            pass
+
+    def _ultimas_por_etapa(self):
+        ultimas = {}
+        for registro in self.historico:
+            for etapa in registro["etapas"]:
+                ultimas[etapa["nome"]] = etapa
+        return ultimas
+
+    def tendencia(self):
+        # por etapa: última duração, mediana e p90 das execuções guardadas
+        with self._lock:
+            historico = list(self.historico)
+
+        duracoes = {}
+        picos = {}
+        for registro in historico:
+            for etapa in registro["etapas"]:
+                duracoes.setdefault(etapa["nome"], []).append(etapa["duracao_ms"])
+                if "pico_mb" in etapa:
+                    picos.setdefault(etapa["nome"], []).append(etapa["pico_mb"])
+
+        linhas = []
+        for nome, valores in duracoes.items():
+            linhas.append({
+                "ETAPA": nome,
+                "EXECUCOES": len(valores),
+                "ULTIMA_MS": valores[-1],
+                "MEDIANA_MS": statistics.median(valores),
+                "P90_MS": statistics.quantiles(valores, n=10)[-1] if len(valores) > 1 else valores[0],
+                "PICO_MAX_MB": max(picos[nome]) if nome in picos else None,
+            })
+        df = pd.DataFrame(linhas)
+        return df.sort_values("MEDIANA_MS", ascending=False, ignore_index=True) if not df.empty else df
+
+
+def _rotulo(valor):
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def gravar_prometheus(caminho, ultimas, totais):
+    linhas = [
+        "# HELP helplink_etapa_duracao_segundos Duração da última execução de cada etapa do dashboard",
+        "# TYPE helplink_etapa_duracao_segundos gauge",
+    ]
+    for nome, etapa in sorted(ultimas.items()):
+        linhas.append(f'helplink_etapa_duracao_segundos{{etapa="{_rotulo(nome)}"}} {etapa["duracao_ms"] / 1000:.6f}')
+
+    picos = {nome: etapa["pico_mb"] for nome, etapa in ultimas.items() if "pico_mb" in etapa}
+    if picos:
+        linhas += [
+            "# HELP helplink_etapa_pico_bytes Pico de memória alocada na última execução de cada etapa",
+            "# TYPE helplink_etapa_pico_bytes gauge",
+        ]
+        for nome, pico in sorted(picos.items()):
+            linhas.append(f'helplink_etapa_pico_bytes{{etapa="{_rotulo(nome)}"}} {int(pico * 1024 * 1024)}')
+
+    linhas += [
+        "# HELP helplink_etapa_segundos_total Tempo acumulado em cada etapa desde a partida",
+        "# TYPE helplink_etapa_segundos_total counter",
+    ]
+    for nome, total in sorted(totais.items()):
+        linhas.append(f'helplink_etapa_segundos_total{{etapa="{_rotulo(nome)}"}} {total["segundos"]:.6f}')
+    linhas += [
+        "# HELP helplink_etapa_execucoes_total Número de execuções de cada etapa desde a partida",
+        "# TYPE helplink_etapa_execucoes_total counter",
+    ]
+    for nome, total in sorted(totais.items()):
+        linhas.append(f'helplink_etapa_execucoes_total{{etapa="{_rotulo(nome)}"}} {total["execucoes"]}')
+
+    # o collector pode ler a qualquer momento: grava ao lado e troca
+    temporario = f"{caminho}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(temporario, "w", encoding="utf-8") as f:
+        f.write("\n".join(linhas) + "\n")
+    os.replace(temporario, caminho)
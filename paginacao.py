@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+# =========================================================
+# PAGINAÇÃO NO SERVIDOR
+# =========================================================
+# Ordenação, busca e projeção de colunas feitas no servidor, para que só a
+# página atual (algumas dezenas de linhas) seja serializada para o browser,
+# não importa o tamanho da tabela. A ordem de cada coluna é um vetor de
+# posições (argsort, int32 quando a tabela cabe) que pode ser guardado em
+# cache e reaproveitado por todas as páginas e buscas sobre a mesma tabela.
+
+
+def ordem_coluna(serie, ascendente=True):
+    # nulos sempre no fim; argsort do próprio array (pyarrow para textos,
+    # códigos para categorias) evita converter a coluna para objetos Python
+    posicoes = serie.array.argsort(ascending=ascendente, kind="stable", na_position="last")
+    return np.asarray(posicoes, dtype=np.int32 if len(serie) < 2**31 else np.int64)
+
+
+def mascara_busca(df, termo, colunas=None):
+    # Texto: contém, sem diferenciar maiúsculas. Número: igualdade exata nas
+    # colunas inteiras (ids, quantidades). Devolve None se não há busca.
+    termo = (termo or "").strip()
+    if not termo:
+        return None
+
+    mascara = np.zeros(len(df), dtype=bool)
+    for coluna in colunas or df.columns:
+        serie = df[coluna]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            # busca nas categorias e expande pelos códigos (-1 = nulo)
+            categorias = pd.Series(serie.cat.categories.astype(str))
+            acertos = categorias.str.contains(termo, case=False, regex=False).to_numpy(dtype=bool)
+            mascara |= np.append(acertos, False)[serie.cat.codes.to_numpy()]
+        elif pd.api.types.is_string_dtype(serie.dtype):
+            mascara |= serie.str.contains(termo, case=False, regex=False, na=False).to_numpy(dtype=bool)
+        elif pd.api.types.is_integer_dtype(serie.dtype) and termo.lstrip("-").isdigit():
+            mascara |= serie.eq(int(termo)).fillna(False).to_numpy(dtype=bool)
+    return mascara
+
+
+def paginar(df, pagina, tamanho, ordem=None, mascara=None, colunas=None):
+    # pagina começa em 1; devolve (linhas da página, total de linhas após a busca)
+    if ordem is None:
+        posicoes = None if mascara is None else np.flatnonzero(mascara)
+    else:
+        posicoes = ordem if mascara is None else ordem[mascara[ordem]]
+
+    total = len(df) if posicoes is None else len(posicoes)
+    inicio = (max(pagina, 1) - 1) * tamanho
+    if posicoes is None:
+        linhas = df.iloc[inicio:inicio + tamanho]
+    else:
+        linhas = df.iloc[posicoes[inicio:inicio + tamanho]]
+
+    if colunas:
+        linhas = linhas[list(colunas)]
+    return linhas, total
@@ -0,0 +1,192 @@
+import multiprocessing
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from agregacoes import calcular_agregado, consultar
+from filtros import fatia_periodo, mascara_status_instituicao
+
+# =========================================================
+# AGREGAÇÕES EM UM POOL DE PROCESSOS
+# =========================================================
+# Consultas sobre períodos longos são divididas por mês: cada processo do
+# pool recebe a fatia do rollup de um mês, aplica os filtros de status e
+# instituição e devolve uma soma parcial agrupada só pelas chaves que o
+# agregado usa (STATUS para os KPIs, DIA_SEMANA/HORA para o heatmap, ...).
+# As parciais de todos os meses são concatenadas e passam pela mesma
+# consulta de agregacoes.py: como todas são somas, o resultado é idêntico
+# ao da execução serial.
+#
+# Os processos não recebem as linhas: enviar (pickle) a fatia de um mês
+# custa mais que agregá-la. Cada rollup é copiado uma única vez para um
+# bloco de memória compartilhada, e a tarefa leva só o nome do bloco e o
+# intervalo de linhas do mês; o processo do pool mapeia o bloco e lê as
+# colunas direto dele. O bloco é liberado quando o rollup sai de uso (nova
+# carga ou ingestão).
+#
+# O pool é um só para o processo, compartilhado entre as sessões do
+# dashboard (ou as threads da API). Consultas pequenas, abaixo de
+# LIMIAR_LINHAS linhas do rollup no período, continuam no próprio processo,
+# onde custam menos que a ida e volta ao pool.
+
+LIMIAR_LINHAS = 500_000
+
+# blocos mantidos abertos em cada processo do pool
+MAX_BLOCOS_ABERTOS = 4
+
+# chaves e medidas das somas parciais de cada agregado
+PARCIAIS = {
+    "kpis": (["STATUS"], ["QTD_DOACOES", "QTDE_ITENS"]),
+    "status": (["STATUS"], ["QTD_DOACOES"]),
+    "serie": (["DATA"], ["QTD_DOACOES"]),
+    "top_instituicoes": (["ID_INSTITUICAO"], ["QTD_DOACOES"]),
+    "top_itens": (["ITEM"], ["QTDE"]),
+    "heatmap": (["DIA_SEMANA", "HORA"], ["QTD_DOACOES"]),
+    "instituicao_semana": (["DATA", "ID_INSTITUICAO"], ["QTD_DOACOES"]),
+}
+
+
+def particoes_mensais(datas, data_ini, data_fim):
+    # fatias [início, fim) de `datas` (ordenadas), uma por mês do período
+    periodo = fatia_periodo(datas, data_ini, data_fim)
+    meses = pd.date_range(pd.Timestamp(data_ini).to_period("M").start_time, pd.Timestamp(data_fim), freq="MS")
+    bordas = np.searchsorted(datas, meses[1:].to_numpy(dtype="datetime64[ns]"), side="left")
+    bordas = np.concatenate([[periodo.start], np.clip(bordas, periodo.start, periodo.stop), [periodo.stop]])
+    return [slice(int(a), int(b)) for a, b in zip(bordas[:-1], bordas[1:]) if b > a]
+
+
+# ---------------------------------------------------------
+# ROLLUP EM MEMÓRIA COMPARTILHADA
+# ---------------------------------------------------------
+def publicar(df):
+    # copia as colunas para um bloco compartilhado; devolve o bloco e o
+    # descritor (pequeno) que os processos do pool usam para ler as colunas
+    colunas = []
+    deslocamento = 0
+    for nome in df.columns:
+        serie = df[nome]
+        categorias = None
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            categorias = list(serie.cat.categories)
+            valores = serie.cat.codes.to_numpy()
+        else:
+            valores = serie.to_numpy()
+        colunas.append((nome, valores.dtype.str, deslocamento, categorias))
+        deslocamento += -(-valores.nbytes // 8) * 8  # alinhado em 8 bytes
+
+    bloco = shared_memory.SharedMemory(create=True, size=max(deslocamento, 1))
+    for (nome, tipo, inicio, categorias) in colunas:
+        serie = df[nome]
+        valores = serie.cat.codes.to_numpy() if categorias is not None else serie.to_numpy()
+        np.ndarray(len(df), dtype=tipo, buffer=bloco.buf, offset=inicio)[:] = valores
+    return bloco, {"bloco": bloco.name, "linhas": len(df), "colunas": colunas}
+
+
+_abertos = OrderedDict()  # nos processos do pool: nome do bloco -> SharedMemory
+
+
+def _bloco(nome):
+    if nome in _abertos:
+        _abertos.move_to_end(nome)
+        return _abertos[nome]
+    while len(_abertos) >= MAX_BLOCOS_ABERTOS:
+        _, antigo = _abertos.popitem(last=False)
+        antigo.close()
+    _abertos[nome] = shared_memory.SharedMemory(name=nome)
+    return _abertos[nome]
+
+
+def ler_fatia(descritor, particao, colunas):
+    # as linhas `particao` das colunas pedidas, copiadas: o DataFrame não
+    # fica preso ao bloco, que pode ser fechado depois
+    bloco = _bloco(descritor["bloco"])
+    dados = {}
+    for (nome, tipo, inicio, categorias) in descritor["colunas"]:
+        if nome not in colunas:
+            continue
+        valores = np.ndarray(descritor["linhas"], dtype=tipo, buffer=bloco.buf, offset=inicio)[particao]
+        dados[nome] = pd.Categorical.from_codes(valores, categorias) if categorias is not None else valores
+    return pd.DataFrame(dados, copy=True)
+
+
+def agregar_parcial(nome, descritor, particao, status=None, id_instituicao=None):
+    # executada nos processos do pool
+    chaves, medidas = PARCIAIS[nome]
+    fatia = ler_fatia(descritor, particao, set(chaves + medidas + ["STATUS", "ID_INSTITUICAO"]))
+    mascara = mascara_status_instituicao(fatia, status, id_instituicao)
+    if mascara is not None:
+        fatia = fatia[mascara]
+    return fatia.groupby(chaves, observed=True, sort=False)[medidas].sum().reset_index()
+
+
+class PoolAgregacoes:
+    def __init__(self, processos=None, limiar=LIMIAR_LINHAS):
+        self.processos = processos or os.cpu_count() or 1
+        self.limiar = limiar
+        self.consultas_paralelas = 0
+        self._publicados = {}  # id(rollup) -> descritor
+        self._lock = threading.Lock()
+        # spawn: o processo do dashboard tem várias threads (servidor, sessões)
+        # e um fork copiaria locks presos por elas. Os processos só sobem na
+        # primeira consulta grande.
+        self._executor = self._criar_executor()
+
+    def _criar_executor(self):
+        return ProcessPoolExecutor(self.processos, mp_context=multiprocessing.get_context("spawn"))
+
+    def _descritor(self, cubo):
+        with self._lock:
+            if id(cubo) not in self._publicados:
+                bloco, descritor = publicar(cubo)
+                self._publicados[id(cubo)] = descritor
+                # o cubo é imutável (a ingestão cria um novo): quando ele for
+                # coletado, o bloco é removido
+                weakref.finalize(cubo, _liberar, bloco, self._publicados, id(cubo))
+            return self._publicados[id(cubo)]
+
+    def calcular(self, nome, rollup, rollup_itens, indice_instituicoes, data_ini, data_fim, status=None, id_instituicao=None):
+        # mesma assinatura e resultado de agregacoes.calcular_agregado
+        cubo = rollup_itens if nome == "top_itens" else rollup
+        datas = cubo["DATA"].to_numpy(dtype="datetime64[ns]")
+        periodo = fatia_periodo(datas, data_ini, data_fim)
+        particoes = particoes_mensais(datas, data_ini, data_fim) if periodo.stop - periodo.start >= self.limiar else []
+        if len(particoes) < 2:
+            return calcular_agregado(nome, rollup, rollup_itens, indice_instituicoes, data_ini, data_fim, status, id_instituicao)
+
+        descritor = self._descritor(cubo)
+        futuros = [
+            self._executor.submit(agregar_parcial, nome, descritor, particao, status, id_instituicao)
+            for particao in particoes
+        ]
+        try:
+            parciais = [futuro.result() for futuro in futuros]
+        except BrokenProcessPool:
+            # um processo morreu (ex.: falta de memória): recria o pool para as
+            # próximas consultas e responde esta no próprio processo
+            self._executor = self._criar_executor()
+            return calcular_agregado(nome, rollup, rollup_itens, indice_instituicoes, data_ini, data_fim, status, id_instituicao)
+        self.consultas_paralelas += 1
+        return consultar(nome, pd.concat(parciais, ignore_index=True), indice_instituicoes)
+
+    def fechar(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _liberar(bloco, publicados, chave):
+    publicados.pop(chave, None)
+    bloco.close()
+    bloco.unlink()
+
+
+def pool_do_ambiente():
+    # HELPLINK_PROCESSOS: número de processos; 0 desliga o pool (padrão: um
+    # por CPU, e nenhum em máquinas com uma CPU só)
+    processos = int(os.environ.get("HELPLINK_PROCESSOS", os.cpu_count() or 1))
+    return PoolAgregacoes(processos) if processos > 1 else None
@@ -0,0 +1,66 @@
+import hashlib
+from datetime import datetime
+
+import banco_dados
+from agregacoes import construir_rollup, construir_rollup_impacto, construir_rollup_itens
+from busca import IndicesBusca
+from ciclo_vida import construir_cubo_fila
+from correspondencia import IndiceCategorias
+from dados_demo import gerar_dados_demo
+from esquema import relatorio_memoria
+from filtros import preparar_doacoes
+from indices import construir_indices
+import snapshot
+
+# =========================================================
+# PREPARAÇÃO DAS TABELAS CARREGADAS
+# =========================================================
+# O que é feito uma vez por carga de dados, antes de qualquer filtro:
+# ler as tabelas (demo ou banco, via snapshot), ordenar DOACAO e montar
+# rollups e índices. Sem Streamlit, para ser usado pelo dashboard, pela API,
+# pela ingestão incremental e pelo benchmark. Dashboard e API usam a mesma
+# origem de snapshot, então leem os mesmos arquivos Arrow.
+
+
+def preparar_tabelas(tabelas):
+    tabelas = list(tabelas)
+    tabelas[3] = preparar_doacoes(tabelas[3])
+    return tuple(tabelas)
+
+
+def construir_estruturas(tabelas):
+    df_usuarios, df_instituicoes, df_itens, df_doacoes, df_impacto, df_doacao_itens = tabelas
+    return {
+        "rollup": construir_rollup(df_doacoes, df_doacao_itens),
+        "rollup_itens": construir_rollup_itens(df_doacoes, df_doacao_itens),
+        "rollup_impacto": construir_rollup_impacto(df_doacoes, df_impacto),
+        "cubo_fila": construir_cubo_fila(df_doacoes),
+        **construir_indices(df_instituicoes, df_doacoes, df_impacto, df_doacao_itens),
+        "categorias": IndiceCategorias(df_instituicoes),
+        "busca": IndicesBusca(tabelas),
+        "memoria": relatorio_memoria(tabelas),
+    }
+
+
+def carregar_demo(escala, diretorio_snapshot=None):
+    # diretorio_snapshot=None: gera os dados sem snapshot
+    if diretorio_snapshot:
+        origem = f"demo:escala={escala}:data={datetime.today().date()}"
+        tabelas = snapshot.carregar_com_snapshot(diretorio_snapshot, origem, lambda: gerar_dados_demo(escala=escala))
+    else:
+        tabelas = gerar_dados_demo(escala=escala)
+    tabelas = preparar_tabelas(tabelas)
+    return tabelas, construir_estruturas(tabelas)
+
+
+def carregar_banco(pool, url, diretorio_snapshot):
+    # a URL pode ter senha: no manifesto fica só um hash dela
+    origem = "banco:" + hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]
+    tabelas = snapshot.carregar_com_snapshot(
+        diretorio_snapshot,
+        origem,
+        lambda: banco_dados.carregar_tabelas(pool),
+        lambda marcas: banco_dados.carregar_novidades(pool, marcas),
+    )
+    tabelas = preparar_tabelas(tabelas)
+    return tabelas, construir_estruturas(tabelas)
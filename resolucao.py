@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+# =========================================================
+# RESOLUÇÃO DOS GRÁFICOS
+# =========================================================
+# O navegador recebe a figura inteira em JSON; com um ponto por linha da
+# tabela, séries longas e o gráfico de impacto ficam pesados ou inutilizáveis.
+# Aqui os dados são resumidos antes de virar figura:
+#
+# - séries temporais: agrupadas por dia, semana ou mês conforme o período
+#   escolhido e, se ainda passarem do limite, reduzidas com LTTB (mantém picos
+#   e vales da linha com poucos pontos);
+# - distribuições (pontuação de impacto): uma barra por pontuação e quantis
+#   lidos do histograma do rollup (ver impacto.py), em vez de uma barra por
+#   doação;
+# - traces densos: desenhados com WebGL (scattergl).
+#
+# Tudo é limitado por um orçamento de bytes do JSON da figura.
+
+MAX_PONTOS_SERIE = 400     # granularidade automática
+MAX_PONTOS_DENSOS = 5000   # granularidade escolhida pelo usuário (WebGL)
+LIMIAR_WEBGL = 1000
+ORCAMENTO_FIGURA = 200_000  # bytes do JSON da figura
+QUANTIS = (0.5, 0.9, 0.99)
+
+# frequência de período do pandas de cada balde (semanas de segunda a domingo)
+GRANULARIDADES = {
+    "Dia": "D",
+    "Semana": "W-SUN",
+    "Mês": "M",
+}
+
+
+def escolher_granularidade(data_ini, data_fim, max_pontos=MAX_PONTOS_SERIE):
+    # a menor granularidade cujo número de baldes cabe em max_pontos
+    dias = (pd.Timestamp(data_fim) - pd.Timestamp(data_ini)).days + 1
+    if dias <= max_pontos:
+        return "Dia"
+    if dias / 7 <= max_pontos:
+        return "Semana"
+    return "Mês"
+
+
+def agrupar_serie(df, coluna_data, colunas_valor, granularidade):
+    # soma os valores por balde, rotulado pelo primeiro dia do período
+    if granularidade == "Dia" or df.empty:
+        return df
+    baldes = pd.to_datetime(df[coluna_data]).dt.to_period(GRANULARIDADES[granularidade]).dt.start_time
+    return df.groupby(baldes.rename(coluna_data), sort=True)[colunas_valor].sum().reset_index()
+
+
+def lttb(x, y, n):
+    # Largest-Triangle-Three-Buckets: devolve os índices de n pontos que
+    # preservam o formato visual da linha. x numérico e crescente.
+    total = len(x)
+    if n >= total or n < 3:
+        return np.arange(total)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    limites = np.linspace(1, total - 1, n - 1).astype(np.int64)
+
+    escolhidos = np.empty(n, dtype=np.int64)
+    escolhidos[0] = 0
+    escolhidos[-1] = total - 1
+    anterior = 0
+    for i in range(n - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        # média do próximo balde (o último ponto, no caso do último balde)
+        prox_inicio, prox_fim = fim, limites[i + 2] if i + 2 < len(limites) else total
+        media_x = x[prox_inicio:prox_fim].mean()
+        media_y = y[prox_inicio:prox_fim].mean()
+
+        area = np.abs(
+            (x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+            - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior])
+        )
+        anterior = inicio + int(area.argmax())
+        escolhidos[i + 1] = anterior
+    return escolhidos
+
+
+def reduzir_serie(df, coluna_x, coluna_y, max_pontos=MAX_PONTOS_SERIE):
+    if len(df) <= max_pontos:
+        return df
+    x = df[coluna_x]
+    if pd.api.types.is_datetime64_any_dtype(x.dtype):
+        x = x.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    return df.iloc[lttb(x, df[coluna_y].to_numpy(), max_pontos)]
+
+
+def modo_render(n_pontos):
+    return "webgl" if n_pontos > LIMIAR_WEBGL else "svg"
+
+
+def tamanho_figura(fig):
+    return len(fig.to_json())
+
+
+def figura_no_orcamento(construir, max_pontos, orcamento=ORCAMENTO_FIGURA, minimo=50):
+    # construir(max_pontos) -> figura; reduz os pontos pela metade até o
+    # JSON caber no orçamento (ou chegar ao mínimo)
+    fig = construir(max_pontos)
+    while tamanho_figura(fig) > orcamento and max_pontos > minimo:
+        max_pontos = max(max_pontos // 2, minimo)
+        fig = construir(max_pontos)
+    return fig
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from esquema import COLUNAS, TABELAS, TIPOS, aplicar_esquema
+
+# =========================================================
+# SNAPSHOT LOCAL DAS TABELAS (ARROW IPC)
+# =========================================================
+# Cada tabela é gravada como um arquivo Arrow IPC sem compressão, que pode
+# ser lido por memory-map na partida do servidor em vez de consultar o banco.
+# O manifesto guarda a versão do esquema, a origem dos dados e as marcas
+# d'água usadas na atualização incremental. Se o esquema mudar (TIPOS ou
+# VERSAO_SNAPSHOT) ou a origem for outra, o snapshot é descartado.
+
+VERSAO_SNAPSHOT = 1
+MANIFESTO = "manifesto.json"
+
+# Depois deste intervalo o snapshot é reconstruído do zero, o que captura
+# alterações que as marcas d'água não enxergam (ex.: status cancelado).
+RECONSTRUCAO_SEGUNDOS = 24 * 60 * 60
+
+MARCAS_DAGUA = {
+    "DT_CADASTRO": "USUARIO",
+    "DT_REGISTRO": "ITEM",
+    "DT_SOLICITACAO": "DOACAO",
+    "DT_CONFIRMACAO": "DOACAO",
+}
+
+
+def versao_esquema():
+    tipos = sorted((tabela, sorted((c, str(t)) for c, t in colunas.items())) for tabela, colunas in TIPOS.items())
+    conteudo = repr((VERSAO_SNAPSHOT, tipos))
+    return hashlib.sha1(conteudo.encode("utf-8")).hexdigest()[:12]
+
+
+def marcas_dagua(tabelas):
+    por_nome = dict(zip(TABELAS, tabelas))
+    marcas = {}
+    for coluna, tabela in MARCAS_DAGUA.items():
+        maximo = por_nome[tabela][coluna].max()
+        marcas[coluna] = None if pd.isna(maximo) else pd.Timestamp(maximo).isoformat()
+    return marcas
+
+
+def _caminho(diretorio, tabela):
+    return os.path.join(diretorio, f"{tabela}.arrow")
+
+
+def ler_manifesto(diretorio):
+    try:
+        with open(os.path.join(diretorio, MANIFESTO), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def snapshot_valido(manifesto, origem):
+    return (
+        manifesto is not None
+        and manifesto.get("versao_esquema") == versao_esquema()
+        and manifesto.get("origem") == origem
+    )
+
+
+def salvar_snapshot(diretorio, tabelas, origem, criado_em=None):
+    # grava em um diretório temporário e troca no final, para que um
+    # leitor nunca veja metade de um snapshot
+    temporario = f"{diretorio}.tmp-{os.getpid()}"
+    shutil.rmtree(temporario, ignore_errors=True)
+    os.makedirs(temporario)
+
+    for tabela, df in zip(TABELAS, tabelas):
+        feather.write_feather(df, _caminho(temporario, tabela), compression="uncompressed")
+
+    manifesto = {
+        "versao_esquema": versao_esquema(),
+        "origem": origem,
+        "criado_em": criado_em or time.time(),
+        "atualizado_em": time.time(),
+        "marcas_dagua": marcas_dagua(tabelas),
+        "linhas": {tabela: len(df) for tabela, df in zip(TABELAS, tabelas)},
+    }
+    with open(os.path.join(temporario, MANIFESTO), "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=2)
+
+    antigo = f"{diretorio}.old-{os.getpid()}"
+    if os.path.isdir(diretorio):
+        os.replace(diretorio, antigo)
+    os.replace(temporario, diretorio)
+    shutil.rmtree(antigo, ignore_errors=True)
+    return manifesto
+
+
+def ler_snapshot(diretorio, origem):
+    manifesto = ler_manifesto(diretorio)
+    if not snapshot_valido(manifesto, origem):
+        return None, manifesto
+
+    tabelas = []
+    try:
+        for tabela in TABELAS:
+            with pa.memory_map(_caminho(diretorio, tabela)) as origem_mmap:
+                tabela_arrow = pa.ipc.open_file(origem_mmap).read_all()
+            # split_blocks evita consolidar colunas numéricas em um bloco novo
+            df = tabela_arrow.to_pandas(split_blocks=True)
+            tabelas.append(aplicar_esquema(df, tabela))
+    except (OSError, pa.ArrowInvalid):
+        return None, manifesto
+
+    return tuple(tabelas), manifesto
+
+
+def mesclar(antiga, novas, tabela):
+    # linhas novas substituem as antigas com a mesma chave primária
+    if novas.empty:
+        return antiga
+    chave = COLUNAS[tabela][0]
+    mantidas = antiga[~np.isin(antiga[chave].to_numpy(), novas[chave].to_numpy())]
+    mesclada = pd.concat([mantidas, novas], ignore_index=True)
+    return aplicar_esquema(mesclada, tabela)
+
+
+def _salvar_se_possivel(diretorio, tabelas, origem, criado_em=None):
+    # sem permissão de escrita (ex.: deploy somente leitura) o dashboard
+    # segue funcionando, apenas sem o snapshot
+    try:
+        salvar_snapshot(diretorio, tabelas, origem, criado_em)
+    except OSError:
+        pass
+
+
+def carregar_com_snapshot(diretorio, origem, carregar_completo, carregar_novidades=None):
+    tabelas, manifesto = ler_snapshot(diretorio, origem)
+
+    if tabelas is None or time.time() - manifesto["criado_em"] > RECONSTRUCAO_SEGUNDOS:
+        tabelas = carregar_completo()
+        _salvar_se_possivel(diretorio, tabelas, origem)
+        return tabelas
+
+    if carregar_novidades is None:
+        return tabelas
+
+    novidades = carregar_novidades(manifesto["marcas_dagua"])
+    inalterado = all(
+        novas.equals(antiga) if tabela == "INSTITUICAO" else novas.empty
+        for tabela, antiga, novas in zip(TABELAS, tabelas, novidades)
+    )
+    if inalterado:
+        return tabelas
+
+    tabelas = tuple(
+        novas if tabela == "INSTITUICAO" else mesclar(antiga, novas, tabela)
+        for tabela, antiga, novas in zip(TABELAS, tabelas, novidades)
+    )
+    _salvar_se_possivel(diretorio, tabelas, origem, criado_em=manifesto["criado_em"])
+    return tabelas
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# =========================================================
+# NORMALIZAÇÃO DE TEXTOS
+# =========================================================
+# Forma usada para comparar textos digitados com os cadastrados: minúsculas,
+# sem acentos (NFKD sem os sinais combinantes) e com espaços simples. Feita
+# pelas funções do Arrow (C++), sem um laço Python por texto, porque a busca
+# normaliza de uma vez os nomes e e-mails de todos os usuários.
+
+
+def _arrow(textos):
+    if isinstance(textos, (pa.Array, pa.ChunkedArray)):
+        return textos
+    try:
+        return pa.array(textos, type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        # valores que não são texto (ex.: números em uma coluna object)
+        serie = pd.Series(np.asarray(textos, dtype=object))
+        return pa.array(serie.where(serie.isna(), serie.astype(str)), type=pa.string(), from_pandas=True)
+
+
+def normalizar_arrow(textos):
+    # nulos viram ""; só os textos com acentos passam pela decomposição NFKD
+    textos = pc.fill_null(_arrow(textos), "")
+    if isinstance(textos, pa.ChunkedArray):
+        textos = textos.combine_chunks()
+    nao_ascii = pc.invert(pc.string_is_ascii(textos))
+    if pc.any(nao_ascii).as_py():
+        decompostos = pc.utf8_normalize(textos.filter(nao_ascii), "NFKD")
+        textos = pc.replace_with_mask(textos, nao_ascii, pc.replace_substring_regex(decompostos, r"[^\x00-\x7f]", ""))
+    textos = pc.ascii_lower(textos)
+    return pc.ascii_trim_whitespace(pc.replace_substring_regex(textos, r"\s+", " "))
+
+
+def normalizar(textos):
+    return normalizar_arrow(textos).to_numpy(zero_copy_only=False)
@@ -0,0 +1,346 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+import banco_dados
+import snapshot
+from agregacoes import CHAVES_ROLLUP, CHAVES_ROLLUP_IMPACTO, CHAVES_ROLLUP_ITENS, construir_rollup_impacto
+from ciclo_vida import CHAVES_CUBO_FILA
+from classificacao import ClassificadorHF, condicao_por_score, criar_servidor_mock, hash_imagem
+from dados_demo import gerar_dados_demo
+from esquema import COLUNAS, TABELAS, aplicar_esquema
+from filtros import limites_datas
+from impacto import calcular_impacto
+from indices import IndiceInstituicoes
+from ingestao import FonteArquivo, IngestaoIncremental, gerar_eventos
+from preparacao import construir_estruturas, preparar_tabelas
+from resolucao import QUANTIS
+
+# =========================================================
+# VERIFICAÇÕES DE EQUIVALÊNCIA
+# =========================================================
+# Cada caminho otimizado do pipeline comparado com o cálculo direto sobre as
+# mesmas linhas, sem Streamlit e sem serviços externos (dados demo, SQLite
+# temporário, arquivo de eventos local, servidor de inferência simulado):
+#
+#   python verificacao.py              todas as verificações
+#   python verificacao.py impacto      só as escolhidas
+#
+# Sai com código 1 se alguma verificação falhar.
+
+ESCALA = 2
+
+
+def _tabelas(escala=ESCALA):
+    return preparar_tabelas(gerar_dados_demo(escala=escala))
+
+
+# ---------------------------------------------------------
+# IMPACTO (histograma do rollup x np.quantile nas linhas)
+# ---------------------------------------------------------
+def verificar_impacto():
+    tabelas = _tabelas()
+    df_instituicoes, df_doacoes, df_impacto = tabelas[1], tabelas[3], tabelas[4]
+
+    # pontuações fora da faixa de int8: o esquema alarga a coluna para int16
+    pontuacao = df_impacto["PONTUACAO"].to_numpy().astype(np.int64)
+    pontuacao[:40] = 200
+    pontuacao[40:45] = -300
+    df_impacto = aplicar_esquema(df_impacto.assign(PONTUACAO=pontuacao), "IMPACTO")
+    assert df_impacto["PONTUACAO"].dtype == np.int16, df_impacto["PONTUACAO"].dtype
+
+    rollup = construir_rollup_impacto(df_doacoes, df_impacto)
+    indice = IndiceInstituicoes(df_instituicoes)
+    data_ini, data_fim = limites_datas(df_doacoes)
+    linhas = df_impacto.merge(df_doacoes[["ID_DOACAO", "DT_SOLICITACAO", "ID_INSTITUICAO"]], on="ID_DOACAO")
+    linhas = linhas[linhas["DT_SOLICITACAO"].notna()]
+
+    def esperado(valores):
+        return [len(valores), valores.mean()] + np.quantile(valores, QUANTIS).tolist()
+
+    resumo = calcular_impacto("impacto_resumo", rollup, indice, data_ini, data_fim)
+    np.testing.assert_allclose(list(resumo.values()), esperado(linhas["PONTUACAO"].to_numpy()))
+
+    distribuicao = calcular_impacto("impacto_distribuicao", rollup, indice, data_ini, data_fim)
+    contagem = linhas["PONTUACAO"].value_counts()
+    assert distribuicao["QTD"].sum() == len(linhas)
+    np.testing.assert_array_equal(
+        distribuicao.set_index("INICIO")["QTD"].reindex(contagem.index).to_numpy(), contagem.to_numpy()
+    )
+
+    instituicoes = calcular_impacto("impacto_instituicoes", rollup, indice, data_ini, data_fim)
+    for linha in instituicoes.itertuples(index=False):
+        valores = linhas.loc[linhas["ID_INSTITUICAO"] == linha.ID_INSTITUICAO, "PONTUACAO"].to_numpy()
+        np.testing.assert_allclose([linha.QTD, linha.MEDIA, linha.P50, linha.P90, linha.P99], esperado(valores))
+
+    semanas = calcular_impacto("impacto_semanas", rollup, indice, data_ini, data_fim)
+    inicio = linhas["DT_SOLICITACAO"].dt.normalize() - pd.to_timedelta(linhas["DT_SOLICITACAO"].dt.dayofweek, unit="D")
+    for semana, valores in linhas.groupby(inicio)["PONTUACAO"]:
+        linha = semanas[semanas["SEMANA"] == semana].iloc[0]
+        np.testing.assert_allclose(
+            [linha["QTD"], linha["MEDIA"], linha["P50"], linha["P90"], linha["P99"]], esperado(valores.to_numpy())
+        )
+    assert semanas["QTD"].sum() == len(linhas)
+
+
+# ---------------------------------------------------------
+# BANCO (carga em blocos pelo pool x leitura direta no sqlite3)
+# ---------------------------------------------------------
+CHAVES = {tabela: COLUNAS[tabela][0] for tabela in TABELAS}
+
+
+def _ler_direto(caminho, data_ini=None, data_fim=None, status=None, id_instituicao=None):
+    # tabelas inteiras numa conexão própria, filtradas no pandas
+    with sqlite3.connect(caminho) as conn:
+        brutas = {tabela: pd.read_sql_query(f"SELECT * FROM {tabela}", conn) for tabela in TABELAS}
+    brutas["USUARIO"] = brutas["USUARIO"].assign(SENHA="****")
+    tabelas = {tabela: aplicar_esquema(df[COLUNAS[tabela]], tabela, categorias=False) for tabela, df in brutas.items()}
+
+    doacoes = tabelas["DOACAO"]
+    manter = pd.Series(True, index=doacoes.index)
+    if data_ini is not None:
+        manter &= doacoes["DT_SOLICITACAO"] >= pd.Timestamp(data_ini)
+    if data_fim is not None:
+        manter &= doacoes["DT_SOLICITACAO"] < pd.Timestamp(data_fim + timedelta(days=1))
+    if status:
+        manter &= doacoes["STATUS"].isin(status)
+    if id_instituicao is not None:
+        manter &= doacoes["ID_INSTITUICAO"] == id_instituicao
+    tabelas["DOACAO"] = doacoes[manter]
+    for tabela in ("IMPACTO", "DOACAO_ITEM"):
+        tabelas[tabela] = tabelas[tabela][tabelas[tabela]["ID_DOACAO"].isin(tabelas["DOACAO"]["ID_DOACAO"])]
+    return tuple(aplicar_esquema(tabelas[tabela], tabela) for tabela in TABELAS)
+
+
+def _comparar_tabelas(obtidas, esperadas):
+    for tabela, obtida, esperada in zip(TABELAS, obtidas, esperadas):
+        # sem ORDER BY, a ordem das linhas depende do plano de consulta
+        chave = CHAVES[tabela]
+        pd.testing.assert_frame_equal(
+            obtida.sort_values(chave, kind="stable").reset_index(drop=True),
+            esperada.sort_values(chave, kind="stable").reset_index(drop=True),
+            obj=tabela,
+        )
+
+
+def verificar_banco():
+    tabelas = gerar_dados_demo(escala=ESCALA)
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "helplink.db")
+        banco_dados.criar_banco_sqlite(caminho, tabelas)
+        pool = banco_dados.criar_pool(f"sqlite:///{caminho}", tamanho=2)
+        try:
+            data_fim = tabelas[3]["DT_SOLICITACAO"].max().date()
+            filtros = [
+                {},
+                {"data_ini": data_fim - timedelta(days=60), "data_fim": data_fim},
+                {"status": ["ABERTA", "CONCLUIDA"], "id_instituicao": int(tabelas[1]["ID_INSTITUICAO"].iloc[0])},
+            ]
+            for filtro in filtros:
+                # blocos pequenos para que as tabelas cheguem em vários pedaços
+                _comparar_tabelas(banco_dados.carregar_tabelas(pool, chunksize=997, **filtro), _ler_direto(caminho, **filtro))
+
+            # mais leituras simultâneas que conexões no pool
+            esperadas = _ler_direto(caminho)
+            with ThreadPoolExecutor(max_workers=6) as executor:
+                for obtidas in executor.map(lambda _: banco_dados.carregar_tabelas(pool), range(6)):
+                    _comparar_tabelas(obtidas, esperadas)
+
+            # consulta com erro vira ErroBanco e não inutiliza o pool
+            try:
+                banco_dados.ler_tabela(pool, "DOACAO", " WHERE COLUNA_INEXISTENTE = 1")
+            except banco_dados.ErroBanco:
+                pass
+            else:
+                raise AssertionError("consulta inválida não levantou ErroBanco")
+            _comparar_tabelas(banco_dados.carregar_tabelas(pool), esperadas)
+        finally:
+            pool.fechar()
+
+
+# ---------------------------------------------------------
+# INGESTÃO (incremental x reconstrução a partir das tabelas finais)
+# ---------------------------------------------------------
+ROLLUPS = {
+    "rollup": CHAVES_ROLLUP,
+    "rollup_itens": CHAVES_ROLLUP_ITENS,
+    "rollup_impacto": CHAVES_ROLLUP_IMPACTO,
+    "cubo_fila": CHAVES_CUBO_FILA,
+}
+
+
+def _normalizar(df, chaves):
+    # categorias comparadas pelo valor: a ingestão acrescenta categorias ao
+    # dicionário na ordem em que chegam
+    df = df.assign(**{
+        coluna: df[coluna].astype(object)
+        for coluna in df.columns
+        if isinstance(df[coluna].dtype, pd.CategoricalDtype)
+    })
+    return df.sort_values(chaves, kind="stable").reset_index(drop=True)
+
+
+def _pares_juncao(juncao, ids_pai, ids_filho):
+    # (id do pai, id do filho) de cada linha do CSR, em ordem
+    pais = np.repeat(np.arange(juncao.n_pai), np.diff(juncao.offsets))
+    filhos = juncao.ordem[juncao.offsets[0]:juncao.offsets[-1]]
+    pares = np.column_stack([ids_pai[pais], ids_filho[filhos]])
+    return pares[np.lexsort(pares.T[::-1])]
+
+
+def _comparar_ingestao(ingestao, esperadas):
+    tabelas, estruturas, _ = ingestao.estado()
+    for tabela, obtida, esperada in zip(TABELAS, tabelas, esperadas):
+        pd.testing.assert_frame_equal(
+            _normalizar(obtida, [CHAVES[tabela]]), _normalizar(esperada, [CHAVES[tabela]]),
+            check_dtype=False, obj=tabela,
+        )
+    assert tabelas[3]["DT_SOLICITACAO"].is_monotonic_increasing
+
+    referencia = construir_estruturas(tabelas)
+    for nome, chaves in ROLLUPS.items():
+        pd.testing.assert_frame_equal(
+            _normalizar(estruturas[nome], chaves), _normalizar(referencia[nome], chaves),
+            check_dtype=False, obj=nome,
+        )
+    ids_doacoes = tabelas[3]["ID_DOACAO"].to_numpy()
+    for nome, filhos in (("juncao_impacto", tabelas[4]), ("juncao_itens", tabelas[5])):
+        ids_filhos = filhos.iloc[:, 0].to_numpy()
+        np.testing.assert_array_equal(
+            _pares_juncao(estruturas[nome], ids_doacoes, ids_filhos),
+            _pares_juncao(referencia[nome], ids_doacoes, ids_filhos),
+            err_msg=nome,
+        )
+
+
+def verificar_ingestao():
+    tabelas = _tabelas()
+    rng = np.random.default_rng(0)
+    agora = tabelas[3]["DT_SOLICITACAO"].max() + pd.Timedelta(minutes=1)
+    proximo_id = int(tabelas[3]["ID_DOACAO"].max()) + 1
+
+    novas = gerar_eventos(rng, proximo_id, 40, agora)
+    doacoes = [e for e in novas if e["tabela"] == "DOACAO"]
+    rodadas = [
+        # itens antes das suas doações (órfãos até elas chegarem) e três
+        # eventos inválidos: JSON quebrado, coluna faltando e data que não converte
+        [e for e in novas if e["tabela"] != "DOACAO"],
+        doacoes,
+        gerar_eventos(rng, proximo_id + 40, 10, agora + pd.Timedelta(minutes=1), pendentes=doacoes[:20]),
+    ]
+    invalidos = [
+        "{nao e json",
+        json.dumps({"tabela": "DOACAO", "ID_DOACAO": proximo_id + 1000}),
+        json.dumps({**doacoes[0], "ID_DOACAO": proximo_id + 1001, "DT_SOLICITACAO": "ontem"}),
+    ]
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "eventos.jsonl")
+        fonte = FonteArquivo(caminho)
+        ingestao = IngestaoIncremental(tabelas, construir_estruturas(tabelas), fonte, construir_estruturas)
+        esperadas = list(tabelas)
+
+        for n, eventos in enumerate(rodadas):
+            linhas = [json.dumps(e) for e in eventos] + (invalidos if n == 0 else [])
+            with open(caminho, "a", encoding="utf-8") as f:
+                f.writelines(linha + "\n" for linha in linhas)
+
+            if n == 0:
+                # aplicação que falha não consome o bloco: a próxima leitura o repete
+                aplicar = ingestao._aplicar
+                ingestao._aplicar = lambda novidades: 1 / 0
+                try:
+                    ingestao.atualizar()
+                except ZeroDivisionError:
+                    pass
+                ingestao._aplicar = aplicar
+                assert fonte.posicao == 0 and fonte.invalidas == 0, (fonte.posicao, fonte.invalidas)
+
+            assert ingestao.atualizar()
+            for tabela in ("DOACAO", "IMPACTO", "DOACAO_ITEM"):
+                linhas_tabela = [
+                    {c: v for c, v in e.items() if c != "tabela"} for e in eventos if e["tabela"] == tabela
+                ]
+                if linhas_tabela:
+                    i = TABELAS.index(tabela)
+                    esperadas[i] = snapshot.mesclar(esperadas[i], pd.DataFrame(linhas_tabela), tabela)
+            _comparar_ingestao(ingestao, esperadas)
+
+        assert fonte.invalidas == len(invalidos), fonte.invalidas
+        assert fonte.posicao == os.path.getsize(caminho)
+        # as doações chegaram em ordem de data: nenhuma reconstrução completa
+        assert ingestao.reconstrucoes == 0, ingestao.reconstrucoes
+
+
+# ---------------------------------------------------------
+# CLASSIFICAÇÃO (lote em paralelo x uma requisição por vez)
+# ---------------------------------------------------------
+def verificar_classificacao():
+    servidor = criar_servidor_mock(porta=0, latencia=0.02)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{servidor.server_address[1]}"
+    rng = np.random.default_rng(0)
+    distintas = [(rng.bytes(256), "image/png") for _ in range(24)]
+    imagens = distintas + distintas[::3]  # repetidas no mesmo lote
+
+    # o servidor simulado deriva o score do hash da imagem
+    esperado = []
+    for image_bytes, _ in imagens:
+        score = int(hash_imagem(image_bytes)[:8], 16) / 0xFFFFFFFF
+        esperado.append((condicao_por_score(score), score))
+
+    serial = ClassificadorHF(None, url=url, max_paralelo=1)
+    paralelo = ClassificadorHF(None, url=url, max_paralelo=8)
+    try:
+        assert serial.classificar_lote(imagens) == esperado
+        assert paralelo.classificar_lote(imagens) == esperado
+        # uma chamada por imagem distinta; o mesmo lote de novo sai do cache
+        assert serial.chamadas == paralelo.chamadas == len(distintas), (serial.chamadas, paralelo.chamadas)
+        assert paralelo.classificar_lote(imagens[::-1]) == esperado[::-1]
+        assert paralelo.chamadas == len(distintas), paralelo.chamadas
+    finally:
+        serial.fechar()
+        paralelo.fechar()
+        servidor.shutdown()
+        servidor.server_close()
+
+
+VERIFICACOES = {
+    "impacto": verificar_impacto,
+    "banco": verificar_banco,
+    "ingestao": verificar_ingestao,
+    "classificacao": verificar_classificacao,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verificações de equivalência do pipeline HelpLink")
+    parser.add_argument("nomes", nargs="*", help=f"verificações a rodar: {', '.join(VERIFICACOES)} (padrão: todas)")
+    args = parser.parse_args(argv)
+    desconhecidas = set(args.nomes) - set(VERIFICACOES)
+    if desconhecidas:
+        parser.error(f"verificação desconhecida: {', '.join(sorted(desconhecidas))}")
+
+    falhas = 0
+    for nome in args.nomes or list(VERIFICACOES):
+        try:
+            VERIFICACOES[nome]()
+        except Exception as e:
+            falhas += 1
+            print(f"{nome:<16} FALHOU  {type(e).__name__}: {e}")
+        else:
+            print(f"{nome:<16} ok")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())